@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+attributes.py:
+
+Measures what a Vehicle's telemetry handlers cost per packet depending on who
+observes its attributes: how many attribute value objects (``LocationGlobal``,
+``Attitude``, ``Battery``, ...) they build, how many attribute notifications
+they make and the time per packet. The packets are the usual telemetry mix,
+already decoded, handed straight to the Vehicle's message listeners.
+
+With a ``'*'`` attribute listener every attribute is observed, which is also
+how every Vehicle behaved before it skipped values nobody listens to (its own
+``wait_ready`` bookkeeping was a ``'*'`` listener).
+"""
+from __future__ import print_function
+import argparse
+import time
+
+from dronekit import Vehicle, Locations
+from dronekit.mavlink import MAVConnection
+from pymavlink import mavutil
+
+# The properties that build a new value object each time they are read.
+VALUES = [(Vehicle, 'velocity'), (Vehicle, 'attitude'), (Vehicle, 'battery'), (Vehicle, 'gps_0'),
+          (Vehicle, 'rangefinder'), (Vehicle, 'mount_status'), (Locations, 'global_frame'),
+          (Locations, 'global_relative_frame'), (Locations, 'local_frame')]
+
+
+def telemetry():
+    mavlink = mavutil.mavlink
+    return [
+        mavlink.MAVLink_global_position_int_message(0, -353632640, 1491652352, 600000, 16000, 100, 0, 0, 0),
+        mavlink.MAVLink_local_position_ned_message(0, 1.0, 2.0, -16.0, 0.1, 0, 0),
+        mavlink.MAVLink_attitude_message(0, 0.01, 0.02, 1.5, 0, 0, 0),
+        mavlink.MAVLink_vfr_hud_message(0, 1.0, 90, 50, 16.0, 0),
+        mavlink.MAVLink_sys_status_message(0, 0, 0, 500, 12600, 100, 90, 0, 0, 0, 0, 0, 0),
+        mavlink.MAVLink_gps_raw_int_message(0, 3, -353632640, 1491652352, 600000, 121, 65535, 0, 0, 10),
+    ]
+
+
+def make_vehicle(observers):
+    vehicle = Vehicle(MAVConnection('udpin:127.0.0.1:0'))
+    for name in observers:
+        vehicle.add_attribute_listener(name, lambda *args: None)
+        if name == '*':
+            # The location frames used to be built for vehicle.location's own listeners too.
+            vehicle.location.add_attribute_listener(name, lambda *args: None)
+    return vehicle
+
+
+def count(observers, msgs):
+    vehicle = make_vehicle(observers)
+    counts = {'values': 0, 'notifications': 0}
+    saved = []
+
+    for cls, name in VALUES:
+        prop = cls.__dict__[name]
+
+        def fget(self, fget=prop.fget):
+            counts['values'] += 1
+            return fget(self)
+        saved.append((cls, name, prop))
+        setattr(cls, name, property(fget))
+
+    for observed in (vehicle, vehicle._location):
+        def notify(attr_name, value, cache=False, notify=observed.notify_attribute_listeners):
+            counts['notifications'] += 1
+            notify(attr_name, value, cache)
+        observed.notify_attribute_listeners = notify
+
+    try:
+        for msg in msgs:
+            vehicle._dispatch_message(msg)
+    finally:
+        for cls, name, prop in saved:
+            setattr(cls, name, prop)
+        vehicle.close()
+    return counts['values'] / float(len(msgs)), counts['notifications'] / float(len(msgs))
+
+
+def timing(observers, msgs, repeat):
+    vehicle = make_vehicle(observers)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for msg in msgs:
+            vehicle._dispatch_message(msg)
+        elapsed = (time.perf_counter() - start) / len(msgs)
+        best = elapsed if best is None else min(best, elapsed)
+    vehicle.close()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark attribute value construction per telemetry packet.')
+    parser.add_argument('--packets', type=int, default=60000,
+                        help="packets per timing run (default 60000)")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="timing runs, keeping the fastest (default 5)")
+    args = parser.parse_args()
+
+    msgs = telemetry() * (args.packets // 6)
+    cases = [
+        ("'*' (as before)", ['*']),
+        ('attitude', ['attitude']),
+        ('none', []),
+    ]
+    print('%18s %14s %16s %12s' % ('observers', 'values/packet', 'notifies/packet', 'us/packet'))
+    for name, observers in cases:
+        values, notifications = count(observers, msgs[:600])
+        elapsed = timing(observers, msgs, args.repeat)
+        print('%18s %14.2f %16.2f %12.2f' % (name, values, notifications, elapsed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
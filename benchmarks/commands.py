@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+commands.py:
+
+Measures how long a batch of commands takes to get through on a link that
+loses packets: sent fire-and-forget with a sleep between them (which says
+nothing about whether they arrived), one after the other waiting for each
+``COMMAND_ACK``, and all at once through ``Vehicle.command_long`` futures.
+The commands are a dozen different ones a script might send while setting
+up, to a FakeAutopilot that drops some of the packets it sends, acks
+included. (Repeats of one command cannot be pipelined: an ack only names the
+command it answers, so each waits for the answer to the one before.)
+"""
+from __future__ import print_function
+import argparse
+import time
+
+from dronekit import connect
+from dronekit.test.fake_autopilot import FakeAutopilot
+from pymavlink import mavutil
+
+mavlink = mavutil.mavlink
+COMMANDS = [
+    (mavlink.MAV_CMD_SET_MESSAGE_INTERVAL, mavlink.MAVLINK_MSG_ID_ATTITUDE, 50000),
+    (mavlink.MAV_CMD_REQUEST_MESSAGE, mavlink.MAVLINK_MSG_ID_HOME_POSITION),
+    (mavlink.MAV_CMD_DO_SET_HOME, 1),
+    (mavlink.MAV_CMD_DO_CHANGE_SPEED, 1, 5, -1),
+    (mavlink.MAV_CMD_DO_FENCE_ENABLE, 1),
+    (mavlink.MAV_CMD_DO_SET_SERVO, 9, 1500),
+    (mavlink.MAV_CMD_DO_SET_RELAY, 0, 1),
+    (mavlink.MAV_CMD_DO_DIGICAM_CONFIGURE, 1),
+    (mavlink.MAV_CMD_DO_MOUNT_CONTROL, -45, 0, 0),
+    (mavlink.MAV_CMD_DO_SET_CAM_TRIGG_DIST, 10),
+    (mavlink.MAV_CMD_DO_AUTOTUNE_ENABLE, 0),
+    (mavlink.MAV_CMD_SET_CAMERA_MODE, 0, 1),
+]
+
+
+def fire_and_forget(vehicle, commands, args):
+    for command in commands:
+        params = list(command[1:]) + [0] * (8 - len(command))
+        vehicle.send_mavlink(vehicle.message_factory.command_long_encode(0, 0, command[0], 0, *params))
+        time.sleep(args.sleep)
+    return None
+
+
+def sequential(vehicle, commands, args):
+    confirmed = 0
+    for command in commands:
+        future = vehicle.command_long(*command, timeout=args.timeout)
+        confirmed += future.exception() is None
+    return confirmed
+
+
+def pipelined(vehicle, commands, args):
+    futures = [vehicle.command_long(*command, timeout=args.timeout) for command in commands]
+    return sum(future.exception() is None for future in futures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sending a batch of acknowledged commands.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="batches of each kind, adding up the times (default 5)")
+    parser.add_argument('--drop', type=float, default=0.2,
+                        help="probability of the autopilot dropping each packet (default 0.2)")
+    parser.add_argument('--timeout', type=float, default=0.5,
+                        help="seconds to wait for each ack before sending again (default 0.5)")
+    parser.add_argument('--sleep', type=float, default=0.5,
+                        help="seconds slept after each fire-and-forget command (default 0.5)")
+    args = parser.parse_args()
+
+    autopilot = FakeAutopilot()
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+    autopilot.drop = args.drop
+    commands = set(command[0] for command in COMMANDS)
+
+    print('%d commands per batch, %d batches' % (len(COMMANDS), args.repeat))
+    print('%16s %10s %10s %10s' % ('mode', 'seconds', 'received', 'confirmed'))
+    for name, run in [('sleep between', fire_and_forget), ('wait for each', sequential), ('pipelined', pipelined)]:
+        elapsed = 0
+        received = 0
+        confirmed = None
+        for _ in range(args.repeat):
+            del autopilot.commands[:]
+            start = time.time()
+            result = run(vehicle, COMMANDS, args)
+            elapsed += time.time() - start
+            # Everything sent is eventually answered or given up on, but the
+            # fire-and-forget sends may still be on their way.
+            time.sleep(0.2)
+            received += len(set(msg.command for msg in autopilot.commands if msg.command in commands))
+            if result is not None:
+                confirmed = (confirmed or 0) + result
+        print('%16s %10.2f %10d %10s' % (name, elapsed, received, '-' if confirmed is None else confirmed))
+
+    vehicle.close()
+    autopilot.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+decode.py:
+
+Measures the CPU a Vehicle spends per received packet on a link carrying a
+STREAM_ALL style mix of messages, most of which it has no listener for. A
+child process sends the mix to a ``udpin:`` connection; the run is repeated
+with a ``'*'`` message listener, which makes every packet worth decoding.
+"""
+from __future__ import print_function
+import argparse
+import multiprocessing
+import socket
+import time
+
+from dronekit import Vehicle
+from dronekit.mavlink import MAVConnection
+from pymavlink import mavutil
+
+# What ArduCopter streams with SR0_* all set, less the usual Vehicle messages.
+STREAM = ['ATTITUDE', 'GLOBAL_POSITION_INT', 'VFR_HUD', 'SYS_STATUS', 'GPS_RAW_INT',
+          'RAW_IMU', 'SCALED_IMU2', 'SCALED_IMU3', 'SCALED_PRESSURE', 'SCALED_PRESSURE2',
+          'SERVO_OUTPUT_RAW', 'RC_CHANNELS', 'RC_CHANNELS_RAW', 'MEMINFO', 'POWER_STATUS',
+          'MISSION_CURRENT', 'NAV_CONTROLLER_OUTPUT', 'SYSTEM_TIME', 'AHRS', 'AHRS2',
+          'HWSTATUS', 'EKF_STATUS_REPORT', 'VIBRATION', 'BATTERY_STATUS', 'TERRAIN_REPORT',
+          'SIMSTATE', 'LOCAL_POSITION_NED', 'POSITION_TARGET_GLOBAL_INT']
+
+
+def zero_message(name):
+    cls = mavutil.mavlink.mavlink_map[getattr(mavutil.mavlink, 'MAVLINK_MSG_ID_' + name)]
+    args = []
+    for field, fieldtype in zip(cls.fieldnames, cls.fieldtypes):
+        # array_lengths is in wire order.
+        length = cls.array_lengths[cls.ordered_fieldnames.index(field)]
+        if fieldtype == 'char':
+            args.append(b'')
+        elif length:
+            args.append([0] * length)
+        else:
+            args.append(0)
+    return cls(*args)
+
+
+def blast(port, packets):
+    mav = mavutil.mavlink.MAVLink(None, srcSystem=1)
+    datagrams = [zero_message(name).pack(mav) for name in STREAM]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for i in range(packets):
+        sock.sendto(datagrams[i % len(datagrams)], ('127.0.0.1', port))
+        if i % 64 == 0:
+            # Stay under what the receiver can keep up with.
+            time.sleep(0.003)
+    sock.close()
+
+
+def run(packets, everything):
+    conn = MAVConnection('udpin:127.0.0.1:0')
+    conn.master.port.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    port = conn.master.port.getsockname()[1]
+    vehicle = Vehicle(conn)
+    if everything:
+        vehicle.add_message_listener('*', lambda *args: None)
+
+    conn.start()
+    cpu_start = time.process_time()
+    child = multiprocessing.Process(target=blast, args=(port, packets))
+    child.start()
+    child.join()
+    # Wait for the reader to go quiet.
+    received = -1
+    while received != conn.master.mav.total_bytes_received:
+        received = conn.master.mav.total_bytes_received
+        time.sleep(0.2)
+    cpu = time.process_time() - cpu_start
+    decoded = conn.master.mav.total_packets_received
+    skipped = sum(conn.skipped.values())
+    vehicle.close()
+    return decoded, skipped, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark skipping unwanted message decodes.')
+    parser.add_argument('--packets', type=int, default=100000,
+                        help="number of packets to send (default 100000)")
+    args = parser.parse_args()
+
+    print('%10s %10s %10s %16s' % ('listeners', 'decoded', 'skipped', 'us CPU/packet'))
+    for everything in (True, False):
+        decoded, skipped, cpu = run(args.packets, everything)
+        print('%10s %10d %10d %16.1f' % ("'*'" if everything else 'vehicle', decoded, skipped,
+                                         1e6 * cpu / (decoded + skipped)))
+
+
+if __name__ == '__main__':
+    main()
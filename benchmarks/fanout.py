@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+fanout.py:
+
+Measures the cost of a ``udpin:`` server writing to its clients when most of
+the clients that ever connected have gone away: the cost of each write should
+follow the live clients, not every client ever seen.
+"""
+from __future__ import print_function
+import argparse
+import socket
+import time
+
+from dronekit.mavlink import mavudpin_multi
+
+parser = argparse.ArgumentParser(description='Benchmark mavudpin_multi fan-out.')
+parser.add_argument('--clients', type=int, default=50,
+                    help="clients that connect (default 50)")
+parser.add_argument('--live', type=int, default=5,
+                    help="clients that keep sending (default 5)")
+parser.add_argument('--writes', type=int, default=20000,
+                    help="writes to time (default 20000)")
+args = parser.parse_args()
+
+link = mavudpin_multi('127.0.0.1:0', input=True)
+link.client_timeout = 1
+port = link.port.getsockname()[1]
+
+clients = []
+for _ in range(args.clients):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.setblocking(False)
+    clients.append(sock)
+
+
+def hello(socks):
+    for sock in socks:
+        sock.sendto(b'\xfe', ('127.0.0.1', port))
+    time.sleep(0.05)
+    while link.recv():
+        pass
+
+
+hello(clients)
+time.sleep(1.5)
+hello(clients[:args.live])
+buf = b'\xfe' * 300
+link.write(buf)
+# Long enough that nobody else expires while we time the writes.
+link.client_timeout = 60
+
+start = time.time()
+for _ in range(args.writes):
+    link.write(buf)
+elapsed = time.time() - start
+
+print('%d clients connected, %d live, %d written to: %.1f us per write' % (
+    args.clients, args.live, len(link.addresses), 1e6 * elapsed / args.writes))
+
+link.close()
+for sock in clients:
+    sock.close()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+fleet.py:
+
+Measures how connecting to many vehicles from one process scales: for each
+fleet size, the threads and CPU this process uses and the latency from an
+autopilot sending telemetry to a message listener seeing it, first with a
+pair of threads per vehicle and then with one shared MAVReactor.
+
+The vehicles are FakeAutopilot stand-ins, run in a child process so their
+own CPU use is not counted.
+"""
+from __future__ import print_function
+import argparse
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dronekit import connect
+from dronekit.mavlink import MAVReactor
+from dronekit.test.fake_autopilot import FakeAutopilot
+
+
+def serve(count, rate, pipe):
+    autopilots = [FakeAutopilot(rate=rate) for _ in range(count)]
+    pipe.send([autopilot.port for autopilot in autopilots])
+    pipe.recv()
+    for autopilot in autopilots:
+        autopilot.close()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100.0), len(values) - 1)]
+
+
+def measure(ports, reactor, duration):
+    with ThreadPoolExecutor(16) as pool:
+        vehicles = list(pool.map(
+            lambda port: connect('udpout:127.0.0.1:%d' % port, reactor=reactor), ports))
+
+    latencies = []
+
+    def listener(vehicle, name, msg):
+        latencies.append(time.time() - msg.time_usec / 1e6)
+
+    for vehicle in vehicles:
+        vehicle.add_message_listener('GPS_RAW_INT', listener)
+    time.sleep(1)
+    del latencies[:]
+
+    threads = threading.active_count()
+    cpu_start = time.process_time()
+    time.sleep(duration)
+    cpu = time.process_time() - cpu_start
+    samples = [l * 1e6 for l in latencies]
+
+    for vehicle in vehicles:
+        vehicle.close()
+    return threads, 100.0 * cpu / duration, samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark many vehicles in one process.')
+    parser.add_argument('--vehicles', default='1,10,50',
+                        help="comma-separated fleet sizes (default 1,10,50)")
+    parser.add_argument('--rate', type=float, default=20,
+                        help="telemetry rate of each autopilot in Hz (default 20)")
+    parser.add_argument('--duration', type=float, default=5,
+                        help="seconds to measure each configuration over (default 5)")
+    args = parser.parse_args()
+
+    print('%8s %8s %8s %8s %10s %10s' % ('vehicles', 'mode', 'threads', 'cpu %', 'p50 (us)', 'p99 (us)'))
+    for count in [int(n) for n in args.vehicles.split(',')]:
+        ours, theirs = multiprocessing.Pipe()
+        child = multiprocessing.Process(target=serve, args=(count, args.rate, theirs))
+        child.start()
+        ports = ours.recv()
+
+        for mode in ('threads', 'reactor'):
+            reactor = MAVReactor() if mode == 'reactor' else None
+            threads, cpu, samples = measure(ports, reactor, args.duration)
+            if reactor is not None:
+                reactor.close()
+            print('%8d %8s %8d %8.1f %10.0f %10.0f' % (count, mode, threads, cpu,
+                                                       percentile(samples, 50), percentile(samples, 99)))
+
+        ours.send(None)
+        child.join()
+
+
+if __name__ == '__main__':
+    main()
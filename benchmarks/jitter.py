@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+jitter.py:
+
+Measures how MAVLink decoding disturbs a control loop in the same process.
+A loop in the main thread wakes every ``--period`` seconds and does a little
+work while several vehicles stream telemetry, once with the links parsed by
+the connections' own threads and once with ``parse_process=True``. Reports
+how late the loop woke up and the CPU this process used.
+
+The vehicles are FakeAutopilot stand-ins, run in a child process so their
+own CPU use is not counted.
+"""
+from __future__ import print_function
+import argparse
+import multiprocessing
+import time
+
+from dronekit import connect
+from dronekit.test.fake_autopilot import FakeAutopilot
+
+
+def serve(count, rate, pipe):
+    autopilots = [FakeAutopilot(rate=rate) for _ in range(count)]
+    pipe.send([autopilot.port for autopilot in autopilots])
+    pipe.recv()
+    for autopilot in autopilots:
+        autopilot.close()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100.0), len(values) - 1)]
+
+
+def control_loop(period, work, duration):
+    late = []
+    deadline = time.time() + duration
+    next_tick = time.time() + period
+    while next_tick < deadline:
+        time.sleep(max(next_tick - time.time(), 0))
+        late.append(time.time() - next_tick)
+        # Stand-in for a controller update.
+        end = time.time() + work
+        while time.time() < end:
+            pass
+        next_tick += period
+    return late
+
+
+def measure(ports, parse_process, args):
+    vehicles = [connect('udpout:127.0.0.1:%d' % port, parse_process=parse_process,
+                        wait_ready=['attitude'])
+                for port in ports]
+    time.sleep(1)
+
+    cpu_start = time.process_time()
+    late = control_loop(args.period, args.work, args.duration)
+    cpu = time.process_time() - cpu_start
+    for vehicle in vehicles:
+        vehicle.close()
+    return [l * 1e6 for l in late], 100.0 * cpu / args.duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark control loop jitter while decoding telemetry.')
+    parser.add_argument('--vehicles', type=int, default=4,
+                        help="number of vehicles (default 4)")
+    parser.add_argument('--rate', type=float, default=100,
+                        help="telemetry rate of each autopilot in Hz, five messages each time (default 100)")
+    parser.add_argument('--period', type=float, default=0.01,
+                        help="control loop period in seconds (default 0.01)")
+    parser.add_argument('--work', type=float, default=0.001,
+                        help="seconds of work per control loop iteration (default 0.001)")
+    parser.add_argument('--duration', type=float, default=10,
+                        help="seconds to measure each mode over (default 10)")
+    args = parser.parse_args()
+
+    ours, theirs = multiprocessing.Pipe()
+    child = multiprocessing.Process(target=serve, args=(args.vehicles, args.rate, theirs))
+    child.start()
+    ports = ours.recv()
+
+    # The worker processes need cores of their own to take the load off.
+    print('%d vehicles at %g Hz, loop every %g ms, %d CPUs' % (args.vehicles, args.rate, args.period * 1000,
+                                                              multiprocessing.cpu_count()))
+    print('%10s %8s %10s %10s %10s' % ('parsing', 'cpu %', 'p50 (us)', 'p99 (us)', 'max (us)'))
+    for parse_process in (False, True):
+        late, cpu = measure(ports, parse_process, args)
+        print('%10s %8.1f %10.0f %10.0f %10.0f' % ('process' if parse_process else 'threads', cpu,
+                                                   percentile(late, 50), percentile(late, 99), max(late)))
+
+    ours.send(None)
+    child.join()
+
+
+if __name__ == '__main__':
+    main()
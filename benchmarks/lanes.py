@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+lanes.py:
+
+Measures how long a COMMAND_LONG waits behind a parameter transfer on a slow
+link. The connection's writes are throttled to the byte rate of a serial
+radio; a burst of PARAM_REQUEST_READ packets is queued, then a command, and
+the time until the command is written is reported.
+"""
+from __future__ import print_function
+import argparse
+import time
+
+from dronekit.mavlink import MAVConnection
+from pymavlink import mavutil
+
+parser = argparse.ArgumentParser(description='Benchmark command latency behind bulk traffic.')
+parser.add_argument('--baud', type=int, default=57600,
+                    help="emulated link speed (default 57600)")
+parser.add_argument('--bulk', type=int, default=500,
+                    help="PARAM_REQUEST_READ packets queued ahead of the command (default 500)")
+args = parser.parse_args()
+
+conn = MAVConnection('udpout:127.0.0.1:9')
+bytes_per_second = args.baud / 10.0
+command_written = []
+parser_mav = mavutil.mavlink.MAVLink(None)
+
+
+def slow_write(buf):
+    # A serial radio: the write takes as long as the bytes take to go out.
+    time.sleep(len(buf) / bytes_per_second)
+    if mavutil.mavlink.MAVLINK_MSG_ID_COMMAND_LONG in [m.get_msgId() for m in parser_mav.parse_buffer(buf) or []]:
+        command_written.append(time.time())
+
+
+conn.master.write = slow_write
+
+for i in range(args.bulk):
+    conn.master.mav.param_request_read_send(0, 0, b'', i)
+queued = time.time()
+conn.master.mav.command_long_send(0, 0, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, 0, 1, 0, 0, 0, 0, 0, 0)
+conn.start()
+
+while not command_written:
+    time.sleep(0.01)
+print('%d bulk packets queued ahead at %d baud: command written after %.3fs' % (
+    args.bulk, args.baud, command_written[0] - queued))
+conn.close()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pacing.py:
+
+Measures what happens to a parameter transfer and a command sent during it
+on a telemetry radio, with and without send pacing. The radio is emulated:
+its buffer holds ``--buffer`` bytes and drains at the link's byte rate, and
+whatever does not fit when written is lost. For each mode the bytes lost and
+the time from queuing the command to it leaving the radio are reported.
+"""
+from __future__ import print_function
+import argparse
+import threading
+import time
+
+from dronekit.mavlink import MAVConnection, packet_msgid
+from pymavlink import mavutil
+
+
+class Radio(object):
+    def __init__(self, bytes_per_second, size):
+        self.rate = bytes_per_second
+        self.size = size
+        self.level = 0.0
+        self.last = time.time()
+        self.lost = 0
+        self.sent = 0
+        self.command_out = None
+        self.lock = threading.Lock()
+
+    def write(self, buf):
+        with self.lock:
+            now = time.time()
+            self.level = max(self.level - (now - self.last) * self.rate, 0)
+            self.last = now
+            room = int(self.size - self.level)
+            for pkt in split(buf):
+                if len(pkt) > room:
+                    self.lost += len(pkt)
+                    continue
+                room -= len(pkt)
+                self.level += len(pkt)
+                self.sent += len(pkt)
+                if packet_msgid(pkt) == mavutil.mavlink.MAVLINK_MSG_ID_COMMAND_LONG:
+                    self.command_out = now + self.level / self.rate
+
+
+def split(buf):
+    # Writes may hold several MAVLink 1 packets back to back.
+    pkts = []
+    while buf:
+        size = 8 + bytearray(buf[1:2])[0]
+        pkts.append(buf[:size])
+        buf = buf[size:]
+    return pkts
+
+
+def run(args, bandwidth):
+    rate = args.baud / 10.0
+    conn = MAVConnection('udpout:127.0.0.1:9', bandwidth=bandwidth)
+    radio = Radio(rate, args.buffer)
+    conn.master.write = radio.write
+    conn.start()
+
+    for i in range(args.bulk):
+        conn.master.mav.param_set_send(0, 0, b'PARAM%d' % i, i, mavutil.mavlink.MAV_PARAM_TYPE_REAL32)
+    time.sleep(0.5)
+    queued = time.time()
+    conn.master.mav.command_long_send(0, 0, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, 0, 1, 0, 0, 0, 0, 0, 0)
+    while radio.command_out is None and time.time() - queued < 5:
+        time.sleep(0.01)
+    conn.close()
+    latency = '%.3fs' % (radio.command_out - queued) if radio.command_out else 'lost'
+    return radio.lost, radio.sent + radio.lost, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark send pacing on an emulated radio.')
+    parser.add_argument('--baud', type=int, default=57600,
+                        help="link speed (default 57600)")
+    parser.add_argument('--buffer', type=int, default=2048,
+                        help="radio buffer in bytes (default 2048)")
+    parser.add_argument('--bulk', type=int, default=300,
+                        help="PARAM_SET packets in the transfer (default 300)")
+    args = parser.parse_args()
+
+    print('%8s %12s %12s' % ('mode', 'bytes lost', 'command'))
+    for mode, bandwidth in (('unpaced', 0), ('paced', args.baud / 10.0)):
+        lost, total, latency = run(args, bandwidth)
+        print('%8s %6d/%-5d %12s' % (mode, lost, total, latency))
+
+
+if __name__ == '__main__':
+    main()
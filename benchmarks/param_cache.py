@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+param_cache.py:
+
+Measures how long ``connect(wait_ready=True)`` takes with and without a
+parameter cache: with none, with an empty one (the first connection fills
+it) and with a warm one, checked by ``_HASH_CHECK`` or, for an autopilot
+without it, by reading back a sample. The vehicle is a FakeAutopilot with as
+many parameters as an ArduCopter, sent at the rate a telemetry radio manages.
+"""
+from __future__ import print_function
+import argparse
+import collections
+import shutil
+import tempfile
+import time
+
+from dronekit import connect
+from dronekit.test.fake_autopilot import FakeAutopilot
+
+
+def timed_connect(autopilot, **kwargs):
+    start = time.time()
+    vehicle = connect(autopilot.connection_string, wait_ready=True, **kwargs)
+    elapsed = time.time() - start
+    # Leave time for the cache to be saved or checked in the background.
+    time.sleep(2)
+    vehicle.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark connecting with a parameter cache.')
+    parser.add_argument('--params', type=int, default=1000,
+                        help="parameters the autopilot has (default 1000)")
+    parser.add_argument('--rate', type=float, default=50,
+                        help="parameters per second the link carries (default 50)")
+    args = parser.parse_args()
+
+    params = collections.OrderedDict(('PARAM_%d' % i, i) for i in range(args.params))
+    autopilot = FakeAutopilot(params=params, param_rate=args.rate)
+    directory = tempfile.mkdtemp()
+    try:
+        print('%d parameters at %.0f/s' % (args.params, args.rate))
+        print('no cache:                  %6.2fs' % timed_connect(autopilot))
+        print('empty cache:               %6.2fs' % timed_connect(autopilot, param_cache=directory))
+        print('warm cache (_HASH_CHECK):  %6.2fs' % timed_connect(autopilot, param_cache=directory))
+        autopilot.hash_check = False
+        print('warm cache (sample):       %6.2fs' % timed_connect(autopilot, param_cache=directory))
+    finally:
+        shutil.rmtree(directory)
+        autopilot.close()
+
+
+if __name__ == '__main__':
+    main()
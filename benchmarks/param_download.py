@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+param_download.py:
+
+Measures how long a Vehicle takes to download a full set of parameters over
+a lossy link, from when ``connect()`` has seen the first one until they are
+all in, and how many single parameter requests it sends, with the adaptive download (``dronekit.params.ParamDownload``) and
+with the fixed timers it replaced: after 0.2 s without a new parameter ask
+for the first 51 still missing, then wait 1 s (or until the next new one).
+
+The link is a FakeAutopilot sending parameters at a fixed rate, dropping a
+share of its packets and, like ArduPilot, ignoring requests beyond the 20 it
+has queued.
+"""
+from __future__ import print_function
+import argparse
+import collections
+import time
+
+import dronekit
+from dronekit import connect
+from dronekit.params import ParamDownload
+from dronekit.test.fake_autopilot import FakeAutopilot
+
+
+class FixedTimerDownload(object):
+    # The watchdog Vehicle.__init__ had before ParamDownload.
+
+    def __init__(self, request):
+        self._request = request
+        self.count = None
+
+    def start(self, count, now):
+        self.count = count
+        self._received = [False] * count
+        self._last = now
+        self._duration = 0.2
+
+    @property
+    def complete(self):
+        return self.count is not None and all(self._received)
+
+    def received(self, index, now):
+        if self._received[index]:
+            return False
+        self._received[index] = True
+        self._last = now
+        self._duration = 0.2
+        return True
+
+    def check(self, now):
+        if now - self._last <= self._duration:
+            return 0
+        c = 0
+        for i, v in enumerate(self._received):
+            if not v:
+                self._request(i)
+                c += 1
+                if c > 50:
+                    break
+        self._duration = 1
+        self._last = now
+        return c
+
+    def progress(self, now):
+        return None
+
+
+def run(autopilot, engine):
+    # Every Vehicle builds its download in __init__, by this name.
+    dronekit.ParamDownload = engine
+    try:
+        # Returns once the download has started.
+        vehicle = connect(autopilot.connection_string)
+        start = time.time()
+        vehicle.wait_ready('parameters', timeout=300)
+        elapsed = time.time() - start
+    finally:
+        dronekit.ParamDownload = ParamDownload
+    vehicle.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark downloading parameters over a lossy link.')
+    parser.add_argument('--params', type=int, default=1000,
+                        help="parameters the autopilot has (default 1000)")
+    parser.add_argument('--rate', type=float, default=400,
+                        help="parameters per second the link carries (default 400)")
+    parser.add_argument('--drop', type=float, nargs='*', default=[0.0, 0.1, 0.3],
+                        help="probabilities of the autopilot dropping each packet (default 0 0.1 0.3)")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="downloads of each kind, averaging the results (default 3)")
+    args = parser.parse_args()
+
+    params = collections.OrderedDict(('PARAM_%d' % i, i) for i in range(args.params))
+    print('%d parameters at %.0f/s (%.1fs without loss)' % (args.params, args.rate, args.params / args.rate))
+    print('%6s %14s %10s %10s' % ('drop', 'download', 'seconds', 'requests'))
+    for drop in args.drop:
+        for name, engine in [('fixed timers', FixedTimerDownload), ('adaptive', ParamDownload)]:
+            elapsed = requests = 0
+            for _ in range(args.repeat):
+                autopilot = FakeAutopilot(params=params, drop=drop, param_rate=args.rate)
+                elapsed += run(autopilot, engine)
+                requests += autopilot.received['PARAM_REQUEST_READ']
+                autopilot.close()
+            print('%6.2f %14s %10.2f %10.0f' % (drop, name, elapsed / args.repeat, requests / float(args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
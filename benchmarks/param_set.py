@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+param_set.py:
+
+Measures how long it takes to push a tuning file of parameters to a vehicle:
+one ``Parameters.set`` after another, each waiting for its ``PARAM_VALUE``,
+and ``Parameters.set_many`` keeping a window of them in flight. The vehicle
+is a FakeAutopilot, which can drop some of the packets it sends (the
+confirmations included).
+"""
+from __future__ import print_function
+import argparse
+import collections
+import logging
+import time
+
+from dronekit import connect
+from dronekit.test.fake_autopilot import FakeAutopilot
+
+
+def one_by_one(vehicle, values, args):
+    return sum(vehicle.parameters.set(name, value) for name, value in values.items())
+
+
+def set_many(vehicle, values, args):
+    report = vehicle.parameters.set_many(values, window=args.window)
+    return sum(result['ok'] for result in report.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark setting many parameters.')
+    parser.add_argument('--params', type=int, default=300,
+                        help="parameters to set (default 300)")
+    parser.add_argument('--window', type=int, default=10,
+                        help="parameters in flight for set_many (default 10)")
+    parser.add_argument('--drop', type=float, nargs='*', default=[0.0, 0.05],
+                        help="probabilities of the autopilot dropping each packet (default 0 0.05)")
+    args = parser.parse_args()
+
+    # The dropped confirmations that run out of retries are logged as errors.
+    logging.getLogger('dronekit').setLevel(logging.CRITICAL)
+
+    params = collections.OrderedDict(('PARAM_%d' % i, i) for i in range(args.params))
+    autopilot = FakeAutopilot(params=params)
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+
+    print('%6s %14s %10s %10s' % ('drop', 'method', 'seconds', 'confirmed'))
+    for drop in args.drop:
+        for offset, (method, run) in enumerate([('set', one_by_one), ('set_many', set_many)]):
+            # New values each time, so every one is a change.
+            values = collections.OrderedDict((name, value + drop + offset + 1) for name, value in params.items())
+            autopilot.drop = drop
+            start = time.time()
+            confirmed = run(vehicle, values, args)
+            elapsed = time.time() - start
+            autopilot.drop = 0
+            print('%6.2f %14s %10.2f %10d' % (drop, method, elapsed, confirmed))
+
+    vehicle.close()
+    autopilot.close()
+
+
+if __name__ == '__main__':
+    main()
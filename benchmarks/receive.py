@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+receive.py:
+
+Measures the MAVConnection inbound path: latency from a packet being written
+to a local UDP socket until a message listener sees it, and how much CPU the
+connection burns while the link is quiet.
+"""
+from __future__ import print_function
+import argparse
+import time
+
+from dronekit.mavlink import MAVConnection
+from pymavlink import mavutil
+
+parser = argparse.ArgumentParser(description='Benchmark the MAVConnection receive loop.')
+parser.add_argument('--packets', type=int, default=2000,
+                    help="number of packets to send (default 2000)")
+parser.add_argument('--rate', type=float, default=200,
+                    help="packets per second to send (default 200)")
+parser.add_argument('--idle', type=float, default=5,
+                    help="seconds to measure idle CPU over (default 5)")
+args = parser.parse_args()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100.0), len(values) - 1)]
+
+
+conn = MAVConnection('udpin:127.0.0.1:0')
+port = conn.master.port.getsockname()[1]
+
+sent = {}
+latencies = []
+
+
+@conn.forward_message
+def listener(_, msg):
+    if msg.get_type() == 'ATTITUDE' and msg.time_boot_ms in sent:
+        latencies.append(time.time() - sent[msg.time_boot_ms])
+
+
+loop_calls = []
+
+
+# Stand-in for the periodic work a Vehicle registers.
+@conn.forward_loop
+def loop_listener(_):
+    loop_calls.append(time.time())
+
+
+conn.start()
+
+sender = mavutil.mavlink_connection('udpout:127.0.0.1:%d' % port, source_system=1)
+period = 1.0 / args.rate
+start = next_send = time.time()
+for i in range(args.packets):
+    next_send += period
+    time.sleep(max(next_send - time.time(), 0))
+    sent[i] = time.time()
+    sender.mav.attitude_send(i, 0, 0, 0, 0, 0, 0)
+end = time.time()
+time.sleep(0.5)
+
+latencies = [l * 1e6 for l in latencies]
+print('Received %d/%d packets, latency (us): p50 %.0f  p99 %.0f  p99.9 %.0f  max %.0f' % (
+    len(latencies), args.packets, percentile(latencies, 50), percentile(latencies, 99),
+    percentile(latencies, 99.9), max(latencies)))
+busy_calls = len([t for t in loop_calls if start <= t <= end])
+print('Loop listener calls while receiving: %.1f/s' % (busy_calls / (end - start)))
+
+cpu_start = time.process_time()
+time.sleep(args.idle)
+cpu = time.process_time() - cpu_start
+print('Idle CPU over %.1fs: %.2f%%' % (args.idle, 100.0 * cpu / args.idle))
+
+sender.close()
+conn.close()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+reconnect.py:
+
+Measures how long it takes to get a working Vehicle back after a link
+dropout: by connecting again with ``wait_ready=True``, and with
+``Vehicle.reconnect()``, which keeps the parameters and mission it already
+has after checking them. The vehicle is a FakeAutopilot serving as many
+parameters as an ArduCopter.
+"""
+from __future__ import print_function
+import argparse
+import collections
+import time
+
+from dronekit import connect
+from dronekit.test.fake_autopilot import FakeAutopilot
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark reconnecting after a dropout.')
+    parser.add_argument('--params', type=int, default=800,
+                        help="parameters the autopilot has (default 800)")
+    parser.add_argument('--drop', type=float, default=0.0,
+                        help="probability of the autopilot dropping each packet (default 0)")
+    args = parser.parse_args()
+
+    params = collections.OrderedDict(('PARAM_%d' % i, i) for i in range(args.params))
+    autopilot = FakeAutopilot(params=params, drop=args.drop)
+
+    vehicle = connect(autopilot.connection_string, wait_ready=True, heartbeat_timeout=1)
+    vehicle.commands.download()
+    vehicle.commands.wait_ready()
+
+    # A dropout long enough for the connection to give up.
+    autopilot.paused = True
+    while vehicle._handler._alive:
+        time.sleep(0.1)
+    autopilot.paused = False
+
+    report = vehicle.reconnect()
+    vehicle.wait_ready(True)
+    print('Vehicle.reconnect():          %.2fs (parameters %s, mission %s)' % (
+        report['seconds'], report['parameters'], report['mission']))
+    vehicle.close()
+
+    start = time.time()
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+    vehicle.commands.download()
+    vehicle.commands.wait_ready()
+    print('connect(wait_ready=True):     %.2fs' % (time.time() - start))
+    vehicle.close()
+    autopilot.close()
+
+
+if __name__ == '__main__':
+    main()
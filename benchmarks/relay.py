@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+relay.py:
+
+Measures a MAVConnection.pipe() relay between a vehicle link and a ground
+station link, packing each message again and forwarding the raw bytes. A
+child process sends SYSTEM_TIME packets stamped with the time they were sent
+to the relay's ``udpin:`` port; another receives what the relay forwards and
+reports the latency each packet picked up. This process reports the CPU it
+used per relayed packet.
+"""
+from __future__ import print_function
+import argparse
+import multiprocessing
+import socket
+import time
+
+from dronekit.mavlink import MAVConnection
+from pymavlink import mavutil
+
+
+def send(port, packets, rate):
+    mav = mavutil.mavlink.MAVLink(None, srcSystem=1)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    start = time.time()
+    for i in range(packets):
+        delay = start + i / float(rate) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        pkt = mav.system_time_encode(int(time.time() * 1e6), i).pack(mav)
+        sock.sendto(pkt, ('127.0.0.1', port))
+    sock.close()
+
+
+def receive(sock, packets, pipe):
+    parser = mavutil.mavlink.MAVLink(None)
+    latencies = []
+    sock.settimeout(2)
+    try:
+        while len(latencies) < packets:
+            data = sock.recv(65535)
+            now = time.time()
+            for msg in parser.parse_buffer(data) or []:
+                latencies.append(now - msg.time_unix_usec / 1e6)
+    except socket.timeout:
+        pass
+    pipe.send(latencies)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100.0), len(values) - 1)]
+
+
+def run(args, raw):
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('127.0.0.1', 0))
+    sink.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    ours, theirs = multiprocessing.Pipe()
+    receiver = multiprocessing.Process(target=receive, args=(sink, args.packets, theirs))
+    receiver.start()
+
+    vehicle = MAVConnection('udpin:127.0.0.1:0', target_system=1)
+    vehicle.master.port.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    gcs = MAVConnection('udpout:127.0.0.1:%d' % sink.getsockname()[1])
+    vehicle.pipe(gcs, raw=raw)
+    vehicle.start()
+    gcs.start()
+
+    cpu_start = time.process_time()
+    sender = multiprocessing.Process(target=send, args=(vehicle.master.port.getsockname()[1],
+                                                       args.packets, args.rate))
+    sender.start()
+    sender.join()
+    latencies = ours.recv()
+    cpu = time.process_time() - cpu_start
+    receiver.join()
+    vehicle.close()
+    gcs.close()
+    sink.close()
+    return latencies, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark a MAVConnection.pipe() relay.')
+    parser.add_argument('--packets', type=int, default=50000,
+                        help="packets to relay (default 50000)")
+    parser.add_argument('--rate', type=float, default=10000,
+                        help="packets per second sent (default 10000)")
+    args = parser.parse_args()
+
+    print('%8s %10s %16s %10s %10s' % ('mode', 'relayed', 'us CPU/packet', 'p50 (us)', 'p99 (us)'))
+    for mode in ('repack', 'raw'):
+        latencies, cpu = run(args, mode == 'raw')
+        samples = [l * 1e6 for l in latencies]
+        print('%8s %10d %16.1f %10.0f %10.0f' % (mode, len(samples), 1e6 * cpu / max(len(samples), 1),
+                                                 percentile(samples, 50), percentile(samples, 99)))
+
+
+if __name__ == '__main__':
+    main()
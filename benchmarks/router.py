@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+router.py:
+
+Measures the CPU used per packet fanning a vehicle's telemetry out to several
+ground station endpoints, with one raw MAVConnection.pipe() per endpoint and
+with a MAVRouter. A child process plays the vehicle, sending to a ``udpin:``
+connection; the endpoints are ``udpout:`` connections to local sockets.
+"""
+from __future__ import print_function
+import argparse
+import multiprocessing
+import socket
+import time
+
+from dronekit.mavlink import MAVConnection, MAVRouter
+from pymavlink import mavutil
+
+
+def send(port, packets, rate):
+    mav = mavutil.mavlink.MAVLink(None, srcSystem=1)
+    pkt = mav.attitude_encode(0, 0, 0, 0, 0, 0, 0).pack(mav)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    start = time.time()
+    for i in range(packets):
+        delay = start + i / float(rate) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        sock.sendto(pkt, ('127.0.0.1', port))
+    sock.close()
+
+
+def run(args, endpoints, mode):
+    sinks = []
+    for _ in range(endpoints):
+        sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sink.bind(('127.0.0.1', 0))
+        sinks.append(sink)
+    vehicle = MAVConnection('udpin:127.0.0.1:0')
+    gcs = [MAVConnection('udpout:127.0.0.1:%d' % sink.getsockname()[1]) for sink in sinks]
+    received = []
+    vehicle.forward_raw(lambda _, pkt: received.append(1))
+    if mode == 'router':
+        router = MAVRouter()
+        router.add(vehicle)
+        for conn in gcs:
+            router.add(conn)
+    else:
+        for conn in gcs:
+            vehicle.pipe(conn, raw=True)
+    for conn in [vehicle] + gcs:
+        conn.start()
+
+    cpu_start = time.process_time()
+    child = multiprocessing.Process(target=send, args=(vehicle.master.port.getsockname()[1],
+                                                      args.packets, args.rate))
+    child.start()
+    child.join()
+    time.sleep(0.2)
+    cpu = time.process_time() - cpu_start
+    for conn in [vehicle] + gcs:
+        conn.close()
+    for sink in sinks:
+        sink.close()
+    return len(received), cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fanning telemetry out to several endpoints.')
+    parser.add_argument('--endpoints', default='1,4,8',
+                        help="comma-separated endpoint counts (default 1,4,8)")
+    parser.add_argument('--packets', type=int, default=20000,
+                        help="packets to send (default 20000)")
+    parser.add_argument('--rate', type=float, default=5000,
+                        help="packets per second sent (default 5000)")
+    args = parser.parse_args()
+
+    print('%10s %8s %10s %16s' % ('endpoints', 'mode', 'packets', 'us CPU/packet'))
+    for endpoints in [int(n) for n in args.endpoints.split(',')]:
+        for mode in ('pipes', 'router'):
+            packets, cpu = run(args, endpoints, mode)
+            print('%10d %8s %10d %16.1f' % (endpoints, mode, packets, 1e6 * cpu / packets))
+
+
+if __name__ == '__main__':
+    main()
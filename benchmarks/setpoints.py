@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+setpoints.py:
+
+Measures how stale setpoints are when they leave for the vehicle, for a
+control loop sending SET_POSITION_TARGET_LOCAL_NED faster than a paced link
+can carry them: with every setpoint queued, with a bounded lane dropping the
+oldest, and with latest-value-wins coalescing (the default). Each setpoint
+carries the time it was sent, so its age is known when the writer hands it
+to the link.
+"""
+from __future__ import print_function
+import argparse
+import struct
+import time
+
+from dronekit.mavlink import MAVConnection
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100.0), len(values) - 1)]
+
+
+def split(buf):
+    pkts = []
+    while buf:
+        size = 8 + bytearray(buf[1:2])[0]
+        pkts.append(buf[:size])
+        buf = buf[size:]
+    return pkts
+
+
+def run(args, **kwargs):
+    conn = MAVConnection('udpout:127.0.0.1:9', bandwidth=args.bandwidth, **kwargs)
+    ages = []
+    start = time.time()
+
+    def write(buf):
+        now = time.time()
+        for pkt in split(buf):
+            # time_boot_ms is the first payload field.
+            sent_ms = struct.unpack_from('<I', bytes(pkt), 6)[0]
+            ages.append(now - start - sent_ms / 1000.0)
+
+    conn.master.write = write
+    conn.start()
+
+    period = 1.0 / args.rate
+    next_tick = time.time()
+    while time.time() - start < args.duration:
+        ms = int((time.time() - start) * 1000)
+        conn.master.mav.set_position_target_local_ned_send(ms, 1, 1, 1, 0b110111111000,
+                                                           0, 0, -10, 0, 0, 0, 0, 0, 0, 0, 0)
+        next_tick += period
+        time.sleep(max(next_tick - time.time(), 0))
+    stats = conn.out_queue.stats()['control']
+    conn.close()
+    return ages, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark setpoint staleness on a congested link.')
+    parser.add_argument('--rate', type=float, default=50,
+                        help="setpoints per second (default 50)")
+    parser.add_argument('--bandwidth', type=float, default=1500,
+                        help="bytes per second the link carries (default 1500, about 25 setpoints/s)")
+    parser.add_argument('--duration', type=float, default=5,
+                        help="seconds to send for (default 5)")
+    args = parser.parse_args()
+
+    modes = [
+        ('queue all', dict(coalesce=False)),
+        ('drop oldest (10)', dict(coalesce=False, queue_limits={'control': 10})),
+        ('coalesce', dict(coalesce=True)),
+    ]
+    print('%17s %6s %8s %8s %10s %10s %10s' % ('mode', 'sent', 'dropped', 'merged', 'p50 (ms)', 'p99 (ms)',
+                                              'last (ms)'))
+    for name, kwargs in modes:
+        ages, stats = run(args, **kwargs)
+        print('%17s %6d %8d %8d %10.0f %10.0f %10.0f' % (
+            name, len(ages), stats['dropped'], stats['coalesced'],
+            percentile(ages, 50) * 1000, percentile(ages, 99) * 1000, ages[-1] * 1000))
+
+
+if __name__ == '__main__':
+    main()
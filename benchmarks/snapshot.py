@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+snapshot.py:
+
+Measures what it costs a second local process to follow a vehicle's state:
+through a shared-memory snapshot from ``Vehicle.publish_telemetry()``, and
+through a Vehicle of its own fed by ``MAVConnection.pipe()``. Also hammers the
+snapshot with back-to-back writes to count reads that had to be retried and
+check that none of them came back torn.
+"""
+from __future__ import print_function
+import argparse
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from dronekit import connect
+from dronekit.mavlink import MAVConnection
+from dronekit.snapshot import TelemetryReader
+from dronekit.test.fake_autopilot import FakeAutopilot
+
+
+def cpu():
+    return sum(os.times()[:2])
+
+
+def follow_snapshot(path, seconds, poll, results):
+    reader = TelemetryReader(path)
+    start, reads, cpu_start = time.time(), 0, cpu()
+    while time.time() - start < seconds:
+        reader.read()
+        reads += 1
+        time.sleep(poll)
+    cpu_used = cpu() - cpu_start
+
+    n = 100000
+    t = time.time()
+    for _ in range(n):
+        reader.read_raw()
+    raw = (time.time() - t) / n
+    t = time.time()
+    for _ in range(n):
+        reader.read()
+    full = (time.time() - t) / n
+    results.put((cpu_used, reads, raw, full))
+
+
+def follow_connection(address, seconds, results):
+    vehicle = connect(address, wait_ready=['attitude'])
+    updates = [0]
+    vehicle.add_attribute_listener('attitude', lambda *args: updates.__setitem__(0, updates[0] + 1))
+    cpu_start = cpu()
+    time.sleep(seconds)
+    results.put((cpu() - cpu_start, updates[0]))
+    vehicle.close()
+
+
+def check_torn(path, seconds, results):
+    reader = TelemetryReader(path)
+    start, reads, torn = time.time(), 0, 0
+    while time.time() - start < seconds:
+        a = reader.read().attitude
+        if not a.pitch == a.yaw == a.roll:
+            torn += 1
+        reads += 1
+    results.put((reads, reader.retries, torn))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark shared-memory telemetry snapshots.')
+    parser.add_argument('--seconds', type=float, default=5,
+                        help="how long each consumer runs (default 5)")
+    parser.add_argument('--rate', type=int, default=50,
+                        help="telemetry rate of the autopilot in Hz (default 50)")
+    args = parser.parse_args()
+
+    autopilot = FakeAutopilot(rate=args.rate)
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+    fd, path = tempfile.mkstemp(dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    os.close(fd)
+    publisher = vehicle.publish_telemetry(path)
+    results = multiprocessing.Queue()
+
+    child = multiprocessing.Process(target=follow_snapshot,
+                                    args=(path, args.seconds, 1.0 / args.rate, results))
+    child.start()
+    cpu_used, reads, raw, full = results.get()
+    child.join()
+    print('snapshot reader:    %5.1f%% CPU polling at %d Hz, read_raw() %.2f us, read() %.2f us' % (
+        100 * cpu_used / args.seconds, args.rate, raw * 1e6, full * 1e6))
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    target = MAVConnection('udpout:127.0.0.1:%d' % port)
+    target.start()
+    vehicle._handler.pipe(target, raw=True)
+    child = multiprocessing.Process(target=follow_connection,
+                                    args=('udpin:127.0.0.1:%d' % port, args.seconds, results))
+    child.start()
+    cpu_used, updates = results.get()
+    child.join()
+    print('piped Vehicle:      %5.1f%% CPU for %d attitude updates' % (
+        100 * cpu_used / args.seconds, updates))
+    target.close()
+
+    # Nothing else touches the vehicle while the writer hammers the record.
+    autopilot.paused = True
+    time.sleep(0.2)
+    stop = threading.Event()
+    writes = [0]
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            vehicle._pitch = vehicle._yaw = vehicle._roll = float(i)
+            publisher.publish()
+        writes[0] = i
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    child = multiprocessing.Process(target=check_torn, args=(path, args.seconds, results))
+    child.start()
+    reads, retries, torn = results.get()
+    child.join()
+    stop.set()
+    thread.join()
+    print('under %d writes/s:  %d reads/s, %d retried, %d torn' % (
+        writes[0] / args.seconds, reads / args.seconds, retries, torn))
+
+    publisher.close()
+    os.unlink(path)
+    vehicle.close()
+    autopilot.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+udpin.py:
+
+Measures how many packets per second a ``udpin:`` MAVConnection can receive
+and dispatch on loopback. A child process plays several vehicles sharing the
+port and sends one packet per datagram as fast as it can; this process counts
+what reaches a message listener.
+"""
+from __future__ import print_function
+import argparse
+import multiprocessing
+import socket
+import time
+
+from dronekit.mavlink import MAVConnection
+from pymavlink import mavutil
+
+
+def blast(port, packets, vehicles):
+    # Pre-pack one ATTITUDE per vehicle, so the sender is as cheap as possible.
+    datagrams = []
+    for sysid in range(1, vehicles + 1):
+        mav = mavutil.mavlink.MAVLink(None, srcSystem=sysid)
+        datagrams.append(mav.attitude_encode(0, 0, 0, 0, 0, 0, 0).pack(mav))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for i in range(packets):
+        sock.sendto(datagrams[i % vehicles], ('127.0.0.1', port))
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the udpin receive path.')
+    parser.add_argument('--packets', type=int, default=200000,
+                        help="number of packets to send (default 200000)")
+    parser.add_argument('--vehicles', type=int, default=4,
+                        help="number of source systems sharing the port (default 4)")
+    args = parser.parse_args()
+
+    conn = MAVConnection('udpin:127.0.0.1:0')
+    conn.master.port.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    port = conn.master.port.getsockname()[1]
+
+    arrivals = []
+
+    @conn.forward_message
+    def listener(_, msg):
+        arrivals.append(time.time())
+
+    conn.start()
+    cpu_start = time.process_time()
+    child = multiprocessing.Process(target=blast, args=(port, args.packets, args.vehicles))
+    child.start()
+    child.join()
+    # Wait until the connection has caught up, or gone quiet (the kernel drops
+    # datagrams once the receive buffer overflows).
+    while len(arrivals) < args.packets and time.time() - arrivals[-1] < 1:
+        time.sleep(0.01)
+    cpu = time.process_time() - cpu_start
+    conn.close()
+
+    received = len(arrivals)
+    elapsed = arrivals[-1] - arrivals[0]
+    print('Received %d/%d packets in %.3fs: %.0f packets/s, %.1f us CPU/packet' % (
+        received, args.packets, elapsed, received / elapsed, 1e6 * cpu / received))
+
+
+if __name__ == '__main__':
+    main()
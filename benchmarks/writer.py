@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+writer.py:
+
+Measures the MAVConnection outbound path: how many packets per second can be
+pushed through the writer thread to a local UDP sink, and how much CPU the
+connection burns while the link is idle.
+"""
+from __future__ import print_function
+import argparse
+import socket
+import threading
+import time
+
+from dronekit.mavlink import MAVConnection
+from pymavlink import mavutil
+
+parser = argparse.ArgumentParser(description='Benchmark the MAVConnection writer thread.')
+parser.add_argument('--packets', type=int, default=50000,
+                    help="number of packets to send (default 50000)")
+parser.add_argument('--idle', type=float, default=5,
+                    help="seconds to measure idle CPU over (default 5)")
+args = parser.parse_args()
+
+
+class Sink(object):
+    """Counts MAVLink packets (and datagrams) arriving on a local UDP port."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.2)
+        self.port = self.sock.getsockname()[1]
+        self.parser = mavutil.mavlink.MAVLink(None)
+        self.packets = 0
+        self.datagrams = 0
+        self.last_arrival = None
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            try:
+                data = self.sock.recv(65535)
+            except socket.timeout:
+                continue
+            self.datagrams += 1
+            self.packets += len(self.parser.parse_buffer(data) or [])
+            self.last_arrival = time.time()
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.sock.close()
+
+
+sink = Sink()
+conn = MAVConnection('udpout:127.0.0.1:%d' % sink.port)
+conn.start()
+
+start = time.time()
+for _ in range(args.packets):
+    conn.master.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_GCS,
+                                   mavutil.mavlink.MAV_AUTOPILOT_INVALID, 0, 0, 0)
+# Wait until the sink has everything, or has gone quiet (the kernel drops
+# datagrams once the receive buffer overflows).
+while sink.packets < args.packets:
+    time.sleep(0.01)
+    if sink.last_arrival and time.time() - sink.last_arrival > 1:
+        break
+elapsed = sink.last_arrival - start
+sink.stop()
+
+print('Received %d/%d packets in %.3fs: %.0f packets/s, %d datagrams (%.1f packets/datagram)' % (
+    sink.packets, args.packets, elapsed, sink.packets / elapsed, sink.datagrams,
+    sink.packets / float(max(sink.datagrams, 1))))
+
+# The sink is stopped, so from here on only the connection's own threads run.
+cpu_start = time.process_time()
+time.sleep(args.idle)
+cpu = time.process_time() - cpu_start
+print('Idle CPU over %.1fs: %.2f%%' % (args.idle, 100.0 * cpu / args.idle))
+
+conn.close()
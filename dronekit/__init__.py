@@ -44,8 +44,9 @@ else:
 import copy
 import logging
 import math
+import random
 import struct
-import time
+import threading
 
 import monotonic
 from past.builtins import basestring
@@ -53,6 +54,7 @@ from past.builtins import basestring
 from pymavlink import mavutil, mavwp
 from pymavlink.dialects.v10 import ardupilotmega
 
+from dronekit.params import float_bits, ParamCache, ParamDownload
 from dronekit.util import ErrprinterHandler
 
 
@@ -68,6 +70,33 @@ class TimeoutError(APIException):
     '''Raised by operations that have timeouts.'''
 
 
+# ArduPilot answers a request for this parameter with a hash of them all.
+HASH_CHECK = '_HASH_CHECK'
+
+# Seconds connect() waits for the AUTOPILOT_VERSION that picks the parameter
+# cache entry, then for a _HASH_CHECK (which not every autopilot has) and for
+# the vehicle to confirm the entry altogether.
+PARAM_CACHE_VERSION_TIMEOUT = 2
+HASH_CHECK_TIMEOUT = 2
+PARAM_CACHE_TIMEOUT = 10
+
+# Parameters (besides the first and last) compared to check a cache entry,
+# when the vehicle has no _HASH_CHECK.
+PARAM_CACHE_SAMPLES = 10
+
+
+class CommandFailed(APIException):
+    '''
+    Raised for a command the vehicle refused, i.e. acknowledged with a result other than
+    ``MAV_RESULT_ACCEPTED``. The ``COMMAND_ACK`` message is in ``ack`` and its result in ``result``.
+    '''
+
+    def __init__(self, message, ack):
+        super(CommandFailed, self).__init__(message)
+        self.ack = ack
+        self.result = ack.result
+
+
 class Attitude(object):
     """
     Attitude information.
@@ -557,7 +586,422 @@ class SystemStatus(object):
         return self.state != other
 
 
+class QueuedListener(object):
+    """
+    Runs a message or attribute listener on an executor instead of the thread that reads the link.
+
+    Listeners registered with an ``executor`` (see :py:func:`Vehicle.add_message_listener` and
+    :py:func:`HasObservers.add_attribute_listener`) are wrapped in one of these. Calls are queued
+    and handed to the executor one at a time, so they run in the order they were made even on a
+    pool of many threads, and never two at once.
+
+    The queue holds at most ``queue_size`` calls; when it is full the oldest is dropped. With
+    ``coalesce`` a call for a name (message type or attribute) that is already queued replaces the
+    queued value instead of joining the end of the queue, so a listener that falls behind gets
+    the latest value rather than a backlog.
+
+    :param fn: The listener, called as ``fn(object, name, value)``.
+    :param executor: A :py:class:`concurrent.futures.Executor` (or anything with a ``submit(fn)``
+        method) or an asyncio event loop, which calls the listener on its own thread.
+    :param int queue_size: The most calls waiting to run.
+    :param Boolean coalesce: Keep only the latest value for each name.
+    """
+
+    def __init__(self, fn, executor, queue_size=16, coalesce=True, logger=None, kind='message'):
+        self.fn = self.__wrapped__ = fn
+        self.queue_size = queue_size
+        self.coalesce = coalesce
+        self.dropped = 0
+        self.coalesced = 0
+        self._kind = kind
+        self._logger = logger or logging.getLogger(__name__)
+        if hasattr(executor, 'call_soon_threadsafe'):
+            self._submit = executor.call_soon_threadsafe
+        else:
+            self._submit = executor.submit
+        self._lock = threading.Lock()
+        # Queued calls as [object, name, value] lists; coalescing updates them in place.
+        self._pending = collections.deque()
+        self._latest = {}
+        self._scheduled = False
+
+    def __call__(self, owner, name, value):
+        with self._lock:
+            entry = self._latest.get(name) if self.coalesce else None
+            if entry is not None:
+                entry[2] = value
+                self.coalesced += 1
+                return
+            if len(self._pending) >= self.queue_size:
+                self._forget(self._pending.popleft())
+                self.dropped += 1
+            entry = [owner, name, value]
+            self._pending.append(entry)
+            if self.coalesce:
+                self._latest[name] = entry
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._schedule()
+
+    def _forget(self, entry):
+        if self._latest.get(entry[1]) is entry:
+            del self._latest[entry[1]]
+
+    def _schedule(self):
+        try:
+            self._submit(self._run)
+        except Exception:
+            # The executor was shut down (or the loop closed).
+            self._logger.exception('Cannot run %s handler', self._kind)
+            with self._lock:
+                self._pending.clear()
+                self._latest.clear()
+                self._scheduled = False
+
+    def _run(self):
+        # One call per task, then back of the executor's queue, so a busy
+        # listener does not hog a loop or a pool thread.
+        with self._lock:
+            entry = self._pending.popleft()
+            self._forget(entry)
+        try:
+            self.fn(*entry)
+        except Exception:
+            self._logger.exception('Exception in %s handler for %s', self._kind, entry[1])
+        with self._lock:
+            if not self._pending:
+                self._scheduled = False
+                return
+        self._schedule()
+
+    # Compares equal to the listener it wraps, so it can be removed by it.
+    def __eq__(self, other):
+        if isinstance(other, QueuedListener):
+            other = other.fn
+        return self.fn == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.fn)
+
+
+def _numeric(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def attribute_change(old, new):
+    """
+    How far an attribute value has moved from ``old`` to ``new``, for listener deadbands:
+
+    * numbers: the absolute difference.
+    * :py:class:`LocationGlobal` and :py:class:`LocationGlobalRelative`: the distance in metres
+      (flat-earth approximation, altitude included).
+    * :py:class:`LocationLocal`: the distance in metres.
+    * :py:class:`Attitude`: the largest change of pitch, yaw or roll in radians (yaw wrapping
+      around).
+    * lists and tuples, and other objects: the largest change of any element or field.
+
+    A value that appears, disappears or changes in a way that cannot be measured (a string,
+    say) counts as an infinite change, as does ``new`` being the very same object as ``old``
+    (such as :py:attr:`Vehicle.location`, which is updated in place).
+    """
+    if old is new:
+        return 0.0 if old is None or _numeric(old) else float('inf')
+    if old is None or new is None:
+        return float('inf')
+    if _numeric(old) and _numeric(new):
+        return abs(new - old)
+    if type(old) is not type(new):
+        return float('inf')
+    if isinstance(new, (LocationGlobal, LocationGlobalRelative)):
+        if None in (old.lat, old.lon, new.lat, new.lon):
+            return attribute_change([old.lat, old.lon, old.alt], [new.lat, new.lon, new.alt])
+        north = (new.lat - old.lat) * 1.113195e5
+        east = (new.lon - old.lon) * 1.113195e5 * math.cos(math.radians(new.lat))
+        up = attribute_change(old.alt, new.alt) if old.alt is not None or new.alt is not None else 0.0
+        return math.sqrt(north * north + east * east + up * up)
+    if isinstance(new, LocationLocal):
+        changes = [attribute_change(getattr(old, axis), getattr(new, axis)) for axis in ('north', 'east', 'down')]
+        return math.sqrt(sum(change * change for change in changes))
+    if isinstance(new, Attitude):
+        changes = [attribute_change(old.pitch, new.pitch), attribute_change(old.roll, new.roll)]
+        if old.yaw is not None and new.yaw is not None:
+            changes.append(abs((new.yaw - old.yaw + math.pi) % (2 * math.pi) - math.pi))
+        else:
+            changes.append(attribute_change(old.yaw, new.yaw))
+        return max(changes)
+    if isinstance(new, (list, tuple)):
+        if len(old) != len(new):
+            return float('inf')
+        return max([attribute_change(a, b) for a, b in zip(old, new)] or [0.0])
+    fields = getattr(new, '__dict__', None)
+    if fields is not None:
+        return max([attribute_change(getattr(old, field, None), value) for field, value in fields.items()] or [0.0])
+    return 0.0 if old == new else float('inf')
+
+
+class FilteredListener(object):
+    """
+    Passes an attribute listener only the updates that matter to it.
+
+    Listeners registered with a ``deadband`` or ``min_interval`` (see
+    :py:func:`HasObservers.add_attribute_listener`) are wrapped in one of these. The filters are
+    applied where the attribute is notified, for each attribute name separately:
+
+    * ``deadband``: an update is dropped unless it has moved at least this far from the last value
+      the listener was given, as measured by :py:func:`attribute_change`. A dict of field names to
+      deadbands (e.g. ``{'alt': 0.5}``) looks at just those fields instead.
+    * ``min_interval``: the listener is called at most once every ``min_interval`` seconds. Updates
+      in between are held back, each replacing the last, and the latest is delivered once the
+      interval is up (by :py:class:`Vehicle`'s loop, so within about 50 ms of it).
+
+    :param fn: The listener, called as ``fn(object, attr_name, value)``.
+    :param deadband: A number, or a dict of field names to numbers.
+    :param float min_interval: Seconds between two calls.
+    """
+
+    def __init__(self, fn, deadband=None, min_interval=None, logger=None):
+        self.fn = fn
+        self.__wrapped__ = getattr(fn, '__wrapped__', fn)
+        self.deadband = deadband
+        self.min_interval = min_interval
+        self._logger = logger or logging.getLogger(__name__)
+        # Per attribute name: the value last delivered, when it was delivered
+        # and the update held back until the interval is up.
+        self._last = {}
+        self._sent = {}
+        self._held = {}
+        # Updates come from the reader thread, flushes from the vehicle's loop.
+        self._lock = threading.Lock()
+
+    def _changed(self, old, new):
+        if isinstance(self.deadband, dict):
+            for field, deadband in self.deadband.items():
+                if attribute_change(getattr(old, field, None), getattr(new, field, None)) >= deadband:
+                    return True
+            return False
+        return attribute_change(old, new) >= self.deadband
+
+    def __call__(self, owner, name, value):
+        with self._lock:
+            if self.deadband is not None and name in self._last and not self._changed(self._last[name], value):
+                # Back within the deadband: nothing new worth delivering.
+                self._held.pop(name, None)
+                return
+            if self.min_interval:
+                now = monotonic.monotonic()
+                if now - self._sent.get(name, float('-inf')) < self.min_interval:
+                    self._held[name] = (owner, value)
+                    return
+                self._held.pop(name, None)
+                self._sent[name] = now
+            self._delivered(name, value)
+        # Called without the lock, so the listener may itself update attributes.
+        self.fn(owner, name, value)
+
+    def _delivered(self, name, value):
+        # Called with the lock held.
+        if self.deadband is not None:
+            self._last[name] = value
+
+    def flush(self, now):
+        """
+        Deliver the updates held back for which ``min_interval`` has passed by ``now``.
+        """
+        with self._lock:
+            due = [(name, self._held.pop(name)) for name in list(self._held)
+                   if now - self._sent[name] >= self.min_interval]
+            for name, (owner, value) in due:
+                self._sent[name] = now
+                self._delivered(name, value)
+        for name, (owner, value) in due:
+            try:
+                self.fn(owner, name, value)
+            except Exception:
+                self._logger.exception('Exception in attribute handler for %s', name)
+
+    # Compares equal to the listener it wraps, so it can be removed by it.
+    def __eq__(self, other):
+        if isinstance(other, FilteredListener):
+            other = other.fn
+        return self.fn == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.fn)
+
+
+def _enum_name(enum, value):
+    entry = mavutil.mavlink.enums.get(enum, {}).get(value)
+    return entry.name if entry is not None else str(value)
+
+
+class _PendingCommand(object):
+    __slots__ = ('future', 'message', 'key', 'retries', 'timeout', 'progress_timeout', 'attempts',
+                 'deadline', 'in_progress')
+
+    def __init__(self, future, message, key, retries, timeout, progress_timeout):
+        self.future = future
+        self.message = message
+        self.key = key
+        self.retries = retries
+        self.timeout = timeout
+        self.progress_timeout = progress_timeout
+        self.attempts = 0
+        self.deadline = None
+        self.in_progress = False
+
+
+class CommandTracker(object):
+    """
+    Matches ``COMMAND_ACK`` messages to the ``COMMAND_LONG`` commands sent by
+    :py:func:`Vehicle.command_long`, resending the commands that go unanswered.
+
+    An ack only names the command it answers, so commands are told apart by target system and
+    command number: different commands are in flight at once, but a command sent again before
+    the vehicle has answered the last one waits for that answer before it goes out.
+
+    Acks and timeouts are handled on the thread that reads the link (timeouts by
+    :py:class:`Vehicle`'s loop, so within about 50 ms), and that is where the futures' done
+    callbacks run.
+
+    :param send: Called with each ``COMMAND_LONG`` message to send.
+    """
+
+    def __init__(self, send, logger=None):
+        self._send = send
+        self._logger = logger or logging.getLogger(__name__)
+        # Commands are sent from any thread and answered on the reader thread.
+        self._lock = threading.Lock()
+        # (target system, command) -> commands waiting, the first one in flight.
+        self._pending = {}
+
+    def submit(self, message, target_system, retries=3, timeout=1.0, progress_timeout=30):
+        """
+        Send ``message`` (a ``COMMAND_LONG``) as soon as no other command like it is in flight.
+        Returns a :py:class:`concurrent.futures.Future` for its ``COMMAND_ACK``.
+        """
+        from concurrent.futures import Future
+
+        future = Future()
+        future.progress = None
+        key = (target_system, message.command)
+        command = _PendingCommand(future, message, key, retries, timeout, progress_timeout)
+        with self._lock:
+            queue = self._pending.setdefault(key, collections.deque())
+            queue.append(command)
+            first = len(queue) == 1
+            if first:
+                self._sent(command, monotonic.monotonic())
+        if first:
+            self._send(message)
+        return future
+
+    def _sent(self, command, now):
+        # The confirmation field counts the times the command was sent before.
+        command.message.confirmation = command.attempts
+        command.attempts += 1
+        command.deadline = now + command.timeout
+
+    def _next(self, key, now):
+        # Pop the command in flight for key, returning the next one to send (if any).
+        queue = self._pending[key]
+        queue.popleft()
+        while queue and queue[0].future.cancelled():
+            queue.popleft()
+        if not queue:
+            del self._pending[key]
+            return None
+        self._sent(queue[0], now)
+        return queue[0]
+
+    def on_ack(self, msg):
+        """Resolve the command ``msg`` (a ``COMMAND_ACK``) answers, if it is waiting for one."""
+        now = monotonic.monotonic()
+        with self._lock:
+            key = (msg.get_srcSystem(), msg.command)
+            if key not in self._pending:
+                # Sent before the vehicle's system ID was known.
+                key = (0, msg.command)
+                if key not in self._pending:
+                    return
+            command = self._pending[key][0]
+            if msg.result == mavutil.mavlink.MAV_RESULT_IN_PROGRESS:
+                # Still working on it: stop resending and wait longer.
+                command.in_progress = True
+                command.future.progress = getattr(msg, 'progress', None)
+                command.deadline = now + command.progress_timeout
+                return
+            following = self._next(key, now)
+        if following is not None:
+            self._send(following.message)
+        if msg.result == mavutil.mavlink.MAV_RESULT_ACCEPTED:
+            self._resolve(command.future, msg)
+        else:
+            self._resolve(command.future, exception=CommandFailed(
+                '%s failed: %s' % (_enum_name('MAV_CMD', msg.command), _enum_name('MAV_RESULT', msg.result)),
+                msg))
+
+    def check(self, now):
+        """Resend or give up on the commands still unanswered at ``now``."""
+        failed = []
+        sends = []
+        with self._lock:
+            for key in list(self._pending):
+                command = self._pending[key][0]
+                if command.future.cancelled():
+                    pass
+                elif now < command.deadline:
+                    continue
+                elif not command.in_progress and command.attempts <= command.retries:
+                    self._sent(command, now)
+                    sends.append(command.message)
+                    continue
+                else:
+                    failed.append(command)
+                following = self._next(key, now)
+                if following is not None:
+                    sends.append(following.message)
+        for message in sends:
+            self._send(message)
+        for command in failed:
+            name = _enum_name('MAV_CMD', command.message.command)
+            if command.in_progress:
+                error = TimeoutError('%s made no progress in %s seconds' % (name, command.progress_timeout))
+            else:
+                error = TimeoutError('No COMMAND_ACK for %s after %d attempts' % (name, command.attempts))
+            self._resolve(command.future, exception=error)
+
+    def close(self):
+        """Fail every command still waiting."""
+        with self._lock:
+            commands = [command for queue in self._pending.values() for command in queue]
+            self._pending = {}
+        for command in commands:
+            self._resolve(command.future, exception=APIException('Connection closed'))
+
+    def _resolve(self, future, result=None, exception=None):
+        if future.done():
+            return
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except Exception:
+            # Cancelled in the meantime.
+            self._logger.debug('Command future already resolved', exc_info=True)
+
+
 class HasObservers(object):
+    # Set by Vehicle.enable_dispatch_stats() to time listeners.
+    _dispatch_profiler = None
+
     def __init__(self):
         logging.basicConfig()
         self._logger = logging.getLogger(__name__)
@@ -565,8 +1009,11 @@ class HasObservers(object):
         # A mapping from attr_name to a list of observers
         self._attribute_listeners = {}
         self._attribute_cache = {}
+        # Listeners with a min_interval, which may be holding back an update.
+        self._throttled_listeners = []
 
-    def add_attribute_listener(self, attr_name, observer):
+    def add_attribute_listener(self, attr_name, observer, executor=None, queue_size=16, coalesce=True,
+                               deadband=None, min_interval=None):
         """
         Add an attribute listener callback.
 
@@ -605,16 +1052,55 @@ class HasObservers(object):
 
         See :ref:`vehicle_state_observe_attributes` for more information.
 
+        Observers run on the thread that reads the link, so one that blocks (on disk, network or a GUI)
+        holds up every message behind it. Pass an ``executor`` to run it elsewhere instead, in order and
+        one call at a time (see :py:class:`QueuedListener`):
+
+        .. code:: python
+
+            pool = concurrent.futures.ThreadPoolExecutor(4)
+            vehicle.add_attribute_listener('global_frame', location_callback, executor=pool)
+
         :param String attr_name: The name of the attribute to watch (or '*' to watch all attributes).
         :param observer: The callback to invoke when a change in the attribute is detected.
+        :param executor: A :py:class:`concurrent.futures.Executor` or asyncio event loop to call the
+            observer on, rather than the thread that reads the link.
+        :param int queue_size: With an ``executor``, the most calls that may wait to run; the oldest
+            is dropped when the queue is full.
+        :param Boolean coalesce: With an ``executor``, a value for an attribute still waiting to be
+            delivered is replaced by the newer one (the default).
+
+        Sensor attributes are updated with every message, often tens of times a second. A display or
+        log that only needs changes that matter can ask for less (see :py:class:`FilteredListener`):
+
+        .. code:: python
+
+            # Only when the vehicle has moved half a metre, and at most twice a second.
+            vehicle.add_attribute_listener('location.global_frame', location_callback,
+                                           deadband=0.5, min_interval=0.5)
+
+            # Attitude changes of at least a degree.
+            vehicle.add_attribute_listener('attitude', attitude_callback, deadband=math.radians(1))
+
+        :param deadband: Only notify the observer once the value has moved at least this far from the
+            last one it was given (metres for locations, radians for attitude; see
+            :py:func:`attribute_change`), or a dict of field names to deadbands.
+        :param float min_interval: Notify the observer at most once every ``min_interval`` seconds,
+            with the latest value.
 
         """
+        if executor is not None:
+            observer = QueuedListener(observer, executor, queue_size, coalesce, self._logger, 'attribute')
+        if deadband is not None or min_interval:
+            observer = FilteredListener(observer, deadband, min_interval, self._logger)
         listeners_for_attr = self._attribute_listeners.get(attr_name)
         if listeners_for_attr is None:
             listeners_for_attr = []
             self._attribute_listeners[attr_name] = listeners_for_attr
         if observer not in listeners_for_attr:
             listeners_for_attr.append(observer)
+            if getattr(observer, 'min_interval', None):
+                self._throttled_listeners.append(observer)
 
     def remove_attribute_listener(self, attr_name, observer):
         """
@@ -635,10 +1121,20 @@ class HasObservers(object):
         """
         listeners_for_attr = self._attribute_listeners.get(attr_name)
         if listeners_for_attr is not None:
-            listeners_for_attr.remove(observer)
+            index = listeners_for_attr.index(observer)
+            removed = listeners_for_attr.pop(index)
+            if removed in self._throttled_listeners:
+                self._throttled_listeners = [l for l in self._throttled_listeners if l is not removed]
             if len(listeners_for_attr) == 0:
                 del self._attribute_listeners[attr_name]
 
+    def _has_attribute_listeners(self, attr_name):
+        # Whether notifying attr_name would reach anyone, so message handlers
+        # can skip building a value nobody receives. Cached attributes must
+        # still be notified, to keep their cache current.
+        listeners = self._attribute_listeners
+        return attr_name in listeners or '*' in listeners
+
     def notify_attribute_listeners(self, attr_name, value, cache=False):
         """
         This method is used to update attribute observers when the named attribute is updated.
@@ -666,6 +1162,12 @@ class HasObservers(object):
                 return
             self._attribute_cache[attr_name] = value
 
+        profiler = self._dispatch_profiler
+        if profiler is not None:
+            profiler.dispatch('attribute', self, self._attribute_listeners.get(attr_name, []) +
+                              self._attribute_listeners.get('*', []), attr_name, value)
+            return
+
         # Notify observers.
         for fn in self._attribute_listeners.get(attr_name, []):
             try:
@@ -679,7 +1181,7 @@ class HasObservers(object):
             except Exception:
                 self._logger.exception('Exception in attribute handler for %s' % attr_name, exc_info=True)
 
-    def on_attribute(self, name):
+    def on_attribute(self, name, executor=None, queue_size=16, coalesce=True, deadband=None, min_interval=None):
         """
         Decorator for attribute listeners.
 
@@ -715,14 +1217,21 @@ class HasObservers(object):
 
         :param String name: The name of the attribute to watch (or '*' to watch all attributes).
         :param observer: The callback to invoke when a change in the attribute is detected.
+        :param executor: Where to run the observer instead of the thread that reads the link
+            (see :py:func:`add_attribute_listener`).
+        :param int queue_size: With an ``executor``, the most calls that may wait to run.
+        :param Boolean coalesce: With an ``executor``, keep only the latest value of each attribute.
+        :param deadband: Only notify the observer of changes at least this big
+            (see :py:func:`add_attribute_listener`).
+        :param float min_interval: Notify the observer at most once every ``min_interval`` seconds.
         """
 
         def decorator(fn):
             if isinstance(name, list):
                 for n in name:
-                    self.add_attribute_listener(n, fn)
+                    self.add_attribute_listener(n, fn, executor, queue_size, coalesce, deadband, min_interval)
             else:
-                self.add_attribute_listener(name, fn)
+                self.add_attribute_listener(name, fn, executor, queue_size, coalesce, deadband, min_interval)
 
         return decorator
 
@@ -899,19 +1408,24 @@ class Locations(HasObservers):
         def listener(vehicle, name, m):
             (self._lat, self._lon) = (m.lat / 1.0e7, m.lon / 1.0e7)
             self._relative_alt = m.relative_alt / 1000.0
-            self.notify_attribute_listeners('global_relative_frame', self.global_relative_frame)
-            vehicle.notify_attribute_listeners('location.global_relative_frame',
-                                               vehicle.location.global_relative_frame)
+            if self._has_attribute_listeners('global_relative_frame'):
+                self.notify_attribute_listeners('global_relative_frame', self.global_relative_frame)
+            if vehicle._has_attribute_listeners('location.global_relative_frame'):
+                vehicle.notify_attribute_listeners('location.global_relative_frame',
+                                                   vehicle.location.global_relative_frame)
 
             if self._alt is not None or m.alt != 0:
                 # Require first alt value to be non-0
                 # TODO is this the proper check to do?
                 self._alt = m.alt / 1000.0
-                self.notify_attribute_listeners('global_frame', self.global_frame)
-                vehicle.notify_attribute_listeners('location.global_frame',
-                                                   vehicle.location.global_frame)
+                if self._has_attribute_listeners('global_frame'):
+                    self.notify_attribute_listeners('global_frame', self.global_frame)
+                if vehicle._has_attribute_listeners('location.global_frame'):
+                    vehicle.notify_attribute_listeners('location.global_frame',
+                                                       vehicle.location.global_frame)
 
-            vehicle.notify_attribute_listeners('location', vehicle.location)
+            if vehicle._has_attribute_listeners('location'):
+                vehicle.notify_attribute_listeners('location', vehicle.location)
 
         self._north = None
         self._east = None
@@ -922,9 +1436,12 @@ class Locations(HasObservers):
             self._north = m.x
             self._east = m.y
             self._down = m.z
-            self.notify_attribute_listeners('local_frame', self.local_frame)
-            vehicle.notify_attribute_listeners('location.local_frame', vehicle.location.local_frame)
-            vehicle.notify_attribute_listeners('location', vehicle.location)
+            if self._has_attribute_listeners('local_frame'):
+                self.notify_attribute_listeners('local_frame', self.local_frame)
+            if vehicle._has_attribute_listeners('location.local_frame'):
+                vehicle.notify_attribute_listeners('location.local_frame', vehicle.location.local_frame)
+            if vehicle._has_attribute_listeners('location'):
+                vehicle.notify_attribute_listeners('location', vehicle.location)
 
     @property
     def local_frame(self):
@@ -1068,16 +1585,26 @@ class Vehicle(HasObservers):
         # Default parameters when calling wait_ready() or wait_ready(True).
         self._default_ready_attrs = ['parameters', 'gps_0', 'armed', 'mode', 'attitude']
 
-        @self.on_attribute('*')
-        def listener(_, name, value):
-            self._ready_attrs.add(name)
+        # Threads blocked in wait_for() and friends, woken whenever a message
+        # has been handled or an attribute notified (see _wait_for_state).
+        self._state_changed = threading.Condition()
+        self._state_waiters = 0
+
+        # Attributes are marked ready as they are notified (or skipped for
+        # want of listeners), see _has_attribute_listeners below. A '*'
+        # listener would make every attribute look observed.
 
         # Attaches message listeners.
         self._message_listeners = dict()
+        self._compile_message_listeners()
 
         @handler.forward_message
         def listener(_, msg):
-            self.notify_message_listeners(msg.get_type(), msg)
+            self._dispatch_message(msg)
+
+        # Only messages somebody listens to need decoding.
+        self._message_dispatcher = listener
+        self._update_message_interest()
 
         self._location = Locations(self)
         self._vx = None
@@ -1108,7 +1635,8 @@ class Vehicle(HasObservers):
         @self.on_message('GLOBAL_POSITION_INT')
         def listener(self, name, m):
             (self._vx, self._vy, self._vz) = (m.vx / 100.0, m.vy / 100.0, m.vz / 100.0)
-            self.notify_attribute_listeners('velocity', self.velocity)
+            if self._has_attribute_listeners('velocity'):
+                self.notify_attribute_listeners('velocity', self.velocity)
 
         self._pitch = None
         self._yaw = None
@@ -1125,7 +1653,8 @@ class Vehicle(HasObservers):
             self._pitchspeed = m.pitchspeed
             self._yawspeed = m.yawspeed
             self._rollspeed = m.rollspeed
-            self.notify_attribute_listeners('attitude', self.attitude)
+            if self._has_attribute_listeners('attitude'):
+                self.notify_attribute_listeners('attitude', self.attitude)
 
         self._heading = None
         self._airspeed = None
@@ -1134,11 +1663,14 @@ class Vehicle(HasObservers):
         @self.on_message('VFR_HUD')
         def listener(self, name, m):
             self._heading = m.heading
-            self.notify_attribute_listeners('heading', self.heading)
+            if self._has_attribute_listeners('heading'):
+                self.notify_attribute_listeners('heading', self.heading)
             self._airspeed = m.airspeed
-            self.notify_attribute_listeners('airspeed', self.airspeed)
+            if self._has_attribute_listeners('airspeed'):
+                self.notify_attribute_listeners('airspeed', self.airspeed)
             self._groundspeed = m.groundspeed
-            self.notify_attribute_listeners('groundspeed', self.groundspeed)
+            if self._has_attribute_listeners('groundspeed'):
+                self.notify_attribute_listeners('groundspeed', self.groundspeed)
 
         self._rngfnd_distance = None
         self._rngfnd_voltage = None
@@ -1147,7 +1679,8 @@ class Vehicle(HasObservers):
         def listener(self, name, m):
             self._rngfnd_distance = m.distance
             self._rngfnd_voltage = m.voltage
-            self.notify_attribute_listeners('rangefinder', self.rangefinder)
+            if self._has_attribute_listeners('rangefinder'):
+                self.notify_attribute_listeners('rangefinder', self.rangefinder)
 
         self._mount_pitch = None
         self._mount_yaw = None
@@ -1158,14 +1691,17 @@ class Vehicle(HasObservers):
             self._mount_pitch = m.pointing_a / 100.0
             self._mount_roll = m.pointing_b / 100.0
             self._mount_yaw = m.pointing_c / 100.0
-            self.notify_attribute_listeners('mount', self.mount_status)
+            if self._has_attribute_listeners('mount'):
+                self.notify_attribute_listeners('mount', self.mount_status)
 
         self._capabilities = None
         self._raw_version = None
+        self._autopilot_version_msg = None
         self._autopilot_version_msg_count = 0
 
         @self.on_message('AUTOPILOT_VERSION')
         def listener(vehicle, name, m):
+            self._autopilot_version_msg = m
             self._capabilities = m.capabilities
             self._raw_version = m.flight_sw_version
             self._autopilot_version_msg_count += 1
@@ -1204,7 +1740,8 @@ class Vehicle(HasObservers):
             self._voltage = m.voltage_battery
             self._current = m.current_battery
             self._level = m.battery_remaining
-            self.notify_attribute_listeners('battery', self.battery)
+            if self._has_attribute_listeners('battery'):
+                self.notify_attribute_listeners('battery', self.battery)
 
         self._eph = None
         self._epv = None
@@ -1217,7 +1754,8 @@ class Vehicle(HasObservers):
             self._epv = m.epv
             self._satellites_visible = m.satellites_visible
             self._fix_type = m.fix_type
-            self.notify_attribute_listeners('gps_0', self.gps_0)
+            if self._has_attribute_listeners('gps_0'):
+                self.notify_attribute_listeners('gps_0', self.gps_0)
 
         self._current_waypoint = 0
 
@@ -1321,62 +1859,72 @@ class Vehicle(HasObservers):
 
         # Parameters.
 
-        start_duration = 0.2
-        repeat_duration = 1
-
         self._params_count = -1
         self._params_set = []
         self._params_loaded = False
         self._params_start = False
         self._params_map = {}
-        self._params_last = monotonic.monotonic()  # Last new param.
-        self._params_duration = start_duration
+        # Checking cached parameters against a fresh stream from the vehicle
+        # (see _validate_param_cache), and how many of them have differed.
+        self._params_refreshing = False
+        self._params_changed = 0
+        self._param_download = ParamDownload(
+            lambda index: self._master.mav.param_request_read_send(0, 0, b'', index))
+        self._param_cache = None
         self._parameters = Parameters(self)
 
         @handler.forward_loop
         def listener(_):
-            # Check the time duration for last "new" params exceeds watchdog.
-            if not self._params_start:
-                return
-
-            if not self._params_loaded and all(x is not None for x in self._params_set):
-                self._params_loaded = True
-                self.notify_attribute_listeners('parameters', self.parameters)
-
-            if not self._params_loaded and monotonic.monotonic() - self._params_last > self._params_duration:
-                c = 0
-                for i, v in enumerate(self._params_set):
-                    if v is None:
-                        self._master.mav.param_request_read_send(0, 0, b'', i)
-                        c += 1
-                        if c > 50:
-                            break
-                self._params_duration = repeat_duration
-                self._params_last = monotonic.monotonic()
+            # Ask again for the parameters lost on the way.
+            if self._params_start and (not self._params_loaded or self._params_refreshing):
+                self._param_download.check(monotonic.monotonic())
 
         @self.on_message(['PARAM_VALUE'])
         def listener(self, name, msg):
+            if msg.param_id == HASH_CHECK:
+                # Not a parameter.
+                return
+            now = monotonic.monotonic()
             # If we discover a new param count, assume we
             # are receiving a new param set.
             if self._params_count != msg.param_count:
                 self._params_loaded = False
+                self._params_refreshing = False
                 self._params_start = True
                 self._params_count = msg.param_count
                 self._params_set = [None] * msg.param_count
+                self._param_download.start(msg.param_count, now)
 
             # Attempt to set the params. We throw an error
             # if the index is out of range of the count or
             # we lack a param_id.
             try:
+                loaded = False
                 if msg.param_index < msg.param_count and msg:
-                    if self._params_set[msg.param_index] is None:
-                        self._params_last = monotonic.monotonic()
-                        self._params_duration = start_duration
+                    if self._params_refreshing:
+                        cached = self._params_set[msg.param_index]
+                        if cached is None or (cached.param_id, cached.param_value) != (msg.param_id, msg.param_value):
+                            self._params_changed += 1
                     self._params_set[msg.param_index] = msg
+                    loaded = (self._param_download.received(msg.param_index, now) and
+                              self._param_download.complete and
+                              (self._params_refreshing or not self._params_loaded))
 
                 self._params_map[msg.param_id] = msg.param_value
                 self._parameters.notify_attribute_listeners(msg.param_id, msg.param_value,
                                                             cache=True)
+                if loaded:
+                    if self._params_refreshing:
+                        self._params_refreshing = False
+                        self._logger.info('Parameters refreshed, %d of %d changed' % (
+                            self._params_changed, self._params_count))
+                    else:
+                        self._params_loaded = True
+                        self.notify_attribute_listeners('parameters', self.parameters)
+                    if self._param_cache is not None and self._autopilot_version_msg is not None:
+                        thread = threading.Thread(target=self._save_param_cache)
+                        thread.daemon = True
+                        thread.start()
             except:
                 import traceback
                 traceback.print_exc()
@@ -1429,6 +1977,26 @@ class Vehicle(HasObservers):
                 self._last_heartbeat = monotonic.monotonic() - self._heartbeat_lastreceived
                 self.notify_attribute_listeners('last_heartbeat', self.last_heartbeat)
 
+        @handler.forward_loop
+        def listener(_):
+            # Deliver updates held back by min_interval listeners.
+            now = monotonic.monotonic()
+            for observed in (self, self._location, self._parameters):
+                for fn in observed._throttled_listeners:
+                    fn.flush(now)
+
+        # Acknowledged commands.
+
+        self._command_tracker = CommandTracker(self.send_mavlink, self._logger)
+
+        @self.on_message('COMMAND_ACK')
+        def listener(self, name, msg):
+            self._command_tracker.on_ack(msg)
+
+        @handler.forward_loop
+        def listener(_):
+            self._command_tracker.check(monotonic.monotonic())
+
     @property
     def last_heartbeat(self):
         """
@@ -1453,7 +2021,7 @@ class Vehicle(HasObservers):
                     pause_script=False;
                     print "Un-pausing script"
 
-        The observer will be called at the period of the messaging loop (about every 0.01 seconds). Testing
+        The observer will be called at the period of the messaging loop (every 0.05 seconds by default). Testing
         on SITL indicates that ``last_heartbeat`` averages about .5 seconds, but will rarely exceed 1.5 seconds
         when connected. Whether heartbeat monitoring can be useful will very much depend on the application.
 
@@ -1466,7 +2034,7 @@ class Vehicle(HasObservers):
         """
         return self._last_heartbeat
 
-    def on_message(self, name):
+    def on_message(self, name, executor=None, queue_size=16, coalesce=False):
         """
         Decorator for message listener callback functions.
 
@@ -1495,18 +2063,22 @@ class Vehicle(HasObservers):
         See :ref:`mavlink_messages` for more information.
 
         :param String name: The name of the message to be intercepted by the decorated listener function (or '*' to get all messages).
+        :param executor: Where to run the listener instead of the thread that reads the link
+            (see :py:func:`add_message_listener`).
+        :param int queue_size: With an ``executor``, the most calls that may wait to run.
+        :param Boolean coalesce: With an ``executor``, keep only the latest message of each type.
         """
 
         def decorator(fn):
             if isinstance(name, list):
                 for n in name:
-                    self.add_message_listener(n, fn)
+                    self.add_message_listener(n, fn, executor, queue_size, coalesce)
             else:
-                self.add_message_listener(name, fn)
+                self.add_message_listener(name, fn, executor, queue_size, coalesce)
 
         return decorator
 
-    def add_message_listener(self, name, fn):
+    def add_message_listener(self, name, fn, executor=None, queue_size=16, coalesce=False):
         """
         Adds a message listener function that will be called every time the specified message is received.
 
@@ -1535,14 +2107,37 @@ class Vehicle(HasObservers):
 
         See :ref:`mavlink_messages` for more information.
 
+        Listeners run on the thread that reads the link, so one that blocks (on disk, network or a GUI)
+        delays every message behind it, heartbeats included. Pass an ``executor`` to run it elsewhere
+        instead, in order and one call at a time (see :py:class:`QueuedListener`):
+
+        .. code:: python
+
+            pool = concurrent.futures.ThreadPoolExecutor(4)
+            vehicle.add_message_listener('STATUSTEXT', log_to_server, executor=pool)
+
+            # Or on an asyncio event loop (called from its thread)
+            vehicle.add_message_listener('ATTITUDE', update_display, executor=loop, coalesce=True)
+
         :param String name: The name of the message to be intercepted by the listener function (or '*' to get all messages).
         :param fn: The listener function that will be called if a message is received.
+        :param executor: A :py:class:`concurrent.futures.Executor` or asyncio event loop to call the
+            listener on, rather than the thread that reads the link.
+        :param int queue_size: With an ``executor``, the most messages that may wait to be handled; the
+            oldest is dropped when the queue is full.
+        :param Boolean coalesce: With an ``executor``, a message still waiting to be handled is replaced
+            by a newer one of the same type. Off by default, as messages such as ``STATUSTEXT`` are events
+            rather than state.
         """
+        if executor is not None:
+            fn = QueuedListener(fn, executor, queue_size, coalesce, self._logger, 'message')
         name = str(name)
         if name not in self._message_listeners:
             self._message_listeners[name] = []
+            self._update_message_interest()
         if fn not in self._message_listeners[name]:
             self._message_listeners[name].append(fn)
+            self._compile_message_listeners()
 
     def remove_message_listener(self, name, fn):
         """
@@ -1560,21 +2155,185 @@ class Vehicle(HasObservers):
                 self._message_listeners[name].remove(fn)
                 if len(self._message_listeners[name]) == 0:
                     del self._message_listeners[name]
+                    self._update_message_interest()
+                self._compile_message_listeners()
+
+    def _update_message_interest(self):
+        self._handler.set_message_interest(self._message_dispatcher, list(self._message_listeners))
+
+    def _compile_message_listeners(self):
+        # Precompute the listeners to call for each message id, '*' listeners
+        # included, so dispatching a message is one list index. Names with no
+        # id in the dialect (BAD_DATA, UNKNOWN_<n>, or legacy aliases such as
+        # WAYPOINT) are looked up by name; ids beyond the table only have the
+        # '*' listeners. Rebuilt whenever a listener is added or removed, and
+        # swapped in whole so the reader thread never sees it half built.
+        wildcard = tuple(self._message_listeners.get('*', ()))
+        by_name = {}
+        by_id = {}
+        for name, fns in self._message_listeners.items():
+            if name == '*':
+                continue
+            by_name[name] = tuple(fns) + wildcard
+            msgid = getattr(mavutil.mavlink, 'MAVLINK_MSG_ID_' + name, None)
+            if msgid is not None and msgid >= 0:
+                by_id[msgid] = by_name[name]
+        table = [wildcard] * (max(by_id) + 1 if by_id else 0)
+        for msgid, fns in by_id.items():
+            table[msgid] = fns
+        self._message_dispatch = (table, by_name, wildcard)
+
+    def _dispatch_message(self, msg):
+        table, by_name, wildcard = self._message_dispatch
+        # What get_type() and get_msgId() return, without the method calls.
+        name = msg._type
+        msgid = msg._header.msgId
+        if 0 <= msgid < len(table):
+            fns = table[msgid]
+        elif msgid < 0:
+            fns = by_name.get(name, wildcard)
+        else:
+            fns = wildcard
+        profiler = self._dispatch_profiler
+        if profiler is not None:
+            profiler.dispatch('message', self, fns, name, msg)
+        else:
+            for fn in fns:
+                try:
+                    fn(self, name, msg)
+                except Exception:
+                    self._logger.exception('Exception in message handler for %s', name)
+        if self._state_waiters:
+            self._wake_waiters()
 
     def notify_message_listeners(self, name, msg):
-        for fn in self._message_listeners.get(name, []):
+        table, by_name, wildcard = self._message_dispatch
+        profiler = self._dispatch_profiler
+        if profiler is not None:
+            profiler.dispatch('message', self, by_name.get(name, wildcard), name, msg)
+        else:
+            for fn in by_name.get(name, wildcard):
+                try:
+                    fn(self, name, msg)
+                except Exception:
+                    self._logger.exception('Exception in message handler for %s', name)
+        if self._state_waiters:
+            self._wake_waiters()
+
+    def _wake_waiters(self):
+        with self._state_changed:
+            self._state_changed.notify_all()
+
+    def _wait_for_state(self, condition, timeout=None, interval=1):
+        # Block until condition() is true, checking it again each time the
+        # vehicle's state may have changed: after every message handled and
+        # every attribute notified. Conditions on anything else (another
+        # thread's flag, the clock) are still checked every interval seconds.
+        # Returns False if timeout (if nonzero) seconds pass first.
+        deadline = monotonic.monotonic() + timeout if timeout else None
+        with self._state_changed:
+            self._state_waiters += 1
             try:
-                fn(self, name, msg)
-            except Exception:
-                self._logger.exception('Exception in message handler for %s' % msg.get_type(), exc_info=True)
+                while not condition():
+                    wait = interval
+                    if deadline is not None:
+                        remaining = deadline - monotonic.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._state_changed.wait(wait)
+            finally:
+                self._state_waiters -= 1
+        return True
 
-        for fn in self._message_listeners.get('*', []):
-            try:
-                fn(self, name, msg)
-            except Exception:
-                self._logger.exception('Exception in message handler for %s' % msg.get_type(), exc_info=True)
+    def publish_telemetry(self, path):
+        """
+        Publish the vehicle's state to a memory-mapped file that other local processes can read.
+
+        The file holds a fixed-layout record of the location frames, attitude, velocity, battery,
+        mode, armed state, GPS information and last heartbeat, and is rewritten as the messages
+        behind them arrive. Open it with :py:class:`dronekit.snapshot.TelemetryReader` to read
+        consistent snapshots without a MAVLink connection of your own:
+
+        .. code:: python
+
+            vehicle.publish_telemetry('/dev/shm/dronekit-1')
+
+            # In another process
+            from dronekit.snapshot import TelemetryReader
+            print(TelemetryReader('/dev/shm/dronekit-1').read().mode)
+
+        :param path: The file to publish to (created if needed). Paths under ``/dev/shm`` stay in memory.
+        :returns: The :py:class:`dronekit.snapshot.TelemetryPublisher`; call its ``close()`` to stop.
+        """
+        from dronekit.snapshot import TelemetryPublisher
+        return TelemetryPublisher(self, path)
+
+    def _has_attribute_listeners(self, attr_name):
+        # An attribute counts as ready for wait_ready() once it has been
+        # updated, whether or not anyone was told.
+        self._ready_attrs.add(attr_name)
+        return super(Vehicle, self)._has_attribute_listeners(attr_name)
+
+    def notify_attribute_listeners(self, attr_name, value, cache=False):
+        self._ready_attrs.add(attr_name)
+        super(Vehicle, self).notify_attribute_listeners(attr_name, value, cache)
+        if self._state_waiters:
+            self._wake_waiters()
+
+    def enable_dispatch_stats(self, budget=0.01):
+        """
+        Start timing the vehicle's message and attribute listeners (including those of
+        :py:attr:`location` and :py:attr:`parameters`).
+
+        All listeners run in turn on the thread that reads the link, so one slow callback holds up
+        every message behind it. Each call is timed, listeners that take longer than ``budget``
+        are logged as warnings, and :py:func:`dispatch_stats` reports the call counts and latencies.
+        Timing adds a little overhead to every listener call; turn it off again with
+        :py:func:`disable_dispatch_stats`.
+
+        :param float budget: Seconds a listener may take before it is logged as slow (default 10 ms).
+        :returns: The :py:class:`dronekit.profiling.DispatchProfiler` collecting the stats.
+        """
+        from dronekit.profiling import DispatchProfiler
+        profiler = DispatchProfiler(budget, self._logger)
+        for observed in (self, self._location, self._parameters):
+            observed._dispatch_profiler = profiler
+        return profiler
+
+    def disable_dispatch_stats(self):
+        """
+        Stop timing listeners (see :py:func:`enable_dispatch_stats`) and discard the stats.
+        """
+        for observed in (self, self._location, self._parameters):
+            observed._dispatch_profiler = None
+
+    def dispatch_stats(self, reset=False):
+        """
+        Call counts and latencies of the vehicle's listeners since :py:func:`enable_dispatch_stats`
+        (or the last reset), or ``None`` if timing is not enabled.
+
+        All times are in seconds. The result is a dictionary with:
+
+        * ``budget`` - the budget listeners are held to.
+        * ``messages`` - for each message type, the time taken by all of its listeners together.
+        * ``attributes`` - likewise for each attribute.
+        * ``listeners`` - one entry for each listener and message or attribute name, slowest
+          (by total time) first, with its ``kind`` (``'message'`` or ``'attribute'``), ``name``
+          and a readable ``listener`` name (module, function and line).
+
+        Each timing has ``count``, ``total``, ``mean``, ``max``, the number of ``slow`` calls
+        (listeners only), and a ``histogram`` of ``(upper bound, calls)`` pairs, the last bound
+        being ``None``.
+
+        :param Boolean reset: Start counting again from zero after reading.
+        """
+        if self._dispatch_profiler is None:
+            return None
+        return self._dispatch_profiler.stats(reset)
 
     def close(self):
+        self._command_tracker.close()
         return self._handler.close()
 
     def flush(self):
@@ -2049,22 +2808,21 @@ class Vehicle(HasObservers):
         """
         return self._parameters
 
-    def wait_for(self, condition, timeout=None, interval=0.1, errmsg=None):
+    def wait_for(self, condition, timeout=None, interval=1, errmsg=None):
         '''Wait for a condition to be True.
 
         Wait for condition, a callable, to return True.  If timeout is
         nonzero, raise a TimeoutError(errmsg) if the condition is not
-        True after timeout seconds.  Check the condition everal
-        interval seconds.
-        '''
+        True after timeout seconds.
 
-        t0 = time.time()
-        while not condition():
-            t1 = time.time()
-            if timeout and (t1 - t0) >= timeout:
-                raise TimeoutError(errmsg)
+        The condition is checked again as soon as the vehicle's state may
+        have changed (whenever a message has been handled or an attribute
+        notified), so the wait ends as soon as the condition is met. A
+        condition on something else is also checked every interval seconds.
+        '''
 
-            time.sleep(interval)
+        if not self._wait_for_state(condition, timeout, interval):
+            raise TimeoutError(errmsg)
 
     def wait_for_armable(self, timeout=None):
         '''Wait for the vehicle to become armable.
@@ -2092,6 +2850,11 @@ class Vehicle(HasObservers):
             self.wait_for(lambda: self.armed, timeout=timeout,
                           errmsg='failed to arm vehicle')
 
+    def arm_async(self, wait=True, timeout=None):
+        '''Coroutine version of :py:func:`arm`, for vehicles returned by :py:func:`connect_async`.'''
+        from dronekit import aio
+        return aio.arm(self, wait=wait, timeout=timeout)
+
     def disarm(self, wait=True, timeout=None):
         '''Disarm the vehicle.
 
@@ -2163,6 +2926,15 @@ class Vehicle(HasObservers):
         if alt is not None:
             self.wait_for_alt(alt, epsilon=epsilon, timeout=timeout)
 
+    def simple_takeoff_async(self, alt=None, epsilon=0.1, timeout=None):
+        '''Coroutine version of :py:func:`wait_simple_takeoff`, for vehicles returned by
+        :py:func:`connect_async`.
+
+        Takes off and waits until the vehicle is within ``epsilon`` metres of ``alt``.
+        '''
+        from dronekit import aio
+        return aio.simple_takeoff(self, alt, epsilon=epsilon, timeout=timeout)
+
     def simple_takeoff(self, alt=None):
         """
         Take off and fly the vehicle to the specified altitude (in metres) and then wait for another command.
@@ -2243,6 +3015,50 @@ class Vehicle(HasObservers):
         if groundspeed is not None:
             self.groundspeed = groundspeed
 
+    def command_long(self, command, param1=0, param2=0, param3=0, param4=0, param5=0, param6=0, param7=0,
+                     target_component=0, retries=3, timeout=1.0, progress_timeout=30):
+        """
+        Send a ``COMMAND_LONG`` and return a :py:class:`concurrent.futures.Future` for the vehicle's answer.
+
+        The future's result is the ``COMMAND_ACK`` message if the vehicle accepted the command. If it
+        refused it the future raises :py:exc:`CommandFailed`, and if it never answered :py:exc:`TimeoutError`.
+        A command the vehicle answers with ``MAV_RESULT_IN_PROGRESS`` is not sent again; the future waits
+        for the final answer (its ``progress`` attribute holds the last progress reported, if any).
+
+        The command is sent again, with the ``confirmation`` field counting up, when no answer comes within
+        ``timeout`` seconds. Many commands can be in flight at once:
+
+        .. code:: python
+
+            futures = [vehicle.command_long(mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL, msgid, 100000)
+                       for msgid in (mavutil.mavlink.MAVLINK_MSG_ID_ATTITUDE,
+                                     mavutil.mavlink.MAVLINK_MSG_ID_VFR_HUD)]
+            for future in futures:
+                future.result(timeout=10)
+
+        ``COMMAND_ACK`` only says which command it answers, so the same command sent again before the
+        vehicle has answered it is held back until it has. Done callbacks run on the thread that reads the
+        link and should return quickly; in a coroutine, ``await asyncio.wrap_future(future)``.
+
+        The helpers that send a command, such as :py:func:`simple_takeoff`, :py:func:`reboot` and the
+        ``send_calibrate_*`` methods, send it once and return without waiting; send the same command
+        with ``command_long`` to know whether it was accepted.
+
+        :param command: The ``MAV_CMD`` to send.
+        :param param1: Parameters 1 to 7 of the command (default 0).
+        :param target_component: The component to send it to (default 0, any).
+        :param int retries: Times to send the command again if it is not answered.
+        :param float timeout: Seconds to wait for an answer to each attempt.
+        :param float progress_timeout: Seconds to wait after each ``MAV_RESULT_IN_PROGRESS`` answer.
+        """
+        message = self.message_factory.command_long_encode(
+            0, target_component,  # target_system, target_component
+            command,
+            0,  # confirmation
+            param1, param2, param3, param4, param5, param6, param7)
+        return self._command_tracker.submit(message, self._handler.target_system, retries=retries,
+                                            timeout=timeout, progress_timeout=progress_timeout)
+
     def send_mavlink(self, message):
         """
         This method is used to send raw MAVLink "custom messages" to the vehicle.
@@ -2301,7 +3117,7 @@ class Vehicle(HasObservers):
         """
         return self._master.mav
 
-    def initialize(self, rate=4, heartbeat_timeout=30):
+    def initialize(self, rate=4, heartbeat_timeout=30, param_cache=None):
         self._handler.start()
 
         # Start heartbeat polling.
@@ -2310,12 +3126,10 @@ class Vehicle(HasObservers):
         self._heartbeat_started = True
         self._heartbeat_lastreceived = start
 
-        # Poll for first heartbeat.
+        # Wait for first heartbeat.
         # If heartbeat times out, this will interrupt.
-        while self._handler._alive:
-            time.sleep(.1)
-            if self._heartbeat_lastreceived != start:
-                break
+        self._wait_for_state(lambda: self._heartbeat_lastreceived != start or not self._handler._alive,
+                             interval=0.1)
         if not self._handler._alive:
             raise APIException('Timeout in initializing connection.')
 
@@ -2323,10 +3137,7 @@ class Vehicle(HasObservers):
         self._handler.target_system = self._heartbeat_system
 
         # Wait until board has booted.
-        while True:
-            if self._flightmode not in [None, 'INITIALISING', 'MAV']:
-                break
-            time.sleep(0.1)
+        self._wait_for_state(lambda: self._flightmode not in [None, 'INITIALISING', 'MAV'])
 
         # Initialize data stream.
         if rate is not None:
@@ -2335,13 +3146,21 @@ class Vehicle(HasObservers):
 
         self.add_message_listener('HEARTBEAT', self.send_capabilities_request)
 
+        if param_cache is not None:
+            self._param_cache = param_cache if isinstance(param_cache, ParamCache) else ParamCache(param_cache)
+            # The cache entry depends on the autopilot's version, so ask for it now
+            # rather than at the next heartbeat.
+            self.send_capabilities_request(self, 'HEARTBEAT', None)
+            if (self._wait_for_state(lambda: self._autopilot_version_msg is not None,
+                                     timeout=PARAM_CACHE_VERSION_TIMEOUT) and self._load_param_cache()):
+                return
+
         # Ensure initial parameter download has started.
         while True:
             # This fn actually rate limits itself to every 2s.
             # Just retry with persistence to get our first param stream.
             self._master.param_fetch_all()
-            time.sleep(0.1)
-            if self._params_count > -1:
+            if self._wait_for_state(lambda: self._params_count > -1, timeout=0.1):
                 break
 
     def send_capabilties_request(self, vehicle, name, m):
@@ -2412,8 +3231,14 @@ class Vehicle(HasObservers):
         still_waiting_message_interval = kwargs.get('still_waiting_interval', 1)
 
         while not await_attributes.issubset(self._ready_attrs):
-            time.sleep(0.1)
+            wait = start + timeout - monotonic.monotonic()
+            if still_waiting_callback:
+                wait = min(wait, still_waiting_last_message_sent + still_waiting_message_interval -
+                           monotonic.monotonic())
+            self._wait_for_state(lambda: await_attributes.issubset(self._ready_attrs), max(wait, 0.001))
             now = monotonic.monotonic()
+            if await_attributes.issubset(self._ready_attrs):
+                break
             if now - start > timeout:
                 if raise_exception:
                     raise TimeoutError('wait_ready experienced a timeout after %s seconds.' %
@@ -2428,6 +3253,18 @@ class Vehicle(HasObservers):
 
         return True
 
+    def wait_ready_async(self, *types, **kwargs):
+        """
+        Coroutine version of :py:func:`wait_ready`, for vehicles returned by :py:func:`connect_async`.
+        It takes the same arguments.
+
+        .. code:: python
+
+            await vehicle.wait_ready_async('mode', 'airspeed')
+        """
+        from dronekit import aio
+        return aio.wait_ready(self, *types, **kwargs)
+
     def reboot(self):
         """Requests an autopilot reboot by sending a ``MAV_CMD_PREFLIGHT_REBOOT_SHUTDOWN`` command."""
 
@@ -2443,6 +3280,232 @@ class Vehicle(HasObservers):
 
         self.send_mavlink(reboot_msg)
 
+    def reconnect(self, timeout=30, rate=4, samples=3):
+        """
+        Re-establishes the link after a dropout (even one long enough for the connection to have given up)
+        or an autopilot reboot, keeping this object, its listeners and everything it has downloaded.
+
+        Once the vehicle is heard from again, the parameters and mission downloaded before are checked
+        against the vehicle instead of being downloaded again: the parameter count and a few sampled
+        values, and the number of mission items. Whatever has changed is downloaded again in the
+        background (use :py:func:`wait_ready` to wait for it).
+
+        .. code:: python
+
+            report = vehicle.reconnect()
+            print("Reconnected in %.2fs" % report['seconds'])
+
+        :param int timeout: Seconds to wait for the vehicle before raising an ``APIException``.
+        :param int rate: Data stream rate to request, as for :py:func:`connect`.
+        :param int samples: How many parameters (besides the first and last) to compare.
+        :returns: A ``dict`` with the ``seconds`` the reconnect took, and the state of the ``parameters``
+            and ``mission``: ``'kept'``, ``'reloading'``, or ``None`` if they had not been downloaded.
+        """
+        from dronekit.mavlink import packet_source
+
+        start = monotonic.monotonic()
+        deadline = start + timeout
+
+        # Any packet from the vehicle will do, rather than waiting for a heartbeat.
+        heard = []
+        sysid = self._heartbeat_system
+
+        def listener(_, pkt):
+            source = packet_source(pkt)
+            if source is not None and (sysid is None or source[0] == sysid):
+                heard.append(source)
+
+        self._heartbeat_lastreceived = start
+        self._heartbeat_timeout = False
+        self._handler.raw_listeners.append(listener)
+        try:
+            self._handler.reconnect()
+            self._master = self._handler.master
+            # Say hello now, rather than at the next heartbeat (a new UDP
+            # socket, for one, is unknown to the other end until it does).
+            self._master.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_GCS,
+                                            mavutil.mavlink.MAV_AUTOPILOT_INVALID, 0, 0, 0)
+            self._heartbeat_lastsent = monotonic.monotonic()
+            while not heard:
+                if not self._handler._alive or monotonic.monotonic() > deadline:
+                    raise APIException('Timeout in reconnecting.')
+                self._wait_for_state(lambda: heard, timeout=0.01)
+        finally:
+            self._handler.raw_listeners.remove(listener)
+        self._handler.target_system = heard[0][0]
+
+        if rate is not None:
+            self._master.mav.request_data_stream_send(0, 0, mavutil.mavlink.MAV_DATA_STREAM_ALL,
+                                                      rate, 1)
+
+        report = {
+            'parameters': self._revalidate_parameters(deadline, samples),
+            'mission': self._revalidate_mission(deadline),
+        }
+        report['seconds'] = monotonic.monotonic() - start
+        self._logger.info('Reconnected in %.2fs (parameters %s, mission %s)' % (
+            report['seconds'], report['parameters'], report['mission']))
+        return report
+
+    def _request_until(self, deadline, request, done):
+        # Send request() (again every 0.3s) until done() or the deadline.
+        while not done():
+            if monotonic.monotonic() > deadline:
+                raise APIException('Timeout in reconnecting.')
+            request()
+            self._wait_for_state(done, timeout=0.3)
+
+    def _revalidate_parameters(self, deadline, samples):
+        if not self._params_loaded:
+            if self._params_count > -1:
+                # Still downloading; carry on.
+                self._ready_attrs.discard('parameters')
+                self._master.param_fetch_all()
+                return 'reloading'
+            return None
+
+        count = self._params_count
+        if self._parameters_match(deadline, samples):
+            return 'kept'
+        # Start over (a new count already has).
+        if self._params_count == count:
+            self._params_set = [None] * count
+            self._param_download.start(count, monotonic.monotonic())
+        self._params_loaded = False
+        self._ready_attrs.discard('parameters')
+        self._master.param_fetch_all()
+        return 'reloading'
+
+    def _parameters_match(self, deadline, samples):
+        # Whether the vehicle still has the parameters we have, going by the
+        # first, the last and a sample of the others (and their count).
+        count = self._params_count
+        indexes = set([0, count - 1] + random.sample(range(count), min(samples, count)))
+        cached = dict((i, (self._params_set[i].param_id, self._params_set[i].param_value)) for i in indexes)
+        replies = {}
+
+        def listener(_, name, msg):
+            if msg.param_index in indexes:
+                replies[msg.param_index] = (msg.param_count, (msg.param_id, msg.param_value))
+
+        def request():
+            for i in indexes:
+                if i not in replies:
+                    self._master.mav.param_request_read_send(0, 0, b'', i)
+
+        self.add_message_listener('PARAM_VALUE', listener)
+        try:
+            self._request_until(deadline, request, lambda: len(replies) == len(indexes))
+        finally:
+            self.remove_message_listener('PARAM_VALUE', listener)
+        return all(replies[i] == (count, cached[i]) for i in indexes)
+
+    def _parameter_hash(self, deadline):
+        # The (count, hash) of the vehicle's parameters from ArduPilot's
+        # _HASH_CHECK, or None if it has not answered by the deadline.
+        replies = []
+
+        def listener(_, name, msg):
+            if msg.param_id == HASH_CHECK:
+                replies.append((msg.param_count, float_bits(msg.param_value)))
+
+        self.add_message_listener('PARAM_VALUE', listener)
+        try:
+            self._request_until(deadline, lambda: self._master.mav.param_request_read_send(
+                0, 0, HASH_CHECK.encode('ascii'), -1), lambda: replies)
+        except APIException:
+            return None
+        finally:
+            self.remove_message_listener('PARAM_VALUE', listener)
+        return replies[0]
+
+    def _load_param_cache(self):
+        # Serve the parameters from the cache, if it has them, and check them
+        # against the vehicle in the background.
+        entry = self._param_cache.load(self._heartbeat_system, self._autopilot_version_msg)
+        if entry is None:
+            return False
+        count = entry['count']
+        self._params_set = [
+            mavutil.mavlink.MAVLink_param_value_message(name.encode('ascii'), value, param_type, count, i)
+            for i, (name, value, param_type) in enumerate(entry['params'])]
+        self._params_map.update((name, value) for name, value, _ in entry['params'])
+        # As if they had been downloaded, so listeners only hear of the ones that later differ.
+        self._parameters._attribute_cache.update(self._params_map)
+        self._params_count = count
+        self._params_start = True
+        self._params_loaded = True
+        self.notify_attribute_listeners('parameters', self.parameters)
+        thread = threading.Thread(target=self._validate_param_cache, args=(entry,))
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def _validate_param_cache(self, entry):
+        deadline = monotonic.monotonic() + PARAM_CACHE_TIMEOUT
+        try:
+            checked = entry['hash'] is not None and self._parameter_hash(
+                monotonic.monotonic() + HASH_CHECK_TIMEOUT)
+            if checked:
+                valid = checked == (entry['count'], entry['hash'])
+            else:
+                valid = self._parameters_match(deadline, PARAM_CACHE_SAMPLES)
+        except APIException:
+            valid = False
+        if valid:
+            self._logger.debug('Parameter cache is up to date')
+            return
+        self._logger.info('Parameter cache is out of date, refreshing parameters')
+        count = self._params_count
+        if count == entry['count']:
+            # The cached parameters stay in place while the vehicle's stream is
+            # compared against them: the ones that differ are replaced (and
+            # notified), and only those missing from the stream are asked for
+            # one by one. A different count starts a full download instead.
+            self._params_changed = 0
+            self._param_download.start(count, monotonic.monotonic())
+            self._params_refreshing = True
+        self._master.param_fetch_all()
+
+    def _save_param_cache(self):
+        # Record the hash (if there is one) first, so it is no newer than the parameters.
+        found = self._parameter_hash(monotonic.monotonic() + HASH_CHECK_TIMEOUT)
+        params = [(msg.param_id, msg.param_value, msg.param_type) for msg in list(self._params_set)
+                  if msg is not None]
+        if len(params) != self._params_count:
+            return
+        param_hash = found[1] if found and found[0] == len(params) else None
+        try:
+            self._param_cache.save(self._heartbeat_system, self._autopilot_version_msg, params, param_hash)
+        except (IOError, OSError):
+            self._logger.warning('Could not save parameter cache', exc_info=True)
+
+    def _revalidate_mission(self, deadline):
+        if not self._wp_loaded:
+            # Still downloading; start again.
+            self._ready_attrs.discard('commands')
+            self.commands.download()
+            return 'reloading'
+        if self._wploader.count() == 0:
+            return None
+
+        counts = []
+
+        def listener(_, name, msg):
+            counts.append(msg.count)
+
+        self.add_message_listener('MISSION_COUNT', listener)
+        try:
+            self._request_until(deadline, self._master.waypoint_request_list_send, lambda: counts)
+        finally:
+            self.remove_message_listener('MISSION_COUNT', listener)
+
+        if counts[0] == self._wploader.count():
+            return 'kept'
+        self._ready_attrs.discard('commands')
+        self.commands.download()
+        return 'reloading'
+
     def send_calibrate_gyro(self):
         """Request gyroscope calibration."""
 
@@ -2797,25 +3860,132 @@ class Parameters(MutableMapping, HasObservers):
         remaining = retries
         while True:
             self._vehicle._master.param_set_send(name, value)
-            tstart = monotonic.monotonic()
             if remaining == 0:
                 break
             remaining -= 1
-            while monotonic.monotonic() - tstart < 1:
-                if name in self._vehicle._params_map and self._vehicle._params_map[name] == value:
-                    return True
-                time.sleep(0.1)
+            if self._vehicle._wait_for_state(
+                    lambda: name in self._vehicle._params_map and self._vehicle._params_map[name] == value,
+                    timeout=1):
+                return True
 
         if retries > 0:
             self._logger.error("timeout setting parameter %s to %f" % (name, value))
         return False
 
+    def set_many(self, params, window=10, retries=3, timeout=1.0, wait_ready=False):
+        """
+        Set many parameters at once, keeping up to ``window`` of them in flight.
+
+        Each ``PARAM_SET`` is confirmed by the ``PARAM_VALUE`` the vehicle sends back with the
+        parameter's name and the new value (compared as the single precision float MAVLink
+        carries). Those not confirmed within ``timeout`` seconds are sent again, up to ``retries``
+        times; the others are not sent twice.
+
+        .. code:: python
+
+            report = vehicle.parameters.set_many({'THR_MIN': 100, 'RTL_ALT': 1500})
+            failed = [name for name, result in report.items() if not result['ok']]
+
+        :param params: A dict of parameter names to values.
+        :param int window: Most parameters waiting for confirmation at any time.
+        :param int retries: Times to send a parameter again.
+        :param float timeout: Seconds to wait for each confirmation.
+        :param wait_ready: Wait for the parameters to be downloaded first, so that names the
+            vehicle does not have are reported without being sent.
+        :returns: A dict with an entry for each parameter, by its upper case name: a dict with ``ok``
+            (whether the vehicle confirmed the value), ``value`` (the last value the vehicle reported
+            for it, or ``None``) and ``attempts`` (times it was sent).
+        """
+        if wait_ready:
+            self.wait_ready()
+
+        vehicle = self._vehicle
+        queue = collections.deque()
+        report = {}
+        for name, value in params.items():
+            name = name.upper()
+            # The single precision float the vehicle will send back.
+            value = float(struct.unpack('f', struct.pack('f', value))[0])
+            report[name] = {'ok': False, 'value': None, 'attempts': 0}
+            if vehicle._params_loaded and name not in vehicle._params_map:
+                self._logger.error("no parameter %s to set" % name)
+                continue
+            queue.append((name, value))
+        requested = dict(queue)
+
+        # Filled in by the PARAM_VALUE listener on the reader thread.
+        replies = collections.deque()
+
+        def listener(_, msg_name, msg):
+            replies.append((msg.param_id, msg.param_value))
+
+        in_flight = collections.OrderedDict()  # name -> (value, deadline)
+        vehicle.add_message_listener('PARAM_VALUE', listener)
+        try:
+            while queue or in_flight:
+                while replies:
+                    name, value = replies.popleft()
+                    if name in in_flight:
+                        report[name]['value'] = value
+                        if value == in_flight[name][0]:
+                            report[name]['ok'] = True
+                            del in_flight[name]
+
+                now = monotonic.monotonic()
+                for name, (value, deadline) in list(in_flight.items()):
+                    if now < deadline:
+                        continue
+                    del in_flight[name]
+                    if report[name]['attempts'] <= retries:
+                        # Retried ahead of the ones not sent yet.
+                        queue.appendleft((name, value))
+
+                while queue and len(in_flight) < window:
+                    name, value = queue.popleft()
+                    vehicle._master.param_set_send(name, value)
+                    report[name]['attempts'] += 1
+                    in_flight[name] = (value, now + timeout)
+
+                if in_flight:
+                    first = min(deadline for _, deadline in in_flight.values())
+                    vehicle._wait_for_state(lambda: replies, timeout=max(first - now, 0.001))
+        finally:
+            vehicle.remove_message_listener('PARAM_VALUE', listener)
+
+        for name, value in requested.items():
+            if not report[name]['ok']:
+                self._logger.error("timeout setting parameter %s to %f" % (name, value))
+        return report
+
+    def set_async(self, name, value, retries=3, wait_ready=False):
+        """
+        Coroutine version of :py:func:`set`, for vehicles returned by :py:func:`connect_async`.
+        """
+        from dronekit import aio
+        return aio.set_parameter(self, name, value, retries=retries, wait_ready=wait_ready)
+
     def wait_ready(self, **kwargs):
         """
         Block the calling thread until parameters have been downloaded
         """
         self._vehicle.wait_ready('parameters', **kwargs)
 
+    @property
+    def download_progress(self):
+        """
+        How far the parameter download has got, or ``None`` before it has started: a dict with the
+        ``count`` of parameters, how many have been ``received``, the ``rate`` they are arriving at
+        (per second), the fraction of replies lost (``loss``), the ``seconds`` since it started and
+        an ``eta`` in seconds for the rest.
+
+        .. code:: python
+
+            while not vehicle.parameters.download_progress or vehicle.parameters.download_progress['eta']:
+                print(vehicle.parameters.download_progress)
+                time.sleep(1)
+        """
+        return self._vehicle._param_download.progress(monotonic.monotonic())
+
     def add_attribute_listener(self, attr_name, *args, **kwargs):
         """
         Add a listener callback on a particular parameter.
@@ -3065,17 +4235,22 @@ class CommandSequence(object):
         """
         if self._vehicle._wpts_dirty:
             self._vehicle._master.waypoint_clear_all_send()
-            start_time = time.time()
             if self._vehicle._wploader.count() > 0:
                 self._vehicle._wp_uploaded = [False] * self._vehicle._wploader.count()
                 self._vehicle._master.waypoint_count_send(self._vehicle._wploader.count())
-                while False in self._vehicle._wp_uploaded:
-                    if timeout and time.time() - start_time > timeout:
-                        raise TimeoutError
-                    time.sleep(0.1)
+                if not self._vehicle._wait_for_state(lambda: False not in self._vehicle._wp_uploaded, timeout):
+                    raise TimeoutError
                 self._vehicle._wp_uploaded = None
             self._vehicle._wpts_dirty = False
 
+    def upload_async(self, timeout=None):
+        """
+        Coroutine version of :py:func:`upload() <Vehicle.commands.upload>`, for vehicles returned by
+        :py:func:`connect_async`.
+        """
+        from dronekit import aio
+        return aio.upload_commands(self, timeout=timeout)
+
     @property
     def count(self):
         '''
@@ -3140,7 +4315,14 @@ def connect(ip,
             heartbeat_timeout=30,
             source_system=255,
             source_component=0,
-            use_native=False):
+            use_native=False,
+            reactor=None,
+            bandwidth=None,
+            parse_process=False,
+            queue_limits=None,
+            queue_policies=None,
+            coalesce=True,
+            param_cache=None):
     """
     Returns a :py:class:`Vehicle` object connected to the address specified by string parameter ``ip``.
     Connection string parameters (``ip``) for different targets are listed in the :ref:`getting started guide <get_started_connecting>`.
@@ -3177,6 +4359,31 @@ def connect(ip,
         If a heartbeat is not detected within this time an exception will be raised.
     :param int source_system: The MAVLink ID of the :py:class:`Vehicle` object returned by this method (by default 255).
     :param int source_component: The MAVLink Component ID fo the :py:class:`Vehicle` object returned by this method (by default 0).
+    :param reactor: A :py:class:`dronekit.mavlink.MAVReactor` to service the connection, shared with
+        other vehicles, instead of the two threads each connection otherwise starts. Useful when
+        one process talks to many vehicles.
+    :param float bandwidth: Bytes per second the link can carry. Outgoing messages are paced to this rate,
+        urgent commands first, so a telemetry radio's buffer is not overrun. A radio's air rate, or
+        ``baud / 10`` for a plain serial link, is a good value. By default (``None`` or ``0``) the link is
+        not paced, as is right for network links and USB connections to an autopilot.
+    :param dict queue_limits: The most packets each outgoing lane (``'control'``, ``'normal'`` or ``'bulk'``)
+        may hold while waiting for the link, e.g. ``{'normal': 100}``. Lanes are unbounded by default.
+    :param dict queue_policies: What a full lane does with another packet: ``'drop_oldest'``,
+        ``'drop_newest'`` or ``'block'`` (the sender waits). By default bulk transfers block and
+        everything else drops the oldest packet.
+    :param bool coalesce: Keep only the newest of the queued setpoints (``SET_POSITION_TARGET_*``,
+        ``SET_ATTITUDE_TARGET``, RC overrides) for each target, so they never pile up behind a slow
+        link: a newer setpoint replaces a queued older one (default ``True``). With ``False`` every
+        setpoint is queued and sent.
+    :param bool parse_process: Read and parse the link in a worker process (Python 3 only), so decoding
+        does not compete with listeners and control code for the GIL. See :py:mod:`dronekit.worker`.
+    :param param_cache: A directory (or :py:class:`dronekit.params.ParamCache`) to keep the vehicle's
+        parameters in between connections. When it has them for this vehicle (by system ID and the
+        autopilot build reported in ``AUTOPILOT_VERSION``) they are available straight away, without
+        waiting for a download, and checked against the vehicle in the background: by ArduPilot's
+        ``_HASH_CHECK``, or else by reading back a sample. If they have changed they stay in place
+        while the vehicle streams its parameters again: those that differ are replaced, and listeners
+        told, and only those lost from the stream are asked for one by one.
     :param bool use_native: Use precompiled MAVLink parser.
 
         .. note::
@@ -3196,19 +4403,24 @@ def connect(ip,
     :returns: A connected vehicle of the type defined in ``vehicle_class`` (a superclass of :py:class:`Vehicle`).
     """
 
-    from dronekit.mavlink import MAVConnection
+    if parse_process:
+        from dronekit.worker import ProcessMAVConnection as MAVConnection
+    else:
+        from dronekit.mavlink import MAVConnection
 
     if not vehicle_class:
         vehicle_class = Vehicle
 
-    handler = MAVConnection(ip, baud=baud, source_system=source_system, source_component=source_component, use_native=use_native)
+    handler = MAVConnection(ip, baud=baud, source_system=source_system, source_component=source_component, use_native=use_native,
+                            reactor=reactor, bandwidth=bandwidth, queue_limits=queue_limits,
+                            queue_policies=queue_policies, coalesce=coalesce)
     vehicle = vehicle_class(handler)
 
     if status_printer:
         vehicle._autopilot_logger.addHandler(ErrprinterHandler(status_printer))
 
     if _initialize:
-        vehicle.initialize(rate=rate, heartbeat_timeout=heartbeat_timeout)
+        vehicle.initialize(rate=rate, heartbeat_timeout=heartbeat_timeout, param_cache=param_cache)
 
     if wait_ready:
         if wait_ready is True:
@@ -3219,3 +4431,30 @@ def connect(ip,
             vehicle.wait_ready(*wait_ready)
 
     return vehicle
+
+
+def connect_async(ip, **kwargs):
+    """
+    Coroutine version of :py:func:`connect` (Python 3 only). It takes the same arguments except
+    ``_initialize``, ``status_printer``, ``reactor`` and ``parse_process``: ``ip``, ``wait_ready``,
+    ``timeout``, ``still_waiting_callback``, ``still_waiting_interval``, ``vehicle_class``, ``rate``,
+    ``baud``, ``heartbeat_timeout``, ``source_system``, ``source_component``, ``use_native``,
+    ``bandwidth``, ``queue_limits``, ``queue_policies``, ``coalesce`` and ``param_cache``.
+
+    The returned :py:class:`Vehicle` is serviced by the running asyncio event loop instead of
+    by two threads of its own, so one loop can manage many vehicles.
+
+    .. code:: python
+
+        vehicle = await connect_async('127.0.0.1:14550', wait_ready=True)
+        await vehicle.arm_async()
+
+    .. note::
+
+        Vehicle state is updated on the event loop, so the blocking methods that wait for the
+        vehicle (:py:func:`Vehicle.wait_ready`, :py:func:`Vehicle.arm`, :py:func:`Parameters.set`,
+        setting an item in :py:attr:`Vehicle.parameters`, ...) must not be called from inside it.
+        Use their ``*_async`` versions instead.
+    """
+    from dronekit import aio
+    return aio.connect_async(ip, **kwargs)
@@ -0,0 +1,492 @@
+"""
+asyncio support for DroneKit (Python 3 only).
+
+:py:func:`connect_async` returns an ordinary :py:class:`dronekit.Vehicle`, but
+its link is serviced by the running event loop rather than by the two threads
+:py:class:`dronekit.mavlink.MAVConnection` starts for every vehicle. Many
+vehicles can then share one loop (and one thread).
+
+.. code:: python
+
+    import asyncio
+    from dronekit import connect_async
+
+    async def main():
+        vehicle = await connect_async('udpin:0.0.0.0:14550', wait_ready=True)
+        await vehicle.arm_async()
+        await vehicle.simple_takeoff_async(10)
+
+    asyncio.run(main())
+
+Vehicle state is updated on the loop thread, so the blocking helpers
+(:py:func:`Vehicle.wait_ready`, :py:func:`Parameters.set`, ...) must not be
+called from inside the loop: they would sleep on the only thread that can
+make progress. Use the ``*_async`` variants instead.
+"""
+
+import asyncio
+import logging
+import socket
+import struct
+
+import monotonic
+
+from dronekit import APIException, PARAM_CACHE_VERSION_TIMEOUT, TimeoutError, Vehicle, \
+    default_still_waiting_callback
+from dronekit.params import ParamCache
+from dronekit.mavlink import MAVConnection, ECONNABORTED
+from pymavlink import mavutil
+
+
+class AsyncMAVConnection(MAVConnection):
+    """
+    A :py:class:`MAVConnection` driven by an asyncio event loop.
+
+    Input is read from a loop reader callback as soon as the link is readable,
+    loop listeners run from a loop timer every ``loop_interval`` seconds, and
+    queued packets are written (coalesced, as by the writer thread) on the
+    next loop iteration. No threads are started.
+
+    :py:func:`start` and :py:func:`close` must be called from the loop's thread.
+    """
+
+    def __init__(self, ip, loop=None, **kwargs):
+        super(AsyncMAVConnection, self).__init__(ip, **kwargs)
+        self._loop = loop or asyncio.get_event_loop()
+
+        # Nobody waits on the queue, so have it wake the loop instead.
+        self.out_queue.notify = self._schedule_flush
+
+        self._started = False
+        self._flush_pending = False
+        self._reader_fd = None
+        self._tick_handle = None
+        self._next_tick = None
+        self._waiters = []
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        self._update_reader()
+        self._next_tick = self._loop.time()
+        self._tick_handle = self._loop.call_soon(self._tick)
+        # Send anything queued before we started.
+        self._schedule_flush()
+
+    def stop_threads(self):
+        # There are no threads; detach from the loop instead.
+        self._started = False
+        if self._loop.is_closed():
+            return
+        self._update_reader()
+        if self._tick_handle is not None:
+            self._tick_handle.cancel()
+            self._tick_handle = None
+
+    def close(self):
+        if self._started:
+            self._flush(paced=False)
+        self._alive = False
+        self.stop_threads()
+        self.master.close()
+        self._fail_waiters(APIException('Connection closed.'))
+
+    def _update_reader(self):
+        """
+        Watch the link's descriptor while we are running and accepting input
+        (reset() may also have replaced the link).
+        """
+        fd = None
+        if self._started and self._alive and self._accept_input:
+            fd = self.master.fd
+        if fd == self._reader_fd:
+            return
+        if self._reader_fd is not None:
+            self._loop.remove_reader(self._reader_fd)
+        if fd is not None:
+            self._loop.add_reader(fd, self._on_readable)
+        self._reader_fd = fd
+
+    def _on_readable(self):
+        try:
+            self._drain_input()
+        except Exception as e:
+            self._die(e)
+            return
+        self._check_waiters()
+
+    def _tick(self):
+        self._tick_handle = None
+        if not self._alive:
+            return
+        try:
+            self._update_reader()
+            if self._reader_fd is None and self._accept_input:
+                # No pollable descriptor (e.g. serial ports on Windows).
+                self._drain_input()
+            for fn in self.loop_listeners:
+                fn(self)
+        except Exception as e:
+            self._die(e)
+            return
+        self._check_waiters()
+
+        now = self._loop.time()
+        self._next_tick += self.loop_interval
+        if self._next_tick <= now:
+            # Running late; don't try to catch up.
+            self._next_tick = now + self.loop_interval
+        self._tick_handle = self._loop.call_at(self._next_tick, self._tick)
+
+    def _schedule_flush(self):
+        # May be called from any thread. One pending flush covers everything
+        # queued until it runs.
+        if self._flush_pending:
+            return
+        self._flush_pending = True
+        try:
+            self._loop.call_soon_threadsafe(self._flush)
+        except RuntimeError:
+            # The loop has been closed.
+            self._flush_pending = False
+
+    def _flush(self, paced=True):
+        # With ``paced`` False (on close) wait out the pacer here instead.
+        self._flush_pending = False
+        if not self._started:
+            return
+        while True:
+            if self.pacer is not None and not self.out_queue.empty():
+                if paced:
+                    delay = self._write_delay()
+                    if delay > 0:
+                        # The link is busy; come back when the pacer has room.
+                        self._flush_pending = True
+                        self._loop.call_later(delay, self._flush)
+                        break
+                else:
+                    self.pacer.wait()
+            buf, _ = self._next_write_batch(block=False)
+            if buf is None:
+                break
+            try:
+                self.master.write(buf)
+            except socket.error as error:
+                # If connection reset (closed), stop polling.
+                if error.errno == ECONNABORTED:
+                    error = APIException('Connection aborting during read')
+                self._die(error)
+                break
+            except Exception as e:
+                self._logger.exception('mav send error: %s' % str(e))
+
+    def _die(self, e):
+        if isinstance(e, APIException):
+            self._logger.error('Exception in MAVLink loop: %s' % str(e))
+        self._alive = False
+        self._death_error = e
+        self.stop_threads()
+        self.master.close()
+        self._fail_waiters(e)
+
+    def _check_waiters(self):
+        for condition, future in list(self._waiters):
+            if future.done():
+                continue
+            try:
+                if condition():
+                    future.set_result(True)
+            except Exception as e:
+                future.set_exception(e)
+
+    def _fail_waiters(self, e):
+        for _, future in list(self._waiters):
+            if not future.done():
+                future.set_exception(e)
+
+    async def wait_for(self, condition, timeout=None, errmsg=None):
+        '''Wait for a condition to be True.
+
+        Like :py:func:`Vehicle.wait_for`, but the condition is re-checked each
+        time messages are processed or the loop listeners run, rather than
+        every ``interval`` seconds. If timeout is nonzero, raise a
+        TimeoutError(errmsg) if the condition is not True after timeout
+        seconds. If the connection dies first, its error is raised.
+        '''
+        if condition():
+            return
+        if not self._alive:
+            raise self._death_error or APIException('Connection closed.')
+
+        waiter = (condition, self._loop.create_future())
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout or None)
+        except asyncio.TimeoutError:
+            raise TimeoutError(errmsg)
+        finally:
+            self._waiters.remove(waiter)
+
+
+def _connection(vehicle):
+    handler = vehicle._handler
+    if not isinstance(handler, AsyncMAVConnection):
+        raise APIException('Vehicle was not connected with connect_async().')
+    return handler
+
+
+async def connect_async(ip,
+                        wait_ready=None,
+                        timeout=30,
+                        still_waiting_callback=default_still_waiting_callback,
+                        still_waiting_interval=1,
+                        vehicle_class=None,
+                        rate=4,
+                        baud=115200,
+                        heartbeat_timeout=30,
+                        source_system=255,
+                        source_component=0,
+                        use_native=False,
+                        bandwidth=None,
+                        queue_limits=None,
+                        queue_policies=None,
+                        coalesce=True,
+                        param_cache=None):
+    """
+    Coroutine version of :py:func:`dronekit.connect`, returning a
+    :py:class:`Vehicle` whose link is serviced by the running event loop.
+    The arguments mean the same as for :py:func:`dronekit.connect`, which
+    also takes ``_initialize``, ``status_printer``, ``reactor`` and
+    ``parse_process``; they have no equivalent here. A lane given a
+    ``queue_limits`` entry needs a ``queue_policies`` entry other than
+    ``'block'``: the sender would block the loop that drains the queue.
+    """
+    if not vehicle_class:
+        vehicle_class = Vehicle
+
+    handler = AsyncMAVConnection(ip, loop=asyncio.get_event_loop(), baud=baud,
+                                 source_system=source_system, source_component=source_component,
+                                 use_native=use_native, bandwidth=bandwidth,
+                                 queue_limits=queue_limits,
+                                 queue_policies=queue_policies,
+                                 coalesce=coalesce)
+    vehicle = vehicle_class(handler)
+
+    try:
+        await initialize(vehicle, rate=rate, heartbeat_timeout=heartbeat_timeout, param_cache=param_cache)
+
+        if wait_ready:
+            if wait_ready is True:
+                await vehicle.wait_ready_async(still_waiting_interval=still_waiting_interval,
+                                               still_waiting_callback=still_waiting_callback,
+                                               timeout=timeout)
+            else:
+                await vehicle.wait_ready_async(*wait_ready)
+    except BaseException:
+        # Nobody will get a handle to close it with, so don't leave it
+        # attached to the loop.
+        vehicle.close()
+        raise
+
+    return vehicle
+
+
+async def initialize(vehicle, rate=4, heartbeat_timeout=30, param_cache=None):
+    """
+    Coroutine version of :py:func:`Vehicle.initialize`.
+    """
+    handler = _connection(vehicle)
+    handler.start()
+
+    # Start heartbeat polling.
+    start = monotonic.monotonic()
+    vehicle._heartbeat_error = heartbeat_timeout or 0
+    vehicle._heartbeat_started = True
+    vehicle._heartbeat_lastreceived = start
+
+    # Wait for the first heartbeat.
+    # If heartbeat times out, the connection dies and this raises.
+    try:
+        await handler.wait_for(lambda: vehicle._heartbeat_lastreceived != start)
+    except APIException:
+        raise APIException('Timeout in initializing connection.')
+
+    # Register target_system now.
+    handler.target_system = vehicle._heartbeat_system
+
+    # Wait until board has booted.
+    await handler.wait_for(lambda: vehicle._flightmode not in [None, 'INITIALISING', 'MAV'])
+
+    # Initialize data stream.
+    if rate is not None:
+        vehicle._master.mav.request_data_stream_send(0, 0, mavutil.mavlink.MAV_DATA_STREAM_ALL,
+                                                     rate, 1)
+
+    vehicle.add_message_listener('HEARTBEAT', vehicle.send_capabilities_request)
+
+    if param_cache is not None:
+        vehicle._param_cache = param_cache if isinstance(param_cache, ParamCache) else ParamCache(param_cache)
+        # The cache entry depends on the autopilot's version, so ask for it now
+        # rather than at the next heartbeat. The cache is checked against the
+        # vehicle on a thread of its own, as with connect().
+        vehicle.send_capabilities_request(vehicle, 'HEARTBEAT', None)
+        try:
+            await handler.wait_for(lambda: vehicle._autopilot_version_msg is not None,
+                                   timeout=PARAM_CACHE_VERSION_TIMEOUT)
+        except TimeoutError:
+            pass
+        else:
+            if vehicle._load_param_cache():
+                return
+
+    # Ensure initial parameter download has started.
+    while vehicle._params_count < 0:
+        # This fn actually rate limits itself to every 2s.
+        vehicle._master.param_fetch_all()
+        try:
+            await handler.wait_for(lambda: vehicle._params_count > -1, timeout=2)
+        except TimeoutError:
+            pass
+
+
+async def wait_ready(vehicle, *types, **kwargs):
+    """
+    Coroutine version of :py:func:`Vehicle.wait_ready`, taking the same arguments.
+    """
+    handler = _connection(vehicle)
+    timeout = kwargs.get('timeout', 30)
+    raise_exception = kwargs.get('raise_exception', True)
+
+    # Vehicle defaults for wait_ready(True) or wait_ready()
+    if list(types) == [True] or list(types) == []:
+        types = vehicle._default_ready_attrs
+
+    if not all(isinstance(item, str) for item in types):
+        raise ValueError('wait_ready expects one or more string arguments.')
+
+    # Wait for these attributes to have been set.
+    await_attributes = set(types)
+    start = monotonic.monotonic()
+    still_waiting_callback = kwargs.get('still_waiting_callback')
+    still_waiting_message_interval = kwargs.get('still_waiting_interval', 1)
+
+    def ready():
+        return await_attributes.issubset(vehicle._ready_attrs)
+
+    while not ready():
+        remaining = start + timeout - monotonic.monotonic()
+        if remaining <= 0:
+            if raise_exception:
+                raise TimeoutError('wait_ready experienced a timeout after %s seconds.' %
+                                   timeout)
+            else:
+                return False
+        if still_waiting_callback:
+            remaining = min(remaining, still_waiting_message_interval)
+        try:
+            await handler.wait_for(ready, timeout=remaining)
+        except TimeoutError:
+            if still_waiting_callback and not ready():
+                still_waiting_callback(await_attributes - vehicle._ready_attrs)
+
+    return True
+
+
+async def arm(vehicle, wait=True, timeout=None):
+    """
+    Coroutine version of :py:func:`Vehicle.arm`.
+    """
+    handler = _connection(vehicle)
+    vehicle.armed = True
+
+    if wait:
+        await handler.wait_for(lambda: vehicle.armed, timeout=timeout,
+                               errmsg='failed to arm vehicle')
+
+
+async def wait_for_alt(vehicle, alt, epsilon=0.1, rel=True, timeout=None):
+    """
+    Coroutine version of :py:func:`Vehicle.wait_for_alt`.
+    """
+    handler = _connection(vehicle)
+
+    def get_alt():
+        if rel:
+            return vehicle.location.global_relative_frame.alt
+        return vehicle.location.global_frame.alt
+
+    def check_alt():
+        cur = get_alt()
+        delta = abs(alt - cur)
+
+        return (
+            (delta < epsilon) or
+            (cur > alt > start) or
+            (cur < alt < start)
+        )
+
+    start = get_alt()
+
+    await handler.wait_for(check_alt, timeout=timeout,
+                           errmsg='failed to reach specified altitude')
+
+
+async def simple_takeoff(vehicle, alt=None, epsilon=0.1, timeout=None):
+    """
+    Coroutine version of :py:func:`Vehicle.wait_simple_takeoff`: take off, then
+    wait until the vehicle is within ``epsilon`` metres of ``alt``.
+    """
+    vehicle.simple_takeoff(alt)
+
+    if alt is not None:
+        await wait_for_alt(vehicle, alt, epsilon=epsilon, timeout=timeout)
+
+
+async def set_parameter(parameters, name, value, retries=3, wait_ready=False):
+    """
+    Coroutine version of :py:func:`Parameters.set`.
+    """
+    vehicle = parameters._vehicle
+    handler = _connection(vehicle)
+    if wait_ready:
+        await vehicle.wait_ready_async('parameters')
+
+    name = name.upper()
+    # convert to single precision floating point number (the type used by low level mavlink messages)
+    value = float(struct.unpack('f', struct.pack('f', value))[0])
+
+    def updated():
+        return name in vehicle._params_map and vehicle._params_map[name] == value
+
+    remaining = retries
+    while True:
+        vehicle._master.param_set_send(name, value)
+        if remaining == 0:
+            break
+        remaining -= 1
+        try:
+            await handler.wait_for(updated, timeout=1)
+            return True
+        except TimeoutError:
+            pass
+
+    if retries > 0:
+        logging.getLogger(__name__).error("timeout setting parameter %s to %f" % (name, value))
+    return False
+
+
+async def upload_commands(commands, timeout=None):
+    """
+    Coroutine version of :py:func:`CommandSequence.upload`.
+    """
+    vehicle = commands._vehicle
+    handler = _connection(vehicle)
+    if vehicle._wpts_dirty:
+        vehicle._master.waypoint_clear_all_send()
+        if vehicle._wploader.count() > 0:
+            vehicle._wp_uploaded = [False] * vehicle._wploader.count()
+            vehicle._master.waypoint_count_send(vehicle._wploader.count())
+            await handler.wait_for(lambda: False not in vehicle._wp_uploaded, timeout=timeout)
+            vehicle._wp_uploaded = None
+        vehicle._wpts_dirty = False
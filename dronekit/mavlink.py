@@ -7,17 +7,31 @@ import errno
 import sys
 import os
 import platform
+import collections
 import copy
+import heapq
+import itertools
+import struct
+import monotonic
 from dronekit import APIException
 from pymavlink import mavutil
-from queue import Queue, Empty
-from threading import Thread
+from queue import Queue, Empty, Full
+from threading import Condition, Event, Lock, Thread, current_thread
+
+try:
+    import selectors
+except ImportError:
+    selectors = None
 
 if platform.system() == 'Windows':
     from errno import WSAECONNRESET as ECONNABORTED
 else:
     from errno import ECONNABORTED
 
+# Placed on the outbound queue to tell the writer thread to exit once it has
+# flushed everything queued ahead of it.
+_WRITER_STOP = object()
+
 
 class MAVWriter(object):
     """
@@ -37,9 +51,578 @@ class MAVWriter(object):
         os._exit(43)
 
 
+# Outbound lanes, highest priority first.
+LANE_CONTROL = 0
+LANE_NORMAL = 1
+LANE_BULK = 2
+LANE_NAMES = ('control', 'normal', 'bulk')
+
+# Commands that should never wait behind a transfer (and the GCS heartbeat,
+# which keeps the autopilot's link failsafe at bay).
+CONTROL_MSGIDS = frozenset(getattr(mavutil.mavlink, 'MAVLINK_MSG_ID_' + name) for name in (
+    'HEARTBEAT',
+    'COMMAND_LONG',
+    'COMMAND_INT',
+    'SET_MODE',
+    'SET_POSITION_TARGET_LOCAL_NED',
+    'SET_POSITION_TARGET_GLOBAL_INT',
+    'SET_ATTITUDE_TARGET',
+    'RC_CHANNELS_OVERRIDE',
+    'MANUAL_CONTROL',
+))
+
+# Parameter and mission transfers: many packets, none of them urgent.
+BULK_MSGIDS = frozenset(getattr(mavutil.mavlink, 'MAVLINK_MSG_ID_' + name) for name in (
+    'PARAM_REQUEST_READ',
+    'PARAM_REQUEST_LIST',
+    'PARAM_SET',
+    'MISSION_ITEM',
+    'MISSION_ITEM_INT',
+    'MISSION_REQUEST',
+    'MISSION_REQUEST_INT',
+    'MISSION_REQUEST_LIST',
+    'MISSION_COUNT',
+    'MISSION_CLEAR_ALL',
+    'MISSION_ACK',
+    'LOG_REQUEST_LIST',
+    'LOG_REQUEST_DATA',
+    'FILE_TRANSFER_PROTOCOL',
+))
+
+
+# Setpoint streams where only the newest message matters: a queued one is
+# replaced by a newer one for the same target instead of both being sent.
+COALESCE_MSGIDS = frozenset(getattr(mavutil.mavlink, 'MAVLINK_MSG_ID_' + name) for name in (
+    'SET_POSITION_TARGET_LOCAL_NED',
+    'SET_POSITION_TARGET_GLOBAL_INT',
+    'SET_ATTITUDE_TARGET',
+    'RC_CHANNELS_OVERRIDE',
+    'MANUAL_CONTROL',
+))
+
+# Mission items that are sent with ``current == 2`` are not part of a
+# transfer but a guided-mode "go to" (see Vehicle.simple_goto): they go in the
+# control lane whatever their message id's lane.
+GUIDED_MSGIDS = frozenset(getattr(mavutil.mavlink, 'MAVLINK_MSG_ID_' + name) for name in (
+    'MISSION_ITEM',
+    'MISSION_ITEM_INT',
+))
+
+# What OutboundQueue does when a bounded lane is full.
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+BLOCK = 'block'
+DEFAULT_POLICIES = {'control': DROP_OLDEST, 'normal': DROP_OLDEST, 'bulk': BLOCK}
+
+
+def packet_msgid(pkt):
+    """
+    The message id of a packed MAVLink 1 or 2 packet, read from its header,
+    or ``None`` if ``pkt`` does not start with a MAVLink header.
+    """
+    if isinstance(pkt, str):
+        # Python 2
+        pkt = bytearray(pkt[:10])
+    if len(pkt) >= 6 and pkt[0] == 0xFE:
+        return pkt[5]
+    if len(pkt) >= 10 and pkt[0] == 0xFD:
+        return pkt[7] | (pkt[8] << 8) | (pkt[9] << 16)
+    return None
+
+
+def packet_source(pkt):
+    """
+    The ``(system id, component id)`` a packed MAVLink 1 or 2 packet comes
+    from, or ``None`` if ``pkt`` does not start with a MAVLink header.
+    """
+    if isinstance(pkt, str):
+        # Python 2
+        pkt = bytearray(pkt[:10])
+    if len(pkt) >= 6 and pkt[0] == 0xFE:
+        return pkt[3], pkt[4]
+    if len(pkt) >= 10 and pkt[0] == 0xFD:
+        return pkt[5], pkt[6]
+    return None
+
+
+# SiK radios report RADIO_STATUS as this system/component, which pymavlink
+# leaves out of its sequence statistics.
+_RADIO_SOURCE = (ord('3'), ord('D'))
+
+
+def count_packet_seq(master, pkt):
+    """
+    Account for a packet that is not decoded (and so never reaches
+    pymavlink's ``post_message``) in ``master``'s sequence statistics:
+    ``mav_count``, ``mav_loss`` and ``last_seq``, as ``post_message`` keeps
+    them. Otherwise every skipped packet would count as lost.
+    """
+    if isinstance(pkt, str):
+        # Python 2
+        pkt = bytearray(pkt[:10])
+    if pkt[0] == 0xFE:
+        seq, source = pkt[2], (pkt[3], pkt[4])
+    else:
+        seq, source = pkt[4], (pkt[5], pkt[6])
+    if source == _RADIO_SOURCE:
+        return
+    last_seq = master.last_seq.get(source)
+    if last_seq is not None:
+        master.mav_loss += (seq - last_seq - 1) % 256
+    master.last_seq[source] = seq
+    master.mav_count += 1
+
+
+def packet_bytes(pkt):
+    """
+    A packet as ``bytes``, ready for the writer. Parsers hand packets out as
+    ``bytearray`` or ``array('B')``, which Python 2 can neither join nor write.
+    """
+    if isinstance(pkt, bytes):
+        return pkt
+    return bytes(bytearray(pkt))
+
+
+def packet_crc_ok(pkt):
+    """
+    Whether a packed packet's checksum is right. Packets for messages missing
+    from the dialect can't be checked, and pass.
+    """
+    if isinstance(pkt, str):
+        # Python 2
+        pkt = bytearray(pkt)
+    msgtype = mavutil.mavlink.mavlink_map.get(packet_msgid(pkt))
+    if msgtype is None:
+        return True
+    end = (6 if pkt[0] == 0xFE else 10) + pkt[1]
+    if len(pkt) < end + 2:
+        return False
+    crc = mavutil.mavlink.x25crc(pkt[1:end])
+    crc.accumulate(bytearray([msgtype.crc_extra]))
+    return crc.crc == pkt[end] | (pkt[end + 1] << 8)
+
+
+# Wire sizes of MAVLink field types.
+_FIELD_SIZES = {
+    'char': 1, 'int8_t': 1, 'uint8_t': 1,
+    'int16_t': 2, 'uint16_t': 2,
+    'int32_t': 4, 'uint32_t': 4, 'float': 4,
+    'int64_t': 8, 'uint64_t': 8, 'double': 8,
+}
+
+# Payload offsets of fields, by (message id, field name); None if the
+# message has no such field.
+_field_offsets = {}
+
+
+def _field_offset(msgid, field):
+    key = (msgid, field)
+    try:
+        return _field_offsets[key]
+    except KeyError:
+        pass
+    offset = None
+    msgtype = mavutil.mavlink.mavlink_map.get(msgid)
+    if msgtype is not None and field in msgtype.fieldnames:
+        types = dict(zip(msgtype.fieldnames, msgtype.fieldtypes))
+        offset = 0
+        for name, length in zip(msgtype.ordered_fieldnames, msgtype.array_lengths):
+            if name == field:
+                break
+            offset += _FIELD_SIZES[types[name]] * max(length, 1)
+    _field_offsets[key] = offset
+    return offset
+
+
+def _target_system_offset(msgid):
+    return _field_offset(msgid, 'target_system')
+
+
+def packet_target(pkt):
+    """
+    The ``(target system, target component)`` a packed MAVLink 1 or 2 packet
+    is addressed to, read without decoding it, or ``None`` if its message has
+    no ``target_system`` field. The component is ``None`` if the message has
+    no ``target_component``.
+    """
+    if isinstance(pkt, str):
+        # Python 2
+        pkt = bytearray(pkt)
+    msgid = packet_msgid(pkt)
+    if msgid is None:
+        return None
+    offset = _field_offset(msgid, 'target_system')
+    if offset is None:
+        return None
+    header_len = 6 if pkt[0] == 0xFE else 10
+    # MAVLink 2 drops trailing zero bytes from the payload.
+    length = pkt[1]
+    target = [pkt[header_len + offset] if offset < length else 0, None]
+    offset = _field_offset(msgid, 'target_component')
+    if offset is not None:
+        target[1] = pkt[header_len + offset] if offset < length else 0
+    return tuple(target)
+
+
+def packet_guided(pkt):
+    """
+    Whether a packed ``MISSION_ITEM`` or ``MISSION_ITEM_INT`` packet is a
+    guided-mode "go to" (``current == 2``) rather than part of a mission.
+    """
+    if isinstance(pkt, str):
+        # Python 2
+        pkt = bytearray(pkt[:64])
+    msgid = packet_msgid(pkt)
+    if msgid not in GUIDED_MSGIDS:
+        return False
+    offset = _field_offset(msgid, 'current')
+    header_len = 6 if pkt[0] == 0xFE else 10
+    # MAVLink 2 drops trailing zero bytes from the payload.
+    return offset < pkt[1] and pkt[header_len + offset] == 2
+
+
+def retarget_packet(pkt, target_system):
+    """
+    Address a packed MAVLink packet to ``target_system`` without decoding and
+    packing it again: the field is patched in a copy of the packet and the
+    checksum recomputed.
+
+    Returns ``pkt`` itself if it has no ``target_system`` field or is already
+    addressed there, and ``None`` if it cannot be patched (it is signed, or
+    its message is not in the dialect). A patched packet is ``bytes``.
+    """
+    # Python 2 packets are strings.
+    buf = bytearray(pkt) if isinstance(pkt, str) else pkt
+    msgid = packet_msgid(buf)
+    if msgid is None:
+        return None
+    if msgid not in mavutil.mavlink.mavlink_map:
+        return None
+    offset = _target_system_offset(msgid)
+    if offset is None:
+        return pkt
+    header_len = 6 if buf[0] == 0xFE else 10
+    length = buf[1]
+    # MAVLink 2 drops trailing zero bytes from the payload.
+    current = buf[header_len + offset] if offset < length else 0
+    if current == target_system:
+        return pkt
+    if header_len == 10 and buf[2] & mavutil.mavlink.MAVLINK_IFLAG_SIGNED:
+        # We can't sign it again.
+        return None
+
+    buf = bytearray(buf)
+    if offset >= length:
+        end = header_len + length
+        buf[end:end] = bytearray(offset + 1 - length)
+        length = buf[1] = offset + 1
+    buf[header_len + offset] = target_system
+    end = header_len + length
+    crc = mavutil.mavlink.x25crc(buf[1:end])
+    crc.accumulate(bytearray([mavutil.mavlink.mavlink_map[msgid].crc_extra]))
+    buf[end:end + 2] = struct.pack('<H', crc.crc)
+    return bytes(buf)
+
+
+class OutboundQueue(object):
+    """
+    The outbound packet queue of a :py:class:`MAVConnection`, with the
+    interface of a ``queue.Queue`` but three lanes.
+
+    Packets are classified by message id (read from the packet header) into
+    the ``control`` lane (:py:data:`CONTROL_MSGIDS`), the ``bulk`` lane
+    (:py:data:`BULK_MSGIDS`) or the ``normal`` lane; guided-mode "go to"
+    mission items (see :py:func:`packet_guided`) are control packets too.
+    ``get()`` always returns control packets first; normal and bulk packets
+    share what is left, bulk getting ``bulk_share`` of the bytes while both
+    are waiting (deficit round robin), so transfers keep moving without
+    holding up everything else. Within a lane packets stay in order.
+
+    Packets of the message ids in ``coalesce`` (by default the setpoint
+    streams in :py:data:`COALESCE_MSGIDS`) are latest-value-wins: one put
+    while an older packet of the same message for the same target is still
+    queued takes that packet's place, so a control loop that outruns the link
+    never has stale setpoints sent ahead of its newest one.
+
+    ``limits`` bounds how many packets a lane (by name) may hold. What happens
+    to a put into a full lane depends on its policy in ``policies`` (see
+    :py:data:`DEFAULT_POLICIES`): :py:data:`DROP_OLDEST` discards the packet
+    at the head of the lane, :py:data:`DROP_NEWEST` discards the new one, and
+    :py:data:`BLOCK` makes ``put()`` wait for room (raising ``queue.Full``
+    if ``block`` is False or ``timeout`` expires).
+
+    ``lanes`` maps message ids to lanes; it, ``coalesce``, ``limits`` and
+    ``policies`` can all be changed later. ``notify``, if set, is called
+    after every put (for connections whose writer is not blocked in
+    ``get()``).
+    """
+
+    def __init__(self, notify=None, bulk_share=0.25, quantum=1024, coalesce=COALESCE_MSGIDS,
+                 limits=None, policies=None):
+        self.notify = notify
+        self.lanes = dict((msgid, LANE_CONTROL) for msgid in CONTROL_MSGIDS)
+        self.lanes.update((msgid, LANE_BULK) for msgid in BULK_MSGIDS)
+        self.coalesce = set(coalesce)
+        self.limits = dict(limits or {})
+        self.policies = dict(DEFAULT_POLICIES, **(policies or {}))
+        # Queued coalescing packets by (message id, target), so a newer one
+        # can take their place.
+        self._latest = {}
+        self._quanta = {LANE_NORMAL: max(int(quantum * (1 - bulk_share)), 1),
+                        LANE_BULK: max(int(quantum * bulk_share), 1)}
+        self._cond = Condition(Lock())
+        self._queues = [collections.deque() for _ in LANE_NAMES]
+        self._deficit = {LANE_NORMAL: 0, LANE_BULK: 0}
+        self._turn = LANE_NORMAL
+        self._stop = False
+
+        # Metrics, per lane.
+        self._queued = [0] * len(LANE_NAMES)
+        self._sent = [0] * len(LANE_NAMES)
+        self._sent_bytes = [0] * len(LANE_NAMES)
+        self._wait_total = [0.0] * len(LANE_NAMES)
+        self._wait_max = [0.0] * len(LANE_NAMES)
+        self._coalesced = [0] * len(LANE_NAMES)
+        self._dropped = [0] * len(LANE_NAMES)
+
+    def classify(self, pkt):
+        return self._lane(packet_msgid(pkt), pkt)
+
+    def _lane(self, msgid, pkt):
+        if msgid in GUIDED_MSGIDS and packet_guided(pkt):
+            return LANE_CONTROL
+        return self.lanes.get(msgid, LANE_NORMAL)
+
+    def put(self, pkt, block=True, timeout=None):
+        with self._cond:
+            if pkt is _WRITER_STOP:
+                # Handed out once everything queued so far has been.
+                self._stop = True
+            elif not self._put(pkt, block, timeout):
+                return
+            self._cond.notify_all()
+        if self.notify is not None:
+            self.notify()
+
+    def _put(self, pkt, block, timeout):
+        # Called with the lock held. Returns whether anything was queued.
+        msgid = packet_msgid(pkt)
+        lane = self._lane(msgid, pkt)
+        now = monotonic.monotonic()
+        self._queued[lane] += 1
+
+        key = None
+        if msgid in self.coalesce:
+            key = (msgid, packet_target(pkt))
+            entry = self._latest.get(key)
+            if entry is not None:
+                # Its place in the lane, with the newer contents.
+                entry[0] = pkt
+                entry[1] = now
+                self._coalesced[lane] += 1
+                return True
+
+        queue = self._queues[lane]
+        limit = self.limits.get(LANE_NAMES[lane])
+        if limit is not None and len(queue) >= limit:
+            policy = self.policies.get(LANE_NAMES[lane], DROP_OLDEST)
+            if policy == DROP_NEWEST:
+                self._dropped[lane] += 1
+                return False
+            elif policy == DROP_OLDEST:
+                self._forget(queue.popleft())
+                self._dropped[lane] += 1
+            else:
+                end = None if timeout is None else now + timeout
+                while len(queue) >= self.limits.get(LANE_NAMES[lane], len(queue) + 1):
+                    remaining = None if end is None else end - monotonic.monotonic()
+                    if not block or (remaining is not None and remaining <= 0):
+                        self._queued[lane] -= 1
+                        raise Full
+                    self._cond.wait(remaining)
+
+        entry = [pkt, now, key]
+        queue.append(entry)
+        if key is not None:
+            self._latest[key] = entry
+        return True
+
+    def _forget(self, entry):
+        # Called with the lock held, for an entry leaving its lane.
+        key = entry[2]
+        if key is not None and self._latest.get(key) is entry:
+            del self._latest[key]
+
+    def get(self, block=True, timeout=None):
+        with self._cond:
+            if block:
+                end = None if timeout is None else monotonic.monotonic() + timeout
+                while not self._stop and not any(self._queues):
+                    remaining = None if end is None else end - monotonic.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise Empty
+                    self._cond.wait(remaining)
+            lane = self._pick()
+            if lane is None:
+                if self._stop:
+                    self._stop = False
+                    return _WRITER_STOP
+                raise Empty
+            entry = self._queues[lane].popleft()
+            self._forget(entry)
+            # Room for a put blocked on a full lane.
+            self._cond.notify_all()
+            pkt, queued_at = entry[0], entry[1]
+            wait = monotonic.monotonic() - queued_at
+            self._sent[lane] += 1
+            self._sent_bytes[lane] += len(pkt)
+            self._wait_total[lane] += wait
+            if wait > self._wait_max[lane]:
+                self._wait_max[lane] = wait
+            return pkt
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def wait(self):
+        """Block until a packet (or the shutdown sentinel) is queued."""
+        with self._cond:
+            while not self._stop and not any(self._queues):
+                self._cond.wait()
+
+    def _pick(self):
+        # Called with the lock held.
+        control, normal, bulk = self._queues
+        if control:
+            return LANE_CONTROL
+        if not bulk:
+            self._deficit[LANE_BULK] = 0
+            return LANE_NORMAL if normal else None
+        if not normal:
+            self._deficit[LANE_NORMAL] = 0
+            return LANE_BULK
+        lane = self._turn
+        while self._deficit[lane] < len(self._queues[lane][0][0]):
+            lane = LANE_BULK if lane == LANE_NORMAL else LANE_NORMAL
+            self._deficit[lane] += self._quanta[lane]
+        self._turn = lane
+        self._deficit[lane] -= len(self._queues[lane][0][0])
+        return lane
+
+    def qsize(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def stats(self):
+        """
+        Per-lane metrics: current ``depth``, packets ``queued`` and ``sent``,
+        ``bytes`` sent, and the mean and maximum time (in seconds) sent packets
+        spent waiting in the queue. Packets ``coalesced`` were replaced by a
+        newer one before being sent; packets ``dropped`` were discarded by a
+        full lane.
+        """
+        with self._cond:
+            return dict((name, {
+                'depth': len(self._queues[lane]),
+                'queued': self._queued[lane],
+                'sent': self._sent[lane],
+                'bytes': self._sent_bytes[lane],
+                'wait_avg': self._wait_total[lane] / self._sent[lane] if self._sent[lane] else 0.0,
+                'wait_max': self._wait_max[lane],
+                'coalesced': self._coalesced[lane],
+                'dropped': self._dropped[lane],
+            }) for lane, name in enumerate(LANE_NAMES))
+
+
+class TokenBucket(object):
+    """
+    Paces writes to ``rate`` bytes per second, letting up to ``burst`` bytes
+    out at once after the link has been idle.
+
+    Packets are charged their actual length. A packet may be sent whenever the
+    bucket is not in debt, even if it is larger than the tokens left; the
+    debt is then paid back before anything else goes out. That way the choice
+    of *which* packet to send is made at the last moment, when the link has
+    room, rather than when the packet was queued.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        if burst is None:
+            # A tenth of a second of link time, and at least one of the
+            # largest MAVLink 2 packets.
+            burst = max(self.rate / 10, 280)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = monotonic.monotonic()
+        self._lock = Lock()
+
+        # Metrics.
+        self.bytes = 0
+        self.waited = 0.0
+
+    def _refill(self):
+        # Called with the lock held.
+        now = monotonic.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def delay(self):
+        """Seconds until the next packet may be sent (0 if it may go now)."""
+        with self._lock:
+            self._refill()
+            return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def wait(self):
+        """Sleep until the next packet may be sent."""
+        delay = self.delay()
+        while delay > 0:
+            time.sleep(delay)
+            self.waited += delay
+            delay = self.delay()
+
+    def consume(self, size):
+        """Charge ``size`` bytes; returns the tokens left (negative if in debt)."""
+        with self._lock:
+            self._refill()
+            self._tokens -= size
+            self.bytes += size
+            return self._tokens
+
+
+class UDPClient(object):
+    """
+    A peer that has sent datagrams to a :py:class:`mavudpin_multi` server,
+    with traffic counters. ``last_seen`` is a ``monotonic.monotonic()`` time.
+    """
+
+    def __init__(self, address, now):
+        self.address = address
+        self.first_seen = now
+        self.last_seen = now
+        self.rx_datagrams = 0
+        self.rx_bytes = 0
+        self.tx_datagrams = 0
+        self.tx_bytes = 0
+        self.tx_errors = 0
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
 class mavudpin_multi(mavutil.mavfile):
-    '''a UDP mavlink socket'''
-    def __init__(self, device, baud=None, input=True, broadcast=False, source_system=255, source_component=0, use_native=mavutil.default_native):
+    '''a UDP mavlink socket
+
+    In server mode (``input=True``) everything written is sent to each client
+    that has sent us a datagram in the last ``client_timeout`` seconds. At most
+    ``max_clients`` are kept; when a new one arrives the least recently seen
+    is dropped.
+    '''
+    def __init__(self, device, baud=None, input=True, broadcast=False, source_system=255, source_component=0, use_native=mavutil.default_native,
+                 client_timeout=30, max_clients=64):
         self._logger = logging.getLogger(__name__)
         a = device.split(':')
         if len(a) != 2:
@@ -48,7 +631,17 @@ class mavudpin_multi(mavutil.mavfile):
         self.port = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.udp_server = input
         self.broadcast = False
-        self.addresses = set()
+        self._broadcast_peer = None
+
+        # Client table, least recently seen first.
+        self.client_timeout = client_timeout
+        self.max_clients = max_clients
+        self.clients_expired = 0
+        self.clients_evicted = 0
+        self._clients = collections.OrderedDict()
+        self._clients_lock = Lock()
+        # Cached (address, client) pairs to send to; None when the table changed.
+        self._targets = None
         if input:
             self.port.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.port.bind((a[0], int(a[1])))
@@ -59,50 +652,124 @@ class mavudpin_multi(mavutil.mavfile):
                 self.broadcast = True
         mavutil.set_close_on_exec(self.port.fileno())
         self.port.setblocking(False)
+        # Datagrams are received into one reusable buffer; the parser copies
+        # what it needs out of it.
+        self._buf = bytearray(65535)
+        self._view = memoryview(self._buf)
         mavutil.mavfile.__init__(self, self.port.fileno(), device, source_system=source_system, source_component=source_component, input=input, use_native=use_native)
 
     def close(self):
         self.port.close()
 
-    def recv(self, n=None):
+    def _recv_datagram(self):
+        '''
+        Receive one datagram into the shared buffer. Returns a view of it that
+        is only valid until the next call, or None if nothing is pending.
+        '''
         try:
-            try:
-                data, new_addr = self.port.recvfrom(65535)
-            except socket.error as e:
-                if e.errno in [errno.EAGAIN, errno.EWOULDBLOCK, errno.ECONNREFUSED]:
-                    return ""
-            if self.udp_server:
-                self.addresses.add(new_addr)
-            elif self.broadcast:
-                self.addresses = {new_addr}
-            return data
-        except Exception:
-            self._logger.exception("Exception while reading data", exc_info=True)
+            nbytes, new_addr = self.port.recvfrom_into(self._buf)
+        except socket.error as e:
+            if e.errno not in [errno.EAGAIN, errno.EWOULDBLOCK, errno.ECONNREFUSED]:
+                self._logger.exception("Exception while reading data", exc_info=True)
+            return None
+        if self.udp_server:
+            self._client_seen(new_addr, nbytes)
+        elif self.broadcast:
+            self._broadcast_peer = new_addr
+        return self._view[:nbytes]
+
+    @property
+    def addresses(self):
+        '''The addresses of the current clients.'''
+        with self._clients_lock:
+            return set(self._clients)
+
+    def client_stats(self):
+        '''
+        A snapshot of the client table (after dropping expired clients), as a
+        list of dicts, least recently seen first.
+        '''
+        with self._clients_lock:
+            self._expire_clients(monotonic.monotonic())
+            return [client.as_dict() for client in self._clients.values()]
+
+    def _client_seen(self, addr, nbytes):
+        now = monotonic.monotonic()
+        with self._clients_lock:
+            client = self._clients.pop(addr, None)
+            if client is None:
+                client = UDPClient(addr, now)
+                self._targets = None
+                if len(self._clients) >= self.max_clients:
+                    old_addr, _ = self._clients.popitem(last=False)
+                    self.clients_evicted += 1
+                    self._logger.debug('UDP client %s:%d evicted' % old_addr)
+                self._logger.debug('UDP client %s:%d connected' % addr)
+            client.last_seen = now
+            client.rx_datagrams += 1
+            client.rx_bytes += nbytes
+            # Re-inserting keeps the table ordered by last_seen.
+            self._clients[addr] = client
+
+    def _expire_clients(self, now):
+        # Called with the lock held. Only the oldest entries need checking.
+        if not self.client_timeout:
+            return
+        while self._clients:
+            addr, client = next(iter(self._clients.items()))
+            if now - client.last_seen <= self.client_timeout:
+                break
+            del self._clients[addr]
+            self._targets = None
+            self.clients_expired += 1
+            self._logger.debug('UDP client %s:%d timed out' % addr)
+
+    def recv(self, n=None):
+        data = self._recv_datagram()
+        if data is None:
+            return b""
+        return data.tobytes()
 
     def write(self, buf):
         try:
-            try:
-                if self.udp_server:
-                    for addr in self.addresses:
-                        self.port.sendto(buf, addr)
-                else:
-                    if len(self.addresses) and self.broadcast:
-                        self.destination_addr = self.addresses[0]
+            if self.udp_server:
+                with self._clients_lock:
+                    self._expire_clients(monotonic.monotonic())
+                    if self._targets is None:
+                        self._targets = list(self._clients.items())
+                    targets = self._targets
+                # The writer hands us everything queued as one buffer, so each
+                # client gets a single datagram per batch.
+                sendto = self.port.sendto
+                size = len(buf)
+                for addr, client in targets:
+                    try:
+                        sendto(buf, addr)
+                    except socket.error:
+                        client.tx_errors += 1
+                    else:
+                        client.tx_datagrams += 1
+                        client.tx_bytes += size
+            else:
+                try:
+                    if self._broadcast_peer is not None and self.broadcast:
+                        self.destination_addr = self._broadcast_peer
                         self.broadcast = False
                         self.port.connect(self.destination_addr)
                     self.port.sendto(buf, self.destination_addr)
-            except socket.error:
-                pass
+                except socket.error:
+                    pass
         except Exception:
             self._logger.exception("Exception while writing data", exc_info=True)
 
     def recv_msg(self):
         '''message receive routine for UDP link'''
         self.pre_message()
-        s = self.recv()
-        if len(s) > 0:
-            if self.first_byte:
-                self.auto_mavlink_version(s)
+        s = self._recv_datagram()
+        if s is None:
+            s = b""
+        elif len(s) > 0 and self.first_byte:
+            self.auto_mavlink_version(s)
 
         m = self.mav.parse_char(s)
         if m is not None:
@@ -110,49 +777,120 @@ class mavudpin_multi(mavutil.mavfile):
 
         return m
 
+    def recv_msgs(self, max_datagrams=256):
+        '''
+        Receive and parse every pending datagram (up to ``max_datagrams``),
+        returning the messages in a list.
+        '''
+        self.pre_message()
+        msgs = []
+        # Messages left over from a previous recv_msg() come first.
+        m = self.mav.parse_char(b"")
+        while m is not None:
+            self.post_message(m)
+            msgs.append(m)
+            m = self.mav.parse_char(b"")
+        for _ in range(max_datagrams):
+            s = self._recv_datagram()
+            if s is None:
+                break
+            if len(s) == 0:
+                continue
+            if self.first_byte:
+                self.auto_mavlink_version(s)
+            try:
+                parsed = self.mav.parse_buffer(s)
+            except mavutil.mavlink.MAVError as e:
+                # Drop the rest of this datagram, as recv_msg() callers would.
+                self._logger.debug('mav recv error: %s' % str(e))
+                continue
+            for m in parsed or []:
+                self.post_message(m)
+                msgs.append(m)
+        return msgs
+
+
+def open_link(ip, baud=115200, source_system=255, source_component=0):
+    """Open the pymavlink link for a connection string, as :py:class:`MAVConnection` does."""
+    if ip.startswith("udpin:"):
+        return mavudpin_multi(ip[6:], input=True, baud=baud, source_system=source_system, source_component=source_component)
+    return mavutil.mavlink_connection(ip, baud=baud, source_system=source_system, source_component=source_component)
+
 
 class MAVConnection(object):
 
     def stop_threads(self):
+        if self._reactor is not None:
+            self._reactor.remove(self)
+            return
         if self.mavlink_thread_in is not None:
-            self.mavlink_thread_in.join()
+            if self.mavlink_thread_in.is_alive():
+                self._wake_reader()
+                self.mavlink_thread_in.join()
             self.mavlink_thread_in = None
         if self.mavlink_thread_out is not None:
-            self.mavlink_thread_out.join()
+            if self.mavlink_thread_out.is_alive():
+                self.out_queue.put(_WRITER_STOP)
+                self.mavlink_thread_out.join()
             self.mavlink_thread_out = None
 
-    def __init__(self, ip, baud=115200, target_system=0, source_system=255, source_component=0, use_native=False):
+    def __init__(self, ip, baud=115200, target_system=0, source_system=255, source_component=0, use_native=False,
+                 write_batch_size=1024, loop_interval=0.05, reactor=None, bulk_share=0.25, bandwidth=None,
+                 coalesce=True, queue_limits=None, queue_policies=None):
         self._logger = logging.getLogger(__name__)
+        self._reactor = reactor
 
-        if ip.startswith("udpin:"):
-            self.master = mavudpin_multi(ip[6:], input=True, baud=baud, source_system=source_system, source_component=source_component)
-        else:
-            self.master = mavutil.mavlink_connection(ip, baud=baud, source_system=source_system, source_component=source_component)
+        self._link_args = (ip, baud, source_system, source_component)
+        self.master = self._open_link()
+
+        # Queued setpoints are latest-value-wins: ``coalesce`` is True for the
+        # streams in COALESCE_MSGIDS, False for none, or the message ids to
+        # coalesce.
+        if coalesce is True:
+            coalesce = COALESCE_MSGIDS
+        elif not coalesce:
+            coalesce = ()
 
         # TODO get rid of "master" object as exposed,
         # keep it private, expose something smaller for dronekit
-        self.out_queue = Queue()
-        self.master.mav = mavutil.mavlink.MAVLink(
-            MAVWriter(self.out_queue),
-            srcSystem=self.master.source_system,
-            srcComponent=self.master.source_component,
-            use_native=use_native)
+        self.out_queue = OutboundQueue(bulk_share=bulk_share, coalesce=coalesce,
+                                       limits=queue_limits, policies=queue_policies)
+        if reactor is not None:
+            self.out_queue.notify = lambda: reactor._want_write(self)
+        self._use_native = use_native
 
-        # Monkey-patch MAVLink object for fix_targets.
-        sendfn = self.master.mav.send
+        # Message ids worth decoding, or None for all of them (see
+        # set_message_interest). Packets skipped are counted by id.
+        self._interest = {}
+        # The listeners _decode_msgids was worked out for.
+        self._interest_listeners = None
+        self._decode_msgids = None
+        self.skipped = collections.Counter()
+        self._setup_link()
 
-        def newsendfn(mavmsg, *args, **kwargs):
-            self.fix_targets(mavmsg)
-            return sendfn(mavmsg, *args, **kwargs)
+        # Packets queued together are coalesced into writes of roughly this
+        # many bytes (one UDP datagram for a typical burst).
+        self.write_batch_size = write_batch_size
 
-        self.master.mav.send = newsendfn
+        # Writes are paced to the link's capacity if it is given, as
+        # ``bandwidth`` bytes per second. Links are not paced by default: the
+        # baud rate of a USB serial port says nothing about what it carries.
+        self.pacer = TokenBucket(bandwidth) if bandwidth else None
 
         # Targets
         self.target_system = target_system
 
-        # Listeners.
+        # Listeners. Loop listeners run every loop_interval seconds,
+        # independently of when data arrives.
         self.loop_listeners = []
         self.message_listeners = []
+        # Raw listeners get each packet's bytes, before (or instead of) it
+        # being decoded.
+        self.raw_listeners = []
+        self.loop_interval = loop_interval
+
+        # Lets stop_threads() interrupt the input thread's selector.
+        self._wakeup = None
 
         # Debug flag.
         self._accept_input = True
@@ -170,12 +908,13 @@ class MAVConnection(object):
         def mavlink_thread_out():
             # Huge try catch in case we see http://bugs.python.org/issue1856
             try:
-                while self._alive:
+                stop = False
+                while not stop:
                     try:
-                        msg = self.out_queue.get(True, timeout=0.01)
-                        self.master.write(msg)
-                    except Empty:
-                        continue
+                        # Sleep until something is queued, then send all of it.
+                        buf, stop = self._next_write_batch()
+                        if buf:
+                            self.master.write(buf)
                     except socket.error as error:
                         # If connection reset (closed), stop polling.
                         if error.errno == ECONNABORTED:
@@ -199,50 +938,29 @@ class MAVConnection(object):
                     self.master.close()
                     self._death_error = e
 
-            # Explicitly clear out buffer so .close closes.
-            self.out_queue = Queue()
-
         def mavlink_thread_in():
+            selector = None
+            if self._wakeup is not None:
+                selector = selectors.DefaultSelector()
+                selector.register(self._wakeup[0], selectors.EVENT_READ)
             # Huge try catch in case we see http://bugs.python.org/issue1856
             try:
+                next_loop = monotonic.monotonic()
                 while self._alive:
-                    # Loop listeners.
-                    for fn in self.loop_listeners:
-                        fn(self)
+                    # Loop listeners, on their own schedule.
+                    now = monotonic.monotonic()
+                    if now >= next_loop:
+                        for fn in self.loop_listeners:
+                            fn(self)
+                        next_loop += self.loop_interval
+                        if next_loop <= now:
+                            # Running late; don't try to catch up.
+                            next_loop = now + self.loop_interval
 
-                    # Sleep
-                    self.master.select(0.05)
+                    # Sleep until the link is readable or the next loop is due.
+                    self._wait_for_input(selector, next_loop - monotonic.monotonic())
 
-                    while self._accept_input:
-                        try:
-                            msg = self.master.recv_msg()
-                        except socket.error as error:
-                            # If connection reset (closed), stop polling.
-                            if error.errno == ECONNABORTED:
-                                raise APIException('Connection aborting during send')
-                            raise
-                        except mavutil.mavlink.MAVError as e:
-                            # Avoid
-                            #   invalid MAVLink prefix '73'
-                            #   invalid MAVLink prefix '13'
-                            self._logger.debug('mav recv error: %s' % str(e))
-                            msg = None
-                        except Exception:
-                            # Log any other unexpected exception
-                            self._logger.exception('Exception while receiving message: ', exc_info=True)
-                            msg = None
-                        if not msg:
-                            break
-
-                        # Message listeners.
-                        for fn in self.message_listeners:
-                            try:
-                                fn(self, msg)
-                            except Exception:
-                                self._logger.exception(
-                                    'Exception in message handler for %s' % msg.get_type(),
-                                    exc_info=True
-                                )
+                    self._drain_input()
 
             except APIException as e:
                 self._logger.exception('Exception in MAVLink input loop')
@@ -260,16 +978,279 @@ class MAVConnection(object):
                     self.master.close()
                     self._death_error = e
 
-        t = Thread(target=mavlink_thread_in)
+            finally:
+                if selector is not None:
+                    selector.close()
+                    for sock in self._wakeup:
+                        sock.close()
+
+        self._thread_targets = (mavlink_thread_in, mavlink_thread_out)
+        self._create_threads()
+
+    def _create_threads(self):
+        # Threads can only be started once; reconnect() needs new ones.
+        thread_in, thread_out = self._thread_targets
+
+        t = Thread(target=thread_in)
         t.daemon = True
         self.mavlink_thread_in = t
 
-        t = Thread(target=mavlink_thread_out)
+        t = Thread(target=thread_out)
         t.daemon = True
         self.mavlink_thread_out = t
 
+    def _open_link(self):
+        return open_link(*self._link_args)
+
+    def _setup_link(self):
+        # Route everything written to the (new) link through out_queue.
+        self._install_mav()
+
+        # pymavlink swaps in a fresh MAVLink object when it first sees a
+        # MAVLink 2 packet, which would bypass the writer thread.
+        master = self.master
+        auto_mavlink_version = master.auto_mavlink_version
+
+        def new_auto_mavlink_version(buf):
+            mav = master.mav
+            auto_mavlink_version(buf)
+            if master.mav is not mav:
+                self._install_mav()
+
+        master.auto_mavlink_version = new_auto_mavlink_version
+
+    def _install_mav(self):
+        self.master.mav = mavutil.mavlink.MAVLink(
+            MAVWriter(self.out_queue),
+            srcSystem=self.master.source_system,
+            srcComponent=self.master.source_component,
+            use_native=self._use_native)
+
+        # Monkey-patch MAVLink object for fix_targets.
+        sendfn = self.master.mav.send
+
+        def newsendfn(mavmsg, *args, **kwargs):
+            self.fix_targets(mavmsg)
+            return sendfn(mavmsg, *args, **kwargs)
+
+        self.master.mav.send = newsendfn
+
+        # Peek at the message id before decoding, and skip packets that no
+        # listener wants. The parser then moves straight on to the next packet
+        # in its buffer, so a skipped packet never looks like "no more data".
+        decode = self.master.mav.decode
+        parse_char = self.master.mav.parse_char
+        skipped = [False]
+
+        def filtered_decode(msgbuf):
+            for fn in self.raw_listeners:
+                try:
+                    fn(self, msgbuf)
+                except Exception:
+                    self._logger.exception('Exception in raw packet handler', exc_info=True)
+            wanted = self._decode_msgids
+            if wanted is not None:
+                msgid = packet_msgid(msgbuf)
+                if msgid not in wanted:
+                    self.skipped[msgid] += 1
+                    count_packet_seq(self.master, msgbuf)
+                    skipped[0] = True
+                    return None
+            return decode(msgbuf)
+
+        def filtered_parse_char(c):
+            m = parse_char(c)
+            while m is None and skipped[0]:
+                skipped[0] = False
+                m = parse_char(b'')
+            return m
+
+        self.master.mav.decode = filtered_decode
+        self.master.mav.parse_char = filtered_parse_char
+
+    def set_message_interest(self, fn, names):
+        """
+        Declare that the message listener ``fn`` only needs the message types
+        ``names`` (or all of them, if ``names`` is ``None`` or includes ``'*'``).
+
+        Listeners that never declare an interest get every message. Packets
+        that no listener needs are not decoded at all, only counted in
+        ``skipped`` by message id.
+        """
+        msgids = None
+        if names is not None and '*' not in names:
+            msgids = set()
+            for name in names:
+                msgid = getattr(mavutil.mavlink, 'MAVLINK_MSG_ID_' + name, None)
+                if msgid is None and name.startswith('UNKNOWN_') and name[8:].isdigit():
+                    # How messages missing from the dialect are named.
+                    msgid = int(name[8:])
+                if msgid is not None:
+                    # Anything else can never be received in this dialect.
+                    msgids.add(msgid)
+        self._interest[fn] = msgids
+        self._update_interest(force=True)
+
+    def _update_interest(self, force=False):
+        # Listeners may also be added to and removed from message_listeners
+        # directly, so it is compared with the listeners last seen.
+        listeners = tuple(self.message_listeners)
+        if listeners == self._interest_listeners and not force:
+            return
+        for fn in self._interest_listeners or ():
+            if fn not in listeners:
+                self._interest.pop(fn, None)
+        wanted = set()
+        for fn in listeners:
+            msgids = self._interest.get(fn)
+            if msgids is None:
+                wanted = None
+                break
+            wanted |= msgids
+        self._decode_msgids = None if wanted is None else frozenset(wanted)
+        self._interest_listeners = listeners
+
+    def _drain_input(self):
+        """
+        Read and dispatch every message currently available on the link.
+        """
+        self._update_interest()
+        # Links that can read everything pending at once hand over a batch.
+        recv_msgs = getattr(self.master, 'recv_msgs', None)
+        while self._accept_input:
+            try:
+                if recv_msgs is not None:
+                    msgs = recv_msgs()
+                else:
+                    msg = self.master.recv_msg()
+                    msgs = [msg] if msg else []
+            except socket.error as error:
+                # If connection reset (closed), stop polling.
+                if error.errno == ECONNABORTED:
+                    raise APIException('Connection aborting during send')
+                raise
+            except mavutil.mavlink.MAVError as e:
+                # Avoid
+                #   invalid MAVLink prefix '73'
+                #   invalid MAVLink prefix '13'
+                self._logger.debug('mav recv error: %s' % str(e))
+                msgs = []
+            except Exception:
+                # Log any other unexpected exception
+                self._logger.exception('Exception while receiving message: ', exc_info=True)
+                msgs = []
+            if not msgs:
+                break
+
+            # Message listeners.
+            listeners = self.message_listeners
+            for msg in msgs:
+                for fn in listeners:
+                    try:
+                        fn(self, msg)
+                    except Exception:
+                        self._logger.exception(
+                            'Exception in message handler for %s' % msg.get_type(),
+                            exc_info=True
+                        )
+
+    def _wait_for_input(self, selector, timeout):
+        """
+        Sleep until the link has data to read, or for ``timeout`` seconds.
+        """
+        timeout = max(timeout, 0)
+        if not self._accept_input:
+            # Input is stalled, so the link would stay readable.
+            time.sleep(timeout)
+            return
+
+        fd = self.master.fd
+        if selector is None or fd is None:
+            # No pollable descriptor (e.g. serial ports on Windows).
+            self.master.select(timeout)
+            return
+
+        try:
+            selector.get_key(fd)
+        except KeyError:
+            # First call, or reset() opened a new link.
+            for key in list(selector.get_map().values()):
+                if key.fileobj is not self._wakeup[0]:
+                    selector.unregister(key.fileobj)
+            selector.register(fd, selectors.EVENT_READ)
+
+        try:
+            for key, _ in selector.select(timeout):
+                if key.fileobj is self._wakeup[0]:
+                    self._wakeup[0].recv(64)
+        except (OSError, ValueError):
+            # The link was closed under us; the caller notices via recv_msg.
+            time.sleep(timeout)
+
+    def _wake_reader(self):
+        if self._wakeup is not None:
+            try:
+                self._wakeup[1].send(b'\0')
+            except socket.error:
+                pass
+
+    def _next_write_batch(self, block=True):
+        """
+        Wait until at least one packet is queued (unless ``block`` is False),
+        then drain whatever else is waiting into a single buffer of about
+        ``write_batch_size`` bytes.
+
+        With a pacer, this also waits until the link has room (a non-blocking
+        caller should check :py:meth:`_write_delay` first) and stops the batch
+        once its bytes are spent. Packets are only taken off the queue when
+        they can be sent, so a control packet queued while bulk traffic waits
+        for the link still goes out first.
+
+        Returns ``(buf, stop)``; ``buf`` is ``None`` if nothing was queued and
+        ``stop`` is set once the shutdown sentinel has been taken off the queue.
+        """
+        pacer = self.pacer
+        if pacer is not None and block:
+            self.out_queue.wait()
+            pacer.wait()
+        try:
+            pkt = self.out_queue.get(block)
+        except Empty:
+            return None, False
+        if pkt is _WRITER_STOP:
+            return None, True
+        pkts = [pkt]
+        size = len(pkt)
+        room = pacer.consume(size) if pacer is not None else None
+        while size < self.write_batch_size and (room is None or room > 0):
+            try:
+                pkt = self.out_queue.get_nowait()
+            except Empty:
+                break
+            if pkt is _WRITER_STOP:
+                return b''.join(pkts), True
+            pkts.append(pkt)
+            size += len(pkt)
+            if pacer is not None:
+                room = pacer.consume(len(pkt))
+        if len(pkts) == 1:
+            return pkts[0], False
+        return b''.join(pkts), False
+
+    def _write_delay(self):
+        """Seconds until the pacer lets the next write out (0 if unpaced)."""
+        if self.pacer is None:
+            return 0
+        return self.pacer.delay()
+
     def reset(self):
-        self.out_queue = Queue()
+        # Drop anything still queued for the old link. The queue itself is
+        # kept, since the writer thread and MAVWriter both hold on to it.
+        while True:
+            try:
+                self.out_queue.get_nowait()
+            except Empty:
+                break
         if hasattr(self.master, 'reset'):
             self.master.reset()
         else:
@@ -277,7 +1258,23 @@ class MAVConnection(object):
                 self.master.close()
             except:
                 pass
-            self.master = mavutil.mavlink_connection(self.master.address)
+            self.master = self._open_link()
+            self._setup_link()
+
+    def reconnect(self):
+        """
+        Reopen the link (see :py:func:`reset`) and start servicing it again,
+        whether or not the connection died. Listeners are kept; anything
+        still queued for the old link is dropped.
+        """
+        self._alive = False
+        self.stop_threads()
+        self.reset()
+        self._alive = True
+        self._death_error = None
+        if self._reactor is None:
+            self._create_threads()
+        self.start()
 
     def fix_targets(self, message):
         """Set correct target IDs for our vehicle"""
@@ -295,24 +1292,69 @@ class MAVConnection(object):
         Decorator for message inputs.
         """
         self.message_listeners.append(fn)
+        return fn
+
+    def forward_raw(self, fn):
+        """
+        Decorator for raw packet inputs: ``fn(conn, pkt)`` gets the bytes of
+        every packet received, whether or not it is decoded. The checksum has
+        not been checked yet.
+        """
+        self.raw_listeners.append(fn)
+        return fn
 
     def start(self):
+        if self._reactor is not None:
+            self._reactor.add(self)
+            return
         if not self.mavlink_thread_in.is_alive():
+            if selectors is not None:
+                self._wakeup = socket.socketpair()
             self.mavlink_thread_in.start()
         if not self.mavlink_thread_out.is_alive():
             self.mavlink_thread_out.start()
 
     def close(self):
-        # TODO this can block forever if parameters continue to be added
+        # The writer flushes everything queued before its stop sentinel, so
+        # packets sent right before close() still go out.
         self._alive = False
-        while not self.out_queue.empty():
-            time.sleep(0.1)
         self.stop_threads()
         self.master.close()
 
-    def pipe(self, target):
+    def pipe(self, target, raw=False):
+        """
+        Relay messages between this connection and ``target``, addressing
+        those going our way to our vehicle.
+
+        Normally each message is decoded and packed again for the link it goes
+        out on. With ``raw``, packets are forwarded as received, without being
+        decoded, keeping the sender's system id and sequence numbers. Only
+        ``target_system`` is patched when a packet is addressed elsewhere.
+        Packets with a bad checksum are dropped.
+        Signed packets and messages missing from the dialect are passed on
+        unchanged.
+        """
         target.target_system = self.target_system
 
+        if raw:
+            # Raw listeners see packets before their checksum is checked;
+            # corrupted ones are dropped here, as decoding would have.
+
+            # vehicle -> self -> target
+            @self.forward_raw
+            def callback(_, pkt):
+                if packet_crc_ok(pkt):
+                    target.out_queue.put(packet_bytes(pkt))
+
+            # target -> self -> vehicle
+            @target.forward_raw
+            def callback(_, pkt):
+                if packet_crc_ok(pkt):
+                    pkt = retarget_packet(pkt, target.target_system) or pkt
+                    self.out_queue.put(packet_bytes(pkt))
+
+            return target
+
         # vehicle -> self -> target
         @self.forward_message
         def callback(_, msg):
@@ -321,7 +1363,7 @@ class MAVConnection(object):
             except:
                 try:
                     assert len(msg.get_msgbuf()) > 0
-                    target.out_queue.put(msg.get_msgbuf())
+                    target.out_queue.put(packet_bytes(msg.get_msgbuf()))
                 except:
                     self._logger.exception('Could not pack this object on receive: %s' % type(msg), exc_info=True)
 
@@ -335,8 +1377,511 @@ class MAVConnection(object):
             except:
                 try:
                     assert len(msg.get_msgbuf()) > 0
-                    self.out_queue.put(msg.get_msgbuf())
+                    self.out_queue.put(packet_bytes(msg.get_msgbuf()))
                 except:
                     self._logger.exception('Could not pack this object on forward: %s' % type(msg), exc_info=True)
 
         return target
+
+
+class MAVReactor(object):
+    """
+    Services many :py:class:`MAVConnection` objects from one input thread and a
+    small pool of writer threads, instead of two threads per connection.
+
+    Pass the same reactor to every connection (or to :py:func:`dronekit.connect`):
+
+    .. code:: python
+
+        reactor = MAVReactor()
+        vehicles = [connect(ip, reactor=reactor) for ip in addresses]
+
+    The input thread waits on all the links at once, dispatches each message to
+    its own connection's listeners as soon as it arrives, and runs each
+    connection's loop listeners on that connection's ``loop_interval``. A
+    connection with queued output is handed to the next free writer thread.
+
+    Listeners for every connection run on the one input thread, so a slow
+    listener delays all the vehicles.
+
+    :param int writers: Number of writer threads.
+    """
+
+    def __init__(self, writers=2):
+        if selectors is None:
+            raise APIException('MAVReactor requires the selectors module (Python 3.4+).')
+        self._logger = logging.getLogger(__name__)
+        self._writer_count = writers
+
+        self._lock = Lock()
+        self._running = False
+        self._connections = set()
+        # Registrations for the input thread to apply: (conn, added, done event).
+        self._changes = []
+        # Paced writes for the input thread to schedule: (due, conn).
+        self._deferred = []
+        self._input_thread = None
+        self._writer_threads = []
+        self._wakeup = None
+
+        # Only touched by the input thread.
+        self._selector = None
+        self._registered = {}
+        self._timers = []
+        self._timer_tokens = {}
+        self._write_timers = []
+        self._seq = itertools.count()
+
+        # Connections with queued output, waiting for a writer.
+        self._writable = Queue()
+        self._write_pending = set()
+        self._write_locks = {}
+
+    def add(self, conn):
+        """
+        Start servicing ``conn`` (called by :py:func:`MAVConnection.start`).
+        """
+        with self._lock:
+            if conn in self._connections:
+                return
+            if not self._running:
+                self._start()
+            self._connections.add(conn)
+            self._write_locks[conn] = Lock()
+            self._changes.append((conn, True, None))
+        self._wake()
+        # Send anything queued before the connection was started.
+        self._want_write(conn)
+
+    def remove(self, conn):
+        """
+        Stop servicing ``conn`` and flush its queued output (called by
+        :py:func:`MAVConnection.close`). Once this returns, the reactor no longer
+        reads from the connection's link.
+        """
+        on_input_thread = current_thread() is self._input_thread
+        done = None
+        with self._lock:
+            if conn not in self._connections:
+                return
+            self._connections.discard(conn)
+            if self._running and not on_input_thread:
+                done = Event()
+                self._changes.append((conn, False, done))
+        if done is not None:
+            self._wake()
+            done.wait()
+        elif on_input_thread:
+            self._watch(conn, None)
+
+        lock = self._write_locks.get(conn)
+        if lock is not None:
+            with lock:
+                self._flush(conn, paced=False)
+            self._write_locks.pop(conn, None)
+        self._write_pending.discard(conn)
+
+    def close(self):
+        """
+        Stop the reactor's threads. Close its connections first.
+        """
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+        self._wake()
+        if self._input_thread is not current_thread():
+            self._input_thread.join()
+        for _ in self._writer_threads:
+            self._writable.put(None)
+        for t in self._writer_threads:
+            t.join()
+        self._writer_threads = []
+
+    def _start(self):
+        self._running = True
+        self._wakeup = socket.socketpair()
+        self._input_thread = Thread(target=self._run)
+        self._input_thread.daemon = True
+        self._input_thread.start()
+        for _ in range(self._writer_count):
+            t = Thread(target=self._writer)
+            t.daemon = True
+            t.start()
+            self._writer_threads.append(t)
+
+    def _wake(self):
+        if self._wakeup is not None:
+            try:
+                self._wakeup[1].send(b'\0')
+            except socket.error:
+                pass
+
+    def _kill(self, conn, e):
+        """
+        Take down a connection whose link or listeners failed, as its own
+        threads would have.
+        """
+        if conn._alive and isinstance(e, APIException):
+            self._logger.exception('Exception in MAVLink loop')
+        on_input_thread = current_thread() is self._input_thread
+        with self._lock:
+            self._connections.discard(conn)
+            if not on_input_thread:
+                self._changes.append((conn, False, None))
+        if on_input_thread:
+            self._watch(conn, None)
+        else:
+            self._wake()
+        if conn._alive:
+            conn._alive = False
+            conn.master.close()
+            conn._death_error = e
+
+    # Input thread.
+
+    def _run(self):
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+        try:
+            while self._running:
+                self._apply_changes()
+
+                timeout = None
+                due = min([t[0][0] for t in (self._timers, self._write_timers) if t] or [None])
+                if due is not None:
+                    timeout = max(due - monotonic.monotonic(), 0)
+                try:
+                    events = self._selector.select(timeout)
+                except (OSError, ValueError):
+                    # A link was closed under us; the timers resync it.
+                    events = []
+                    time.sleep(0.01)
+
+                for key, _ in events:
+                    conn = key.data
+                    if conn is None:
+                        self._wakeup[0].recv(64)
+                    elif conn in self._connections:
+                        try:
+                            conn._drain_input()
+                        except Exception as e:
+                            self._kill(conn, e)
+
+                self._run_timers()
+        finally:
+            with self._lock:
+                self._running = False
+                for _, _, done in self._changes:
+                    if done is not None:
+                        done.set()
+                self._changes = []
+            self._selector.close()
+            self._registered = {}
+            for sock in self._wakeup:
+                sock.close()
+            self._wakeup = None
+
+    def _apply_changes(self):
+        with self._lock:
+            changes, self._changes = self._changes, []
+            deferred, self._deferred = self._deferred, []
+        for due, conn in deferred:
+            heapq.heappush(self._write_timers, (due, next(self._seq), conn))
+        for conn, added, done in changes:
+            if added:
+                if conn in self._connections:
+                    self._watch(conn, self._link_fd(conn))
+                    token = next(self._seq)
+                    self._timer_tokens[conn] = token
+                    heapq.heappush(self._timers, (monotonic.monotonic(), token, conn))
+            else:
+                self._watch(conn, None)
+                self._timer_tokens.pop(conn, None)
+            if done is not None:
+                done.set()
+
+    def _link_fd(self, conn):
+        # While input is stalled the link would stay readable, so don't watch it.
+        if conn._accept_input:
+            return conn.master.fd
+        return None
+
+    def _watch(self, conn, fd):
+        old = self._registered.get(conn)
+        if old == fd:
+            return
+        if old is not None:
+            try:
+                self._selector.unregister(old)
+            except (KeyError, ValueError, OSError):
+                pass
+            del self._registered[conn]
+        if fd is not None:
+            self._selector.register(fd, selectors.EVENT_READ, conn)
+            self._registered[conn] = fd
+
+    def _run_timers(self):
+        now = monotonic.monotonic()
+        while self._write_timers and self._write_timers[0][0] <= now:
+            _, _, conn = heapq.heappop(self._write_timers)
+            if conn in self._connections:
+                # Still marked pending from when it was deferred.
+                self._writable.put(conn)
+            else:
+                self._write_pending.discard(conn)
+        while self._timers and self._timers[0][0] <= now:
+            due, token, conn = heapq.heappop(self._timers)
+            if self._timer_tokens.get(conn) != token or conn not in self._connections:
+                continue
+            try:
+                # reset() may have replaced the link.
+                self._watch(conn, self._link_fd(conn))
+                if conn not in self._registered and conn._accept_input:
+                    # No pollable descriptor (e.g. serial ports on Windows).
+                    conn._drain_input()
+                for fn in conn.loop_listeners:
+                    fn(conn)
+            except Exception as e:
+                self._kill(conn, e)
+                continue
+            due += conn.loop_interval
+            if due <= now:
+                # Running late; don't try to catch up.
+                due = now + conn.loop_interval
+            heapq.heappush(self._timers, (due, token, conn))
+
+    # Writer threads.
+
+    def _want_write(self, conn):
+        # Called on every put; a connection waits in the queue at most once.
+        if conn in self._write_pending or conn not in self._connections:
+            return
+        self._write_pending.add(conn)
+        self._writable.put(conn)
+
+    def _writer(self):
+        while True:
+            conn = self._writable.get()
+            if conn is None:
+                return
+            self._write_pending.discard(conn)
+            lock = self._write_locks.get(conn)
+            if lock is None:
+                continue
+            # One writer per connection at a time keeps its packets in order.
+            with lock:
+                self._flush(conn)
+
+    def _defer_write(self, conn, delay):
+        # The link is busy: leave the connection marked pending (so puts in
+        # the meantime don't queue it again) and have the input thread hand
+        # it back to a writer once the pacer has room.
+        self._write_pending.add(conn)
+        with self._lock:
+            self._deferred.append((monotonic.monotonic() + delay, conn))
+        self._wake()
+
+    def _flush(self, conn, paced=True):
+        # With ``paced`` False (on removal) wait out the pacer here instead.
+        while True:
+            if conn.pacer is not None and not conn.out_queue.empty():
+                if paced:
+                    delay = conn._write_delay()
+                    if delay > 0:
+                        self._defer_write(conn, delay)
+                        return
+                else:
+                    conn.pacer.wait()
+            buf, _ = conn._next_write_batch(block=False)
+            if buf is None:
+                return
+            try:
+                conn.master.write(buf)
+            except socket.error as error:
+                # If connection reset (closed), stop polling.
+                if error.errno == ECONNABORTED:
+                    error = APIException('Connection aborting during read')
+                self._kill(conn, error)
+                return
+            except Exception as e:
+                self._logger.exception('mav send error: %s' % str(e))
+
+
+class RouterEndpoint(object):
+    """
+    A connection attached to a :py:class:`MAVRouter`, with its filters and
+    traffic counters. ``allow`` and ``deny`` are sets of message ids (``allow``
+    is ``None`` to allow everything not denied); ``rates`` maps message ids
+    (or ``'*'``) to the most packets per second each system/component may
+    send of them through this endpoint.
+    """
+
+    def __init__(self, conn, name, allow, deny, rates):
+        self.conn = conn
+        self.name = name
+        self.allow = allow
+        self.deny = deny
+        self.rates = rates
+        self._filtered = allow is not None or bool(deny) or bool(rates)
+        # Next time a (msgid, sysid, compid) may pass the rate cap.
+        self._next_send = {}
+        self._listener = None
+
+        # Metrics.
+        self.rx_packets = 0
+        self.rx_bytes = 0
+        self.tx_packets = 0
+        self.tx_bytes = 0
+        self.filtered = 0
+        self.rate_limited = 0
+        self.looped = 0
+        self.bad_crc = 0
+
+    def _accepts(self, msgid, source, now):
+        if (self.allow is not None and msgid not in self.allow) or msgid in self.deny:
+            self.filtered += 1
+            return False
+        if self.rates:
+            rate = self.rates.get(msgid, self.rates.get('*'))
+            if rate:
+                key = (msgid,) + source
+                if now < self._next_send.get(key, 0):
+                    self.rate_limited += 1
+                    return False
+                self._next_send[key] = now + 1.0 / rate
+        return True
+
+    def as_dict(self):
+        return dict((k, v) for k, v in self.__dict__.items()
+                    if not k.startswith('_') and k not in ('conn', 'allow', 'deny', 'rates'))
+
+
+class MAVRouter(object):
+    """
+    Routes MAVLink packets between any number of connections, as a routing
+    GCS proxy would.
+
+    A packet received on one endpoint is sent, as the bytes received, to
+    every other endpoint whose filters let it through. A packet addressed to
+    a system (a non-zero ``target_system``) only goes to the endpoint that
+    system was last heard on, once it has been heard from. A packet from a
+    system/component that was heard on a different endpoint within
+    ``route_timeout`` seconds has come round a loop, and is dropped. Packets
+    with a bad checksum are dropped.
+
+    Each endpoint gets one raw packet listener (see
+    :py:func:`MAVConnection.forward_raw`), however many endpoints there are,
+    and the router does not need packets to be decoded. Start the
+    connections as usual; the router does not own them.
+    """
+
+    def __init__(self, route_timeout=10):
+        self._logger = logging.getLogger(__name__)
+        self.route_timeout = route_timeout
+        # Replaced, not changed, so dispatch can iterate without a lock.
+        self._endpoints = ()
+        self._lock = Lock()
+        # (sysid, compid) -> [endpoint, last seen], and sysid -> endpoint;
+        # both guarded by the lock.
+        self._routes = {}
+        self._systems = {}
+
+    @property
+    def endpoints(self):
+        return list(self._endpoints)
+
+    def add(self, conn, name=None, allow=None, deny=None, rates=None):
+        """
+        Attach ``conn``. ``allow`` and ``deny`` are message names sent to it
+        (or not); ``rates`` maps message names (or ``'*'`` for all) to the
+        most messages a second of that type, from each source, to send it.
+        Returns its :py:class:`RouterEndpoint`.
+        """
+        def msgid(name):
+            if name == '*':
+                return name
+            msgid = getattr(mavutil.mavlink, 'MAVLINK_MSG_ID_' + name, None)
+            if msgid is None:
+                raise APIException('Unknown message type %s' % name)
+            return msgid
+
+        endpoint = RouterEndpoint(
+            conn, name or 'endpoint%d' % len(self._endpoints),
+            None if allow is None else set(msgid(n) for n in allow),
+            set(msgid(n) for n in deny or ()),
+            dict((msgid(n), rate) for n, rate in (rates or {}).items()))
+
+        def listener(_, pkt):
+            self._route(endpoint, pkt)
+
+        endpoint._listener = conn.forward_raw(listener)
+        with self._lock:
+            self._endpoints = self._endpoints + (endpoint,)
+        return endpoint
+
+    def remove(self, conn):
+        """
+        Detach ``conn``, forgetting the routes learned on it.
+        """
+        with self._lock:
+            removed = [e for e in self._endpoints if e.conn is conn]
+            self._endpoints = tuple(e for e in self._endpoints if e.conn is not conn)
+            for endpoint in removed:
+                conn.raw_listeners.remove(endpoint._listener)
+                for key, route in list(self._routes.items()):
+                    if route[0] is endpoint:
+                        del self._routes[key]
+                for sysid, e in list(self._systems.items()):
+                    if e is endpoint:
+                        del self._systems[sysid]
+
+    def stats(self):
+        """
+        Counters of each endpoint, by name.
+        """
+        return dict((e.name, e.as_dict()) for e in self._endpoints)
+
+    def _route(self, source, pkt):
+        source.rx_packets += 1
+        source.rx_bytes += len(pkt)
+        if not packet_crc_ok(pkt):
+            source.bad_crc += 1
+            return
+        msgid = packet_msgid(pkt)
+        sender = packet_source(pkt)
+        now = monotonic.monotonic()
+
+        target = 0
+        offset = _target_system_offset(msgid)
+        if offset is not None:
+            header_len = 6 if pkt[0] == 0xFE else 10
+            target = pkt[header_len + offset] if offset < pkt[1] else 0
+
+        # Each endpoint's listener runs on its own connection's thread, and
+        # remove() prunes the tables too.
+        with self._lock:
+            # Learn (or refresh) where the sender lives, unless this is one of
+            # our own forwards coming back round a loop.
+            route = self._routes.get(sender)
+            if route is None or (route[0] is not source and now - route[1] > self.route_timeout):
+                self._routes[sender] = [source, now]
+                self._systems[sender[0]] = source
+            elif route[0] is not source:
+                source.looped += 1
+                return
+            else:
+                route[1] = now
+            # Addressed to one system we know the way to: only send it there.
+            destination = self._systems.get(target) if target else None
+
+        data = None
+        for endpoint in self._endpoints:
+            if endpoint is source or (destination is not None and endpoint is not destination):
+                continue
+            if not endpoint._filtered or endpoint._accepts(msgid, sender, now):
+                if data is None:
+                    data = packet_bytes(pkt)
+                endpoint.tx_packets += 1
+                endpoint.tx_bytes += len(data)
+                endpoint.conn.out_queue.put(data)
@@ -0,0 +1,231 @@
+"""
+Parameter download and caching.
+
+After a ``PARAM_REQUEST_LIST`` the autopilot sends every parameter, in index order, as fast as
+the link lets it. On a lossy link some never arrive and have to be asked for again, one index
+at a time, with ``PARAM_REQUEST_READ``. A :py:class:`ParamDownload` keeps track of the indices
+still missing and decides which to ask for, and when:
+
+* Indices the stream has gone past without delivering are asked for straight away, while the
+  rest of the stream is still coming in.
+* Once the stream has stopped, whatever is left is asked for.
+* The requests outstanding at any time are limited to what the link has been seen to answer
+  within one reply timeout, allowing for the packets it loses, and a request not answered in
+  time is made again. The timeout follows the time replies have been taking.
+
+:py:attr:`Parameters.download_progress <dronekit.Parameters.download_progress>` reports how far
+a download has got and how long the rest should take.
+
+A :py:class:`ParamCache` keeps the parameters on disk between connections, so that
+:py:func:`connect(param_cache=...) <dronekit.connect>` need not download them again.
+"""
+
+import heapq
+import json
+import os
+import struct
+import tempfile
+
+
+class ParamDownload(object):
+    """
+    The state of one parameter download; see the module documentation.
+
+    :param request: Called with an index to ask the autopilot for that parameter.
+    :param float min_timeout: Least number of seconds to wait for a reply to a request.
+    :param float max_timeout: Most seconds to wait for a reply to a request.
+    :param int min_window: Requests always allowed to be outstanding at once.
+    :param int max_window: Most requests outstanding at once.
+    """
+
+    def __init__(self, request, min_timeout=0.05, max_timeout=1.0, min_window=10, max_window=100):
+        self._request = request
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_window = min_window
+        self.max_window = max_window
+        self.count = None
+
+    def start(self, count, now):
+        """Start again, expecting ``count`` parameters from a stream that has just started."""
+        self.count = count
+        self.missing = set(range(count))
+        # Missing indices below the highest index received: lost from the stream.
+        self._gaps = set()
+        self._highest = -1
+        self._streaming = True
+        # Index -> when it was last asked for.
+        self._requested = {}
+        self._rerequests = 0
+        self._replies = 0
+        self._first_reply = self._last_reply = self._last_new = now
+        self._rtt = None
+
+    @property
+    def complete(self):
+        """Whether every parameter has arrived."""
+        return self.count is not None and not self.missing
+
+    @property
+    def rate(self):
+        """Replies per second seen so far, or ``None`` before there is a measure."""
+        if self._replies < 2 or self._last_reply <= self._first_reply:
+            return None
+        return (self._replies - 1) / (self._last_reply - self._first_reply)
+
+    @property
+    def loss(self):
+        """Fraction of the replies expected (from the stream and to requests) that have not come."""
+        expected = self._highest + 1 + self._rerequests
+        if expected <= 0:
+            return 0.0
+        return min(max(1.0 - self._replies / float(expected), 0.0), 0.99)
+
+    @property
+    def timeout(self):
+        """Seconds to wait for a reply to a request."""
+        if self._rtt is None:
+            return min(max(0.2, self.min_timeout), self.max_timeout)
+        return min(max(3 * self._rtt, self.min_timeout), self.max_timeout)
+
+    @property
+    def window(self):
+        """Requests allowed to be outstanding at once."""
+        rate = self.rate
+        if rate is None:
+            return self.min_window
+        window = int(rate * self.timeout / (1 - self.loss))
+        return min(max(window, self.min_window), self.max_window)
+
+    def received(self, index, now):
+        """
+        Note the arrival of parameter ``index``. Returns ``True`` if it was one still missing.
+        """
+        if self.count is None:
+            return False
+        self._replies += 1
+        self._last_reply = now
+        asked = self._requested.pop(index, None)
+        if asked is not None:
+            rtt = now - asked
+            self._rtt = rtt if self._rtt is None else 0.8 * self._rtt + 0.2 * rtt
+        if index > self._highest:
+            if self._streaming:
+                self._gaps.update(i for i in range(self._highest + 1, index) if i in self.missing)
+            self._highest = index
+        if index not in self.missing:
+            return False
+        self.missing.discard(index)
+        self._gaps.discard(index)
+        self._last_new = now
+        return True
+
+    def check(self, now):
+        """
+        Ask again for the parameters that are due. Returns the number of requests made.
+        """
+        if self.count is None or not self.missing:
+            return 0
+        timeout = self.timeout
+        for index, asked in list(self._requested.items()):
+            if now - asked > timeout:
+                # Lost; it can be asked for again.
+                del self._requested[index]
+
+        if self._streaming and now - self._last_new > timeout + 1.0 / (self.rate or 1000):
+            # The stream has stopped: whatever is left has to be asked for.
+            self._streaming = False
+            self._gaps = set(self.missing)
+            self._highest = self.count - 1
+
+        free = self.window - len(self._requested)
+        if free <= 0 or not self._gaps:
+            return 0
+        indexes = heapq.nsmallest(free, (i for i in self._gaps if i not in self._requested))
+        for index in indexes:
+            self._requested[index] = now
+            self._request(index)
+        self._rerequests += len(indexes)
+        return len(indexes)
+
+    def progress(self, now):
+        """
+        How far the download has got: a dict with ``count``, ``received``, ``rate`` (replies per
+        second), ``loss`` (see :py:attr:`loss`), ``seconds`` since it started and ``eta``, the
+        seconds the rest should take (``None`` until there is a rate to go by).
+        """
+        if self.count is None:
+            return None
+        rate = self.rate
+        missing = len(self.missing)
+        eta = 0.0 if not missing else (missing / rate if rate else None)
+        return {
+            'count': self.count,
+            'received': self.count - missing,
+            'rate': rate,
+            'loss': self.loss,
+            'seconds': now - self._first_reply,
+            'eta': eta,
+        }
+
+
+def float_bits(value):
+    """The 32 bits of a MAVLink float field, for values (like ``_HASH_CHECK``) that are not floats."""
+    return struct.unpack('<I', struct.pack('<f', value))[0]
+
+
+class ParamCache(object):
+    """
+    Parameters kept on disk between connections, in a directory of JSON files: one for each
+    vehicle (by system ID) and autopilot build (by the flight software version, custom version
+    (git hash) and board UID it reports in ``AUTOPILOT_VERSION``).
+
+    A file also records how many parameters there were and, if the autopilot offers one (ArduPilot
+    does, as the ``_HASH_CHECK`` parameter), a hash of them all, for checking that they have not
+    changed since.
+
+    :param directory: Where to keep the files; created when first needed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, sysid, version):
+        """The file for the vehicle ``sysid`` running the build described by ``version`` (an ``AUTOPILOT_VERSION``)."""
+        custom = ''.join('%02x' % b for b in bytearray(version.flight_custom_version))
+        return os.path.join(self.directory, '%d-%08x-%s-%x.json' % (
+            sysid, version.flight_sw_version, custom, version.uid))
+
+    def load(self, sysid, version):
+        """
+        The cache entry for a vehicle, or ``None`` if there is none (or it cannot be read): a dict
+        with the ``count`` of parameters, their ``hash`` (or ``None``) and the ``params`` as a list of
+        ``[name, value, type]`` in index order.
+        """
+        try:
+            with open(self.path(sysid, version)) as f:
+                entry = json.load(f)
+            if entry['count'] != len(entry['params']):
+                return None
+            return entry
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, sysid, version, params, param_hash=None):
+        """
+        Replace the cache entry for a vehicle with ``params``, a list of ``(name, value, type)``
+        in index order, and their ``param_hash`` if known.
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        path = self.path(sysid, version)
+        entry = {'count': len(params), 'hash': param_hash, 'params': [list(param) for param in params]}
+        # Written aside and moved into place, so a reader never sees half a file.
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            getattr(os, 'replace', os.rename)(temp, path)
+        except Exception:
+            os.unlink(temp)
+            raise
@@ -0,0 +1,160 @@
+"""
+Timing for message and attribute listeners.
+
+Every listener registered with :py:func:`Vehicle.on_message <dronekit.Vehicle.on_message>` or
+:py:func:`Vehicle.on_attribute <dronekit.Vehicle.on_attribute>` runs on the thread that reads
+the link, one after the other, so a single slow callback delays every message behind it:
+attributes go stale, parameter downloads and mission transfers time out and the heartbeat
+watchdog fires. A :py:class:`DispatchProfiler` times each call to find the culprit.
+
+.. code:: python
+
+    vehicle.enable_dispatch_stats(budget=0.005)
+    time.sleep(30)
+    for listener in vehicle.dispatch_stats()['listeners'][:5]:
+        print(listener['listener'], listener['name'], listener['count'], listener['max'])
+
+Listeners that take longer than the budget are logged as warnings (at most once every
+``log_interval`` seconds for each listener) and counted as ``slow``. Times include whatever
+the listener itself triggers: a message listener that updates an attribute also pays for
+that attribute's listeners. A listener given an ``executor`` is only timed handing the call
+over, which is the part that holds up the link.
+"""
+
+import bisect
+import threading
+
+import monotonic
+
+# Upper bounds of the latency histogram buckets, in seconds; the last bucket
+# is unbounded.
+BUCKETS = (0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1.0)
+
+
+def listener_name(fn):
+    """
+    A readable name for a listener: module, qualified name and line, e.g.
+    ``dronekit.Vehicle.__init__.<locals>.listener:1114``.
+    """
+    # Listeners run on an executor are wrapped in a QueuedListener.
+    fn = getattr(fn, '__wrapped__', fn)
+    code = getattr(fn, '__code__', None)
+    name = getattr(fn, '__qualname__', None) or getattr(fn, '__name__', None)
+    if name is None:
+        return repr(fn)
+    name = '%s.%s' % (getattr(fn, '__module__', None) or '?', name)
+    if code is not None:
+        name = '%s:%d' % (name, code.co_firstlineno)
+    return name
+
+
+class _Timing(object):
+    __slots__ = ('count', 'total', 'max', 'slow', 'histogram', 'unreported', 'reported')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+        # Slow calls not logged yet, and when this listener was last logged.
+        self.unreported = 0
+        self.reported = None
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.histogram[bisect.bisect_left(BUCKETS, elapsed)] += 1
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'slow': self.slow,
+            'histogram': list(zip(BUCKETS + (None,), self.histogram)),
+        }
+
+
+class DispatchProfiler(object):
+    """
+    Times message and attribute listeners for :py:func:`Vehicle.dispatch_stats
+    <dronekit.Vehicle.dispatch_stats>`. Use :py:func:`Vehicle.enable_dispatch_stats
+    <dronekit.Vehicle.enable_dispatch_stats>` rather than creating one directly.
+
+    :param float budget: Seconds a listener may take before it is logged as slow.
+    :param logger: Where slow listeners are reported.
+    :param float log_interval: Least number of seconds between two reports about the same listener.
+    """
+
+    def __init__(self, budget, logger, log_interval=10):
+        self.budget = budget
+        self.log_interval = log_interval
+        self._logger = logger
+        # Listeners usually run on the reader thread, stats are read on another.
+        self._lock = threading.Lock()
+        self._listeners = {}
+        self._names = {}
+
+    def dispatch(self, kind, owner, fns, name, value):
+        """
+        Call each of ``fns`` as ``fn(owner, name, value)``, timing every call
+        and the dispatch as a whole. ``kind`` is ``'message'`` or ``'attribute'``.
+        """
+        clock = monotonic.monotonic
+        start = clock()
+        for fn in fns:
+            called = clock()
+            try:
+                fn(owner, name, value)
+            except Exception:
+                owner._logger.exception('Exception in %s handler for %s', kind, name)
+            self._record(kind, name, fn, clock() - called)
+        elapsed = clock() - start
+        with self._lock:
+            timing = self._names.get((kind, name))
+            if timing is None:
+                timing = self._names[(kind, name)] = _Timing()
+            timing.add(elapsed)
+
+    def _record(self, kind, name, fn, elapsed):
+        key = (kind, name, fn)
+        with self._lock:
+            timing = self._listeners.get(key)
+            if timing is None:
+                timing = self._listeners[key] = _Timing()
+            timing.add(elapsed)
+            if elapsed <= self.budget:
+                return
+            timing.slow += 1
+            timing.unreported += 1
+            now = monotonic.monotonic()
+            if timing.reported is not None and now - timing.reported < self.log_interval:
+                return
+            timing.reported = now
+            unreported, timing.unreported = timing.unreported, 0
+        self._logger.warning('Slow %s listener %s for %s took %.1f ms (budget %.1f ms, %d slow calls since last report)',
+                             kind, listener_name(fn), name, elapsed * 1000, self.budget * 1000, unreported)
+
+    def stats(self, reset=False):
+        """
+        Call counts and latencies (in seconds) so far; see :py:func:`Vehicle.dispatch_stats
+        <dronekit.Vehicle.dispatch_stats>`. With ``reset`` the counts start again from zero.
+        """
+        with self._lock:
+            names = [(key, timing.as_dict()) for key, timing in self._names.items()]
+            listeners = [(key, timing.as_dict()) for key, timing in self._listeners.items()]
+            if reset:
+                self._names = {}
+                self._listeners = {}
+        result = {'budget': self.budget, 'messages': {}, 'attributes': {}, 'listeners': []}
+        for (kind, name), timing in names:
+            result[kind + 's'][name] = timing
+        for (kind, name, fn), timing in listeners:
+            timing.update(kind=kind, name=name, listener=listener_name(fn))
+            result['listeners'].append(timing)
+        result['listeners'].sort(key=lambda timing: timing['total'], reverse=True)
+        return result
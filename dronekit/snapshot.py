@@ -0,0 +1,219 @@
+"""
+Shared-memory telemetry snapshots.
+
+A :py:class:`TelemetryPublisher` keeps a fixed-layout record of a vehicle's
+state (location frames, attitude, velocity, battery, mode, armed, GPS and the
+time of the last heartbeat) in a memory-mapped file. Any number of local
+processes can then map the same file with a :py:class:`TelemetryReader` and
+read consistent snapshots without a MAVLink connection of their own, without
+decoding anything and without a system call per read.
+
+.. code:: python
+
+    # In the process that owns the connection:
+    vehicle = connect('/dev/ttyAMA0', baud=921600)
+    vehicle.publish_telemetry('/dev/shm/dronekit-1')
+
+    # In any other process on the same machine:
+    from dronekit.snapshot import TelemetryReader
+
+    reader = TelemetryReader('/dev/shm/dronekit-1')
+    state = reader.read()
+    print(state.global_relative_frame.alt, state.mode.name, state.last_heartbeat)
+
+The record is guarded by a sequence lock: the publisher makes the sequence
+number odd while it rewrites the record and even again when it is done, and a
+reader retries until it has read the record between two identical, even
+sequence numbers. Readers never block the publisher.
+"""
+
+import collections
+import math
+import mmap
+import os
+import struct
+import threading
+
+import monotonic
+
+from dronekit import (APIException, TimeoutError, LocationGlobal, LocationGlobalRelative,
+                      LocationLocal, Attitude, Battery, GPSInfo, VehicleMode)
+
+MAGIC = b'DKTS'
+VERSION = 1
+
+# magic, version, record size, then the sequence number (8-byte aligned).
+_HEADER = struct.Struct('<4sHHQ')
+_SEQ = struct.Struct('<Q')
+_SEQ_OFFSET = 8
+
+# Numbers are doubles, with NaN standing for None.
+FIELDS = ('lat', 'lon', 'alt', 'relative_alt', 'north', 'east', 'down',
+           'pitch', 'yaw', 'roll', 'vx', 'vy', 'vz',
+           'voltage', 'current', 'level',
+           'eph', 'epv', 'fix_type', 'satellites_visible',
+           'heartbeat', 'updated')
+_RECORD = struct.Struct('<%dd?16s' % len(FIELDS))
+_RECORD_OFFSET = _HEADER.size
+
+SIZE = _RECORD_OFFSET + _RECORD.size
+
+# The messages whose Vehicle listeners update the fields above.
+MESSAGES = ('HEARTBEAT', 'GLOBAL_POSITION_INT', 'LOCAL_POSITION_NED', 'ATTITUDE',
+            'SYS_STATUS', 'GPS_RAW_INT')
+
+Snapshot = collections.namedtuple('Snapshot', [
+    'global_frame', 'global_relative_frame', 'local_frame', 'attitude', 'velocity',
+    'battery', 'mode', 'armed', 'gps_0', 'last_heartbeat', 'age', 'seq'])
+"""
+One consistent copy of the published state, with the same attribute types as
+:py:class:`dronekit.Vehicle`. ``last_heartbeat`` and ``age`` (time since the
+record was written) are in seconds, measured when the snapshot was read.
+"""
+
+
+def _number(value):
+    return float('nan') if value is None else value
+
+
+def _value(number):
+    return None if math.isnan(number) else number
+
+
+class TelemetryPublisher(object):
+    """
+    Publishes ``vehicle``'s state to the file at ``path`` (created, or
+    truncated to size). On Linux a path under ``/dev/shm`` keeps the file in
+    memory.
+
+    The record is rewritten after the vehicle has handled each of
+    :py:data:`MESSAGES`. Use :py:func:`dronekit.Vehicle.publish_telemetry`
+    rather than creating one directly.
+    """
+
+    def __init__(self, vehicle, path):
+        self._vehicle = vehicle
+        self.path = path
+        self.seq = 0
+        self._lock = threading.Lock()
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, SIZE)
+            self._map = mmap.mmap(fd, SIZE)
+        finally:
+            os.close(fd)
+        _HEADER.pack_into(self._map, 0, MAGIC, VERSION, _RECORD.size, self.seq)
+
+        vehicle.on_message(list(MESSAGES))(self._listener)
+        self.publish()
+
+    def _listener(self, vehicle, name, m):
+        self.publish()
+
+    def publish(self):
+        """Write the vehicle's current state to the record."""
+        v = self._vehicle
+        loc = v._location
+        values = [_number(x) for x in (
+            loc._lat, loc._lon, loc._alt, loc._relative_alt, loc._north, loc._east, loc._down,
+            v._pitch, v._yaw, v._roll, v._vx, v._vy, v._vz,
+            v._voltage, v._current, v._level,
+            v._eph, v._epv, v._fix_type, v._satellites_visible,
+            v._heartbeat_lastreceived or None, monotonic.monotonic())]
+        values.append(bool(v._armed))
+        values.append((v._flightmode or '').encode('ascii', 'replace'))
+
+        # A sequence lock has a single writer.
+        with self._lock:
+            seq = self.seq + 1
+            _SEQ.pack_into(self._map, _SEQ_OFFSET, seq)
+            _RECORD.pack_into(self._map, _RECORD_OFFSET, *values)
+            _SEQ.pack_into(self._map, _SEQ_OFFSET, seq + 1)
+            self.seq = seq + 1
+
+    def close(self):
+        """Stop publishing. The file is left in place for readers that still have it mapped."""
+        for name in MESSAGES:
+            self._vehicle.remove_message_listener(name, self._listener)
+        with self._lock:
+            self._map.close()
+
+
+class TelemetryReader(object):
+    """
+    Maps a record written by a :py:class:`TelemetryPublisher`, possibly in
+    another process.
+
+    :param path: The file passed to :py:func:`dronekit.Vehicle.publish_telemetry`.
+    :param timeout: How long :py:func:`read` keeps retrying while the record is
+        being rewritten before giving up (only a publisher that died
+        mid-write can hold it that long).
+    """
+
+    def __init__(self, path, timeout=1):
+        self.path = path
+        self.timeout = timeout
+        # Reads that raced a write and had to be repeated.
+        self.retries = 0
+
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self._map = mmap.mmap(fd, SIZE, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        magic, version, size, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or size != _RECORD.size:
+            self._map.close()
+            raise APIException('%s is not a version %d telemetry snapshot' % (path, VERSION))
+
+    def read_raw(self):
+        """
+        Read the record without building any objects: returns ``(seq, fields)``
+        where ``fields`` is the tuple of numbers (NaN for unknown) named by
+        :py:data:`FIELDS`, then ``armed`` and the mode name as bytes.
+        """
+        m = self._map
+        deadline = None
+        while True:
+            seq = _SEQ.unpack_from(m, _SEQ_OFFSET)[0]
+            if not seq & 1:
+                fields = _RECORD.unpack_from(m, _RECORD_OFFSET)
+                if _SEQ.unpack_from(m, _SEQ_OFFSET)[0] == seq:
+                    return seq, fields
+            self.retries += 1
+            if deadline is None:
+                deadline = monotonic.monotonic() + self.timeout
+            elif monotonic.monotonic() > deadline:
+                raise TimeoutError('Telemetry snapshot %s is stuck mid-write' % self.path)
+
+    def read(self):
+        """Read a consistent :py:class:`Snapshot` of the published state."""
+        seq, fields = self.read_raw()
+        (lat, lon, alt, relative_alt, north, east, down, pitch, yaw, roll, vx, vy, vz,
+         voltage, current, level, eph, epv, fix_type, satellites_visible,
+         heartbeat, updated) = [_value(x) for x in fields[:len(FIELDS)]]
+        armed, mode = fields[len(FIELDS):]
+        mode = mode.rstrip(b'\0').decode('ascii')
+
+        now = monotonic.monotonic()
+        return Snapshot(
+            global_frame=LocationGlobal(lat, lon, alt),
+            global_relative_frame=LocationGlobalRelative(lat, lon, relative_alt),
+            local_frame=LocationLocal(north, east, down),
+            attitude=Attitude(pitch, yaw, roll),
+            velocity=[vx, vy, vz],
+            battery=None if None in (voltage, current, level) else Battery(voltage, _int(current), _int(level)),
+            mode=VehicleMode(mode) if mode else None,
+            armed=armed,
+            gps_0=GPSInfo(_int(eph), _int(epv), _int(fix_type), _int(satellites_visible)),
+            last_heartbeat=None if heartbeat is None else now - heartbeat,
+            age=now - updated,
+            seq=seq)
+
+    def close(self):
+        self._map.close()
+
+
+def _int(value):
+    return None if value is None else int(value)
@@ -0,0 +1,298 @@
+"""
+A scripted stand-in for an ArduCopter autopilot, for tests and benchmarks that
+need a vehicle on the other end of the link but not a simulator.
+
+It listens on a local UDP port (connect with :py:attr:`FakeAutopilot.connection_string`),
+streams telemetry once a ground station has said hello, and answers the parameter,
+command and mission protocols well enough for DroneKit's helpers.
+"""
+from __future__ import print_function
+
+import collections
+import random
+import select
+import socket
+import struct
+import threading
+import time
+import zlib
+
+from pymavlink import mavutil
+
+mavlink = mavutil.mavlink
+
+DEFAULT_PARAMS = collections.OrderedDict([
+    ('SYSID_THISMAV', 1),
+    ('THR_MIN', 130),
+    ('RTL_ALT', 1500),
+    ('WPNAV_SPEED', 500),
+    ('ARMING_CHECK', 1),
+])
+
+STABILIZE = 0
+GUIDED = 4
+
+# Single parameter requests queued at most, as in ArduPilot.
+PARAM_READ_QUEUE = 20
+
+
+def float32(value):
+    """The value a float survives as after a trip through a MAVLink float field."""
+    return struct.unpack('f', struct.pack('f', value))[0]
+
+
+class FakeAutopilot(object):
+    """
+    A fake quadcopter on ``127.0.0.1``.
+
+    :param params: Parameters to serve (defaults to a handful of ArduCopter ones).
+    :param rate: Telemetry stream rate in Hz.
+    :param drop: Probability of dropping each outgoing packet.
+    :param climb_rate: Metres per second climbed after a takeoff command.
+    :param hash_check: Answer requests for ArduPilot's ``_HASH_CHECK`` with a hash of the parameters.
+    :param param_rate: Parameters sent per second, as a link's bandwidth would allow; by default
+        they are sent as soon as they are asked for. Like ArduPilot, only a few requests for single
+        parameters are queued at once and the rest are ignored.
+    """
+
+    def __init__(self, params=None, rate=20, drop=0.0, climb_rate=10.0, sysid=1, param_rate=None,
+                 hash_check=True):
+        self.params = collections.OrderedDict(
+            (name, float32(value)) for name, value in (params or DEFAULT_PARAMS).items())
+        self.rate = rate
+        self.drop = drop
+        self.climb_rate = climb_rate
+        self.param_rate = param_rate
+        self.hash_check = hash_check
+        # Indices waiting to be sent at param_rate: single requests, then the list.
+        self._param_reads = collections.deque()
+        self._param_stream = collections.deque()
+        # While paused nothing gets through either way, as in a radio dropout.
+        self.paused = False
+
+        self.armed = False
+        self.custom_mode = STABILIZE
+        self.alt = 0.0
+        self.target_alt = None
+        # Like ArduPilot, item 0 is home.
+        self.mission = [mavlink.MAVLink_mission_item_message(
+            0, 0, 0, mavlink.MAV_FRAME_GLOBAL, mavlink.MAV_CMD_NAV_WAYPOINT, 0, 1,
+            0, 0, 0, 0, -35.363261, 149.165230, 584)]
+        self._mission_expected = None
+
+        # What the ground station sent us, for assertions.
+        self.received = collections.Counter()
+        self.commands = []
+        # Command number -> for each of the next COMMAND_LONGs of it, the results
+        # to answer with instead of the usual handling ([] to not answer at all).
+        self.command_replies = {}
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.peer = None
+
+        self.mav = mavlink.MAVLink(self, srcSystem=sysid, srcComponent=1)
+        self.mav.robust_parsing = True
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def connection_string(self):
+        return 'udpout:127.0.0.1:%d' % self.port
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self.sock.close()
+
+    def write(self, buf):
+        # Called by self.mav for every packet we send.
+        if self.peer is None or self.paused or random.random() < self.drop:
+            return
+        try:
+            self.sock.sendto(buf, self.peer)
+        except socket.error:
+            pass
+
+    def _run(self):
+        period = 1.0 / self.rate
+        next_stream = next_heartbeat = next_param = time.time()
+        while self._running:
+            now = time.time()
+            wake = None
+            if self.peer is not None:
+                if now >= next_heartbeat:
+                    self.send_heartbeat()
+                    next_heartbeat = now + 1
+                if now >= next_stream:
+                    self._climb(period)
+                    self.send_telemetry()
+                    next_stream = now + period
+                if self.param_rate and (self._param_reads or self._param_stream):
+                    # Keep to the rate, catching up on at most 10 ms after a late wakeup.
+                    while now >= next_param and (self._param_reads or self._param_stream):
+                        self._send_queued_param()
+                        next_param = max(next_param + 1.0 / self.param_rate, now - 0.01)
+                    wake = next_param
+                else:
+                    next_param = now
+
+            timeout = max(min(next_stream, next_heartbeat) - now, 0.01)
+            if wake is not None:
+                timeout = min(timeout, max(wake - now, 0))
+            readable, _, _ = select.select([self.sock], [], [], timeout)
+            if not readable:
+                continue
+            data, addr = self.sock.recvfrom(65535)
+            if self.paused:
+                continue
+            self.peer = addr
+            for msg in self.mav.parse_buffer(data) or []:
+                self.received[msg.get_type()] += 1
+                handler = getattr(self, '_handle_' + msg.get_type().lower(), None)
+                if handler is not None:
+                    handler(msg)
+
+    def _climb(self, dt):
+        if self.target_alt is None or not self.armed:
+            return
+        step = self.climb_rate * dt
+        if abs(self.target_alt - self.alt) <= step:
+            self.alt = self.target_alt
+        else:
+            self.alt += step if self.target_alt > self.alt else -step
+
+    def send_heartbeat(self):
+        base_mode = mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED
+        if self.armed:
+            base_mode |= mavlink.MAV_MODE_FLAG_SAFETY_ARMED
+        self.mav.heartbeat_send(mavlink.MAV_TYPE_QUADROTOR, mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA,
+                                base_mode, self.custom_mode,
+                                mavlink.MAV_STATE_ACTIVE if self.armed else mavlink.MAV_STATE_STANDBY)
+
+    def send_telemetry(self):
+        boot_ms = int(time.time() * 1000) & 0xffffffff
+        lat, lon = -353632610, 1491652300
+        self.mav.global_position_int_send(boot_ms, lat, lon, int((584 + self.alt) * 1000),
+                                          int(self.alt * 1000), 0, 0, 0, 0)
+        self.mav.attitude_send(boot_ms, 0, 0, 0, 0, 0, 0)
+        # time_usec is wall-clock time, so listeners can measure latency.
+        self.mav.gps_raw_int_send(int(time.time() * 1e6), 3, lat, lon, int((584 + self.alt) * 1000),
+                                  100, 100, 0, 0, 10)
+        self.mav.sys_status_send(0, 0, 0, 500, 12600, 100, 90, 0, 0, 0, 0, 0, 0)
+        self.mav.vfr_hud_send(0, 0, 0, 0, self.alt, 0)
+
+    def send_param(self, index):
+        name = list(self.params)[index]
+        self.mav.param_value_send(name.encode('ascii'), self.params[name],
+                                  mavlink.MAV_PARAM_TYPE_REAL32, len(self.params), index)
+
+    def _handle_param_request_list(self, msg):
+        if self.param_rate:
+            self._param_stream = collections.deque(range(len(self.params)))
+            return
+        for index in range(len(self.params)):
+            self.send_param(index)
+
+    def param_hash(self):
+        crc = 0
+        for name, value in self.params.items():
+            crc = zlib.crc32(name.encode('ascii') + struct.pack('<f', value), crc)
+        return crc & 0xffffffff
+
+    def _handle_param_request_read(self, msg):
+        if msg.param_id == '_HASH_CHECK':
+            if self.hash_check:
+                self.mav.param_value_send(b'_HASH_CHECK', struct.unpack('<f', struct.pack('<I', self.param_hash()))[0],
+                                          mavlink.MAV_PARAM_TYPE_UINT32, len(self.params), 65535)
+            return
+        if msg.param_index >= 0:
+            if msg.param_index >= len(self.params):
+                return
+            index = msg.param_index
+        elif msg.param_id in self.params:
+            index = list(self.params).index(msg.param_id)
+        else:
+            return
+        if not self.param_rate:
+            self.send_param(index)
+        elif len(self._param_reads) < PARAM_READ_QUEUE:
+            self._param_reads.append(index)
+
+    def _send_queued_param(self):
+        queue = self._param_reads or self._param_stream
+        if queue:
+            self.send_param(queue.popleft())
+
+    def _handle_param_set(self, msg):
+        if msg.param_id in self.params:
+            self.params[msg.param_id] = float32(msg.param_value)
+            self.send_param(list(self.params).index(msg.param_id))
+
+    def _ack(self, msg, result=mavlink.MAV_RESULT_ACCEPTED):
+        self.mav.command_ack_send(msg.command, result)
+
+    def _handle_command_long(self, msg):
+        self.commands.append(msg)
+        if self.command_replies.get(msg.command):
+            for result in self.command_replies[msg.command].pop(0):
+                self._ack(msg, result)
+            return
+        if msg.command == mavlink.MAV_CMD_COMPONENT_ARM_DISARM:
+            self.armed = msg.param1 == 1
+            if not self.armed:
+                self.alt = 0.0
+                self.target_alt = None
+            self._ack(msg)
+            self.send_heartbeat()
+        elif msg.command == mavlink.MAV_CMD_NAV_TAKEOFF:
+            if not self.armed:
+                self._ack(msg, mavlink.MAV_RESULT_FAILED)
+                return
+            self.target_alt = msg.param7
+            self._ack(msg)
+        elif msg.command == mavlink.MAV_CMD_DO_SET_MODE:
+            self.custom_mode = int(msg.param2)
+            self._ack(msg)
+            self.send_heartbeat()
+        elif msg.command == mavlink.MAV_CMD_REQUEST_AUTOPILOT_CAPABILITIES:
+            self._ack(msg)
+            self.mav.autopilot_version_send(0, 0x03030000, 0, 0, 0, [0] * 8, [0] * 8, [0] * 8,
+                                            0, 0, 0)
+        else:
+            self._ack(msg)
+
+    def _handle_set_mode(self, msg):
+        self.custom_mode = msg.custom_mode
+        self.send_heartbeat()
+
+    def _handle_mission_clear_all(self, msg):
+        del self.mission[1:]
+        self.mav.mission_ack_send(msg.get_srcSystem(), msg.get_srcComponent(), mavlink.MAV_MISSION_ACCEPTED)
+
+    def _handle_mission_count(self, msg):
+        self._mission_expected = msg.count
+        self.mission = []
+        if msg.count:
+            self.mav.mission_request_send(msg.get_srcSystem(), msg.get_srcComponent(), 0)
+
+    def _handle_mission_item(self, msg):
+        if self._mission_expected is None or msg.seq != len(self.mission):
+            return
+        self.mission.append(msg)
+        if len(self.mission) < self._mission_expected:
+            self.mav.mission_request_send(msg.get_srcSystem(), msg.get_srcComponent(), len(self.mission))
+        else:
+            self._mission_expected = None
+            self.mav.mission_ack_send(msg.get_srcSystem(), msg.get_srcComponent(), mavlink.MAV_MISSION_ACCEPTED)
+
+    def _handle_mission_request_list(self, msg):
+        self.mav.mission_count_send(msg.get_srcSystem(), msg.get_srcComponent(), len(self.mission))
+
+    def _handle_mission_request(self, msg):
+        if msg.seq < len(self.mission):
+            self.mav.send(self.mission[msg.seq])
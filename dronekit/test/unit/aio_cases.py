@@ -0,0 +1,114 @@
+"""
+The tests of dronekit.aio, in a module of their own so that Python 2 never has to compile
+their coroutines; test_aio imports them on Python 3.
+"""
+import asyncio
+import collections
+import os
+import shutil
+import tempfile
+import time
+from dronekit import connect_async, Command, VehicleMode
+from dronekit.test import wait_for
+from dronekit.test.fake_autopilot import FakeAutopilot, GUIDED
+from nose.tools import assert_equals
+from pymavlink import mavutil
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_connect_arm_and_takeoff():
+    autopilot = FakeAutopilot()
+
+    async def fly():
+        vehicle = await connect_async(autopilot.connection_string, wait_ready=True, timeout=10)
+        try:
+            vehicle.mode = VehicleMode('GUIDED')
+            await vehicle.arm_async(timeout=5)
+            await vehicle.simple_takeoff_async(5, timeout=5)
+            return vehicle.location.global_relative_frame.alt
+        finally:
+            vehicle.close()
+
+    alt = run(fly())
+    autopilot.close()
+
+    assert_equals(autopilot.custom_mode, GUIDED)
+    assert autopilot.armed
+    assert abs(alt - 5) < 0.5
+
+
+def test_parameters_and_mission():
+    autopilot = FakeAutopilot()
+
+    async def configure():
+        vehicle = await connect_async(autopilot.connection_string, wait_ready=True, timeout=10)
+        try:
+            assert await vehicle.parameters.set_async('THR_MIN', 150)
+            assert_equals(vehicle.parameters.get('THR_MIN', wait_ready=False), 150)
+
+            cmds = vehicle.commands
+            cmds.download()
+            await vehicle.wait_ready_async('commands', timeout=5)
+            cmds.clear()
+            for alt in (10, 20):
+                cmds.add(Command(0, 0, 0, mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT,
+                                 mavutil.mavlink.MAV_CMD_NAV_WAYPOINT, 0, 0, 0, 0, 0, 0,
+                                 -35.36, 149.16, alt))
+            await cmds.upload_async(timeout=5)
+        finally:
+            vehicle.close()
+
+    run(configure())
+    # upload() returns once the last item is sent, not once it has arrived.
+    wait_for(lambda: len(autopilot.mission) == 3, 5)
+    autopilot.close()
+
+    assert_equals(autopilot.params['THR_MIN'], 150)
+    assert_equals([item.z for item in autopilot.mission[1:]], [10, 20])
+
+
+def test_param_cache():
+    directory = tempfile.mkdtemp()
+    params = collections.OrderedDict(('PARAM_%d' % i, i) for i in range(100))
+    autopilot = FakeAutopilot(params=params, param_rate=100)
+
+    async def connect_twice():
+        vehicle = await connect_async(autopilot.connection_string, wait_ready=['parameters'], timeout=10,
+                                      param_cache=directory)
+        try:
+            # Saved once the download is complete.
+            for _ in range(100):
+                if os.listdir(directory):
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            vehicle.close()
+
+        start = time.time()
+        vehicle = await connect_async(autopilot.connection_string, wait_ready=['parameters'], timeout=10,
+                                      param_cache=directory)
+        try:
+            elapsed = time.time() - start
+            loaded = dict(vehicle.parameters)
+            # Checked against the vehicle in the background.
+            await asyncio.sleep(0.5)
+        finally:
+            vehicle.close()
+        return elapsed, loaded
+
+    try:
+        elapsed, loaded = run(connect_twice())
+    finally:
+        autopilot.close()
+        shutil.rmtree(directory)
+
+    assert elapsed < 1
+    assert_equals(loaded, dict(params))
+    assert_equals(autopilot.received['PARAM_REQUEST_LIST'], 1)
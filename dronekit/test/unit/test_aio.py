@@ -0,0 +1,7 @@
+import sys
+from nose import SkipTest
+
+if sys.version_info < (3, 5):
+    raise SkipTest('dronekit.aio needs Python 3.5 or later')
+
+from dronekit.test.unit.aio_cases import *  # noqa: F401,F403
@@ -0,0 +1,616 @@
+import socket
+import threading
+import time
+from dronekit import connect
+from dronekit.mavlink import MAVConnection, MAVReactor, OutboundQueue, _WRITER_STOP, mavudpin_multi, packet_msgid, \
+    retarget_packet, MAVRouter, packet_target, selectors
+from dronekit.test.fake_autopilot import FakeAutopilot
+from nose import SkipTest
+from nose.tools import assert_equals, assert_raises
+from queue import Full
+from pymavlink import mavutil
+
+
+def udp_sink():
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(('127.0.0.1', 0))
+    sink.settimeout(0.5)
+    return sink, sink.getsockname()[1]
+
+
+def read_messages(sink, count, timeout=5):
+    parser = mavutil.mavlink.MAVLink(None)
+    msgs = []
+    datagrams = 0
+    start = time.time()
+    while len(msgs) < count and time.time() - start < timeout:
+        try:
+            data = sink.recv(65535)
+        except socket.timeout:
+            continue
+        datagrams += 1
+        msgs.extend(parser.parse_buffer(data) or [])
+    return msgs, datagrams
+
+
+def send_heartbeats(conn, count):
+    for _ in range(count):
+        conn.master.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_GCS,
+                                       mavutil.mavlink.MAV_AUTOPILOT_INVALID, 0, 0, 0)
+
+
+def test_writer_coalesces_queued_packets():
+    sink, port = udp_sink()
+    conn = MAVConnection('udpout:127.0.0.1:%d' % port)
+
+    # Queue a burst before the writer starts, so it is all waiting at once.
+    send_heartbeats(conn, 20)
+    conn.mavlink_thread_out.start()
+
+    msgs, datagrams = read_messages(sink, 20)
+    conn.close()
+    sink.close()
+
+    assert_equals(len(msgs), 20)
+    assert datagrams < 20
+
+
+def test_close_flushes_queued_packets():
+    sink, port = udp_sink()
+    conn = MAVConnection('udpout:127.0.0.1:%d' % port)
+    conn.mavlink_thread_out.start()
+
+    send_heartbeats(conn, 5)
+    conn.close()
+
+    msgs, _ = read_messages(sink, 5)
+    sink.close()
+
+    assert_equals(len(msgs), 5)
+
+
+def test_loop_listeners_run_without_traffic():
+    conn = MAVConnection('udpin:127.0.0.1:0', loop_interval=0.01)
+    calls = []
+
+    @conn.forward_loop
+    def listener(_):
+        calls.append(time.time())
+
+    conn.start()
+    time.sleep(0.3)
+    conn.close()
+
+    assert len(calls) >= 10
+
+
+def test_messages_dispatched_when_readable():
+    # A long loop interval: dispatch must not wait for the next loop.
+    conn = MAVConnection('udpin:127.0.0.1:0', loop_interval=10)
+    port = conn.master.port.getsockname()[1]
+    received = []
+
+    @conn.forward_message
+    def listener(_, msg):
+        received.append(time.time())
+
+    conn.start()
+    time.sleep(0.1)
+
+    sender = mavutil.mavlink_connection('udpout:127.0.0.1:%d' % port)
+    sent = time.time()
+    sender.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_QUADROTOR,
+                              mavutil.mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA, 0, 0, 0)
+    start = time.time()
+    while not received and time.time() - start < 5:
+        time.sleep(0.01)
+    sender.close()
+    conn.close()
+
+    assert_equals(len(received), 1)
+    assert received[0] - sent < 1
+
+
+def test_reactor_services_many_connections():
+    if selectors is None:
+        raise SkipTest('MAVReactor needs the selectors module')
+    reactor = MAVReactor()
+    conns = [MAVConnection('udpin:127.0.0.1:0', loop_interval=0.01, reactor=reactor) for _ in range(5)]
+    received = dict((conn, []) for conn in conns)
+    loops = dict((conn, []) for conn in conns)
+    for conn in conns:
+        conn.forward_message(lambda c, msg: received[c].append(msg.get_srcSystem()))
+        conn.forward_loop(lambda c: loops[c].append(time.time()))
+    threads = threading.active_count()
+    for conn in conns:
+        conn.start()
+    # One input thread and two writers, however many connections.
+    assert_equals(threading.active_count(), threads + 3)
+
+    senders = []
+    for i, conn in enumerate(conns):
+        sender = mavutil.mavlink_connection('udpout:127.0.0.1:%d' % conn.master.port.getsockname()[1],
+                                            source_system=i + 1)
+        sender.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_QUADROTOR,
+                                  mavutil.mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA, 0, 0, 0)
+        senders.append(sender)
+    time.sleep(0.3)
+
+    # Replies go back through the writers to each sender.
+    for conn in conns:
+        send_heartbeats(conn, 3)
+    for conn in conns:
+        conn.close()
+    replies = []
+    for sender in senders:
+        start = time.time()
+        msgs = []
+        while len(msgs) < 3 and time.time() - start < 5:
+            msg = sender.recv_match(blocking=True, timeout=0.5)
+            if msg is not None:
+                msgs.append(msg)
+        replies.append(len(msgs))
+        sender.close()
+    reactor.close()
+
+    assert_equals([received[conn] for conn in conns], [[i + 1] for i in range(5)])
+    assert all(len(loops[conn]) >= 10 for conn in conns)
+    assert_equals(replies, [3] * 5)
+
+
+def test_vehicles_share_a_reactor():
+    if selectors is None:
+        raise SkipTest('MAVReactor needs the selectors module')
+    reactor = MAVReactor()
+    autopilots = [FakeAutopilot() for _ in range(3)]
+    vehicles = [connect(autopilot.connection_string, wait_ready=True, timeout=10, reactor=reactor)
+                for autopilot in autopilots]
+    for vehicle in vehicles:
+        vehicle.arm(timeout=5)
+    armed = [vehicle.armed for vehicle in vehicles]
+    for vehicle in vehicles:
+        vehicle.close()
+    reactor.close()
+    for autopilot in autopilots:
+        autopilot.close()
+
+    assert_equals(armed, [True] * 3)
+    assert all(autopilot.armed for autopilot in autopilots)
+
+
+def test_udpin_drains_all_pending_datagrams():
+    link = mavudpin_multi('127.0.0.1:0', input=True)
+    assert_equals(link.recv(), b"")
+    assert_equals(link.recv_msgs(), [])
+
+    sender = mavutil.mavlink_connection('udpout:127.0.0.1:%d' % link.port.getsockname()[1])
+    for i in range(3):
+        sender.mav.attitude_send(i, 0, 0, 0, 0, 0, 0)
+    # Two packets in one datagram.
+    packed = [sender.mav.attitude_encode(i, 0, 0, 0, 0, 0, 0).pack(sender.mav) for i in (3, 4)]
+    sender.write(b''.join(packed))
+    time.sleep(0.1)
+
+    msgs = link.recv_msgs()
+    sender.close()
+    link.close()
+
+    assert_equals([msg.time_boot_ms for msg in msgs], [0, 1, 2, 3, 4])
+
+
+def test_udpin_client_table_expires_and_evicts():
+    link = mavudpin_multi('127.0.0.1:0', input=True, client_timeout=0.3, max_clients=2)
+    port = link.port.getsockname()[1]
+    sinks = [udp_sink() for _ in range(3)]
+
+    def hello(sink):
+        sink[0].sendto(b'\xfe', ('127.0.0.1', port))
+        time.sleep(0.05)
+        while link._recv_datagram() is not None:
+            pass
+
+    hello(sinks[0])
+    hello(sinks[1])
+    hello(sinks[2])
+    # The least recently seen client made way for the third.
+    assert_equals(link.addresses, set(('127.0.0.1', sink[1]) for sink in sinks[1:]))
+    assert_equals(link.clients_evicted, 1)
+
+    link.write(b'abc')
+    stats = link.client_stats()
+    assert_equals([(c['rx_datagrams'], c['tx_datagrams'], c['tx_bytes']) for c in stats], [(1, 1, 3)] * 2)
+    assert_equals(sinks[1][0].recv(100), b'abc')
+
+    time.sleep(0.2)
+    hello(sinks[2])
+    time.sleep(0.2)
+    # Only the client that kept talking is still written to.
+    link.write(b'def')
+    assert_equals(link.addresses, set([('127.0.0.1', sinks[2][1])]))
+    assert_equals(link.clients_expired, 1)
+    assert_equals(sinks[2][0].recv(100), b'abc')
+    assert_equals(sinks[2][0].recv(100), b'def')
+
+    link.close()
+    for sink, _ in sinks:
+        sink.close()
+
+
+def test_outbound_queue_lanes():
+    mav = mavutil.mavlink.MAVLink(None)
+    bulk = [mav.param_request_read_encode(0, 0, b'', i).pack(mav) for i in range(100)]
+    normal = [mav.request_data_stream_encode(0, 0, 0, i, 1).pack(mav) for i in range(100)]
+    command = mav.command_long_encode(0, 0, 400, 0, 1, 0, 0, 0, 0, 0, 0).pack(mav)
+
+    q = OutboundQueue(bulk_share=0.25)
+    for pkt in bulk + normal:
+        q.put(pkt)
+    q.put(command)
+    q.put(_WRITER_STOP)
+
+    out = []
+    while True:
+        pkt = q.get()
+        if pkt is _WRITER_STOP:
+            break
+        out.append(pkt)
+
+    # The command jumps the queue; bulk gets about a quarter of the rest
+    # while both are waiting, and each lane stays in order.
+    assert_equals(out[0], command)
+    first_half = out[1:81]
+    assert 15 <= sum(1 for pkt in first_half if pkt in bulk) <= 25
+    assert_equals([pkt for pkt in out if pkt in bulk], bulk)
+    assert_equals(len(out), 201)
+
+    stats = q.stats()
+    assert_equals([stats[lane]['sent'] for lane in ('control', 'normal', 'bulk')], [1, 100, 100])
+    assert_equals(stats['bulk']['depth'], 0)
+
+
+def test_outbound_queue_guided_goto_jumps_transfers():
+    mav = mavutil.mavlink.MAVLink(None)
+    bulk = [mav.param_request_read_encode(0, 0, b'', i).pack(mav) for i in range(20)]
+    # As Vehicle.simple_goto sends it, and the same point as a mission item.
+    goto = mav.mission_item_encode(0, 0, 0, 3, 16, 2, 0, 0, 0, 0, 0, -35.36, 149.16, 20).pack(mav)
+    item = mav.mission_item_encode(0, 0, 1, 3, 16, 0, 1, 0, 0, 0, 0, -35.36, 149.16, 20).pack(mav)
+
+    q = OutboundQueue(limits={'bulk': 20})
+    for pkt in bulk:
+        q.put(pkt)
+    # The mission item waits for room in the full bulk lane; the goto does not.
+    assert_raises(Full, q.put, item, True, 0.05)
+    q.put(goto, True, 0.05)
+    assert_equals(q.get(), goto)
+    assert_equals(q.stats()['control']['sent'], 1)
+    assert_equals([q.get() for _ in range(q.qsize())], bulk)
+
+
+def test_outbound_queue_coalesces_setpoints():
+    mav = mavutil.mavlink.MAVLink(None)
+
+    def setpoint(target, x):
+        return mav.set_position_target_local_ned_encode(0, target, 1, 1, 0, x, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0).pack(mav)
+
+    q = OutboundQueue()
+    command = mav.command_long_encode(1, 1, 400, 0, 1, 0, 0, 0, 0, 0, 0).pack(mav)
+    q.put(setpoint(1, 0))
+    q.put(command)
+    for x in range(1, 10):
+        q.put(setpoint(1, x))
+    q.put(setpoint(2, 0))
+    q.put(mav.rc_channels_override_encode(1, 1, 1500, 0, 0, 0, 0, 0, 0, 0).pack(mav))
+    q.put(mav.rc_channels_override_encode(1, 1, 1600, 0, 0, 0, 0, 0, 0, 0).pack(mav))
+
+    out = [q.get() for _ in range(q.qsize())]
+    # The newest setpoint for each target, in the place of the first.
+    assert_equals(out, [setpoint(1, 9), command, setpoint(2, 0),
+                        mav.rc_channels_override_encode(1, 1, 1600, 0, 0, 0, 0, 0, 0, 0).pack(mav)])
+    assert_equals(q.stats()['control']['coalesced'], 10)
+
+    # Once sent, the next setpoint is queued again.
+    q.put(setpoint(1, 10))
+    assert_equals(q.get(), setpoint(1, 10))
+    assert_equals(packet_target(setpoint(2, 0)), (2, 1))
+
+
+def test_setpoint_coalescing_can_be_turned_off():
+    mav = mavutil.mavlink.MAVLink(None)
+    setpoints = [mav.set_position_target_local_ned_encode(0, 1, 1, 1, 0, x, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0).pack(mav)
+                 for x in range(5)]
+    for coalesce, queued in ((True, setpoints[-1:]), (False, setpoints)):
+        conn = MAVConnection('udpin:127.0.0.1:0', coalesce=coalesce)
+        for pkt in setpoints:
+            conn.out_queue.put(pkt)
+        assert_equals([conn.out_queue.get() for _ in range(conn.out_queue.qsize())], queued)
+        conn.close()
+
+    # And through connect().
+    autopilot = FakeAutopilot()
+    for coalesce in (True, False):
+        vehicle = connect(autopilot.connection_string, coalesce=coalesce)
+        assert_equals(bool(vehicle._handler.out_queue.coalesce), coalesce)
+        vehicle.close()
+    autopilot.close()
+
+
+def test_outbound_queue_limits():
+    mav = mavutil.mavlink.MAVLink(None)
+    normal = [mav.request_data_stream_encode(0, 0, 0, i, 1).pack(mav) for i in range(5)]
+    bulk = [mav.param_request_read_encode(0, 0, b'', i).pack(mav) for i in range(5)]
+
+    q = OutboundQueue(limits={'normal': 3, 'bulk': 3}, policies={'bulk': 'drop_newest'})
+    for pkt in normal + bulk:
+        q.put(pkt)
+    out = [q.get() for _ in range(q.qsize())]
+    assert_equals([pkt for pkt in out if pkt in normal], normal[2:])
+    assert_equals([pkt for pkt in out if pkt in bulk], bulk[:3])
+    stats = q.stats()
+    assert_equals((stats['normal']['dropped'], stats['bulk']['dropped']), (2, 2))
+
+    q = OutboundQueue(limits={'bulk': 2})
+    q.put(bulk[0])
+    q.put(bulk[1])
+    assert_raises(Full, q.put, bulk[2], False)
+    assert_raises(Full, q.put, bulk[2], True, 0.05)
+
+    # A blocked put goes through once the writer makes room.
+    threading.Timer(0.1, q.get).start()
+    q.put(bulk[2], timeout=5)
+    assert_equals([q.get(), q.get()], bulk[1:3])
+
+
+def test_packet_msgid():
+    mav = mavutil.mavlink.MAVLink(None)
+    msg = mav.command_long_encode(0, 0, 400, 0, 1, 0, 0, 0, 0, 0, 0)
+    assert_equals(packet_msgid(msg.pack(mav)), mavutil.mavlink.MAVLINK_MSG_ID_COMMAND_LONG)
+    # A MAVLink 2 header, with a 24 bit message id.
+    assert_equals(packet_msgid(b'\xfd\x00\x00\x00\x00\x01\x01\x34\x12\x00'), 0x1234)
+    assert_equals(packet_msgid(b'junk'), None)
+
+
+def test_writes_paced_to_bandwidth():
+    bandwidth = 4000.0
+    conn = MAVConnection('udpout:127.0.0.1:9', bandwidth=bandwidth)
+    assert_equals(MAVConnection('udpout:127.0.0.1:9').pacer, None)
+
+    writes = []
+    conn.master.write = lambda buf: writes.append((time.time(), buf))
+
+    mav = mavutil.mavlink.MAVLink(None)
+    bulk = [mav.param_request_read_encode(0, 0, b'', i).pack(mav) for i in range(60)]
+    command = mav.command_long_encode(0, 0, 400, 0, 1, 0, 0, 0, 0, 0, 0).pack(mav)
+    for pkt in bulk:
+        conn.out_queue.put(pkt)
+    start = time.time()
+    conn.start()
+    time.sleep(0.1)
+    conn.out_queue.put(command)
+    queued = time.time()
+    conn.close()
+
+    # Nothing goes out faster than the link allows, beyond the initial burst
+    # and the packet that takes the bucket into debt.
+    total = sum(len(pkt) for pkt in bulk) + len(command)
+    assert_equals(sum(len(buf) for _, buf in writes), total)
+    for when, _ in writes:
+        sent = sum(len(buf) for t, buf in writes if t <= when)
+        assert sent <= conn.pacer.burst + (when - start) * bandwidth + len(command) + 1
+    # The command goes out as soon as there is room, ahead of the transfer.
+    written = [t for t, buf in writes if command in buf][0]
+    assert written - queued < 0.05
+    assert writes[-1][0] - written > 0.1
+
+
+def test_unwanted_messages_not_decoded():
+    conn = MAVConnection('udpin:127.0.0.1:0')
+    received = []
+
+    @conn.forward_message
+    def listener(_, msg):
+        received.append(msg.get_type())
+
+    conn.set_message_interest(listener, ['ATTITUDE'])
+
+    sender = mavutil.mavlink_connection('udpout:127.0.0.1:%d' % conn.master.port.getsockname()[1])
+    # A skipped packet ahead of a wanted one in the same datagram.
+    packed = []
+    for msg in (sender.mav.vfr_hud_encode(0, 0, 0, 0, 0, 0), sender.mav.attitude_encode(0, 0, 0, 0, 0, 0, 0)):
+        packed.append(msg.pack(sender.mav))
+        # As send() would.
+        sender.mav.seq = (sender.mav.seq + 1) % 256
+    sender.write(b''.join(packed))
+    sender.mav.raw_imu_send(0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+    time.sleep(0.1)
+    conn._drain_input()
+
+    assert_equals(received, ['ATTITUDE'])
+    assert_equals(conn.skipped[mavutil.mavlink.MAVLINK_MSG_ID_VFR_HUD], 1)
+    assert_equals(conn.skipped[mavutil.mavlink.MAVLINK_MSG_ID_RAW_IMU], 1)
+    # Skipped packets still count in the link statistics, not as lost.
+    assert_equals((conn.master.mav_count, conn.master.mav_loss), (3, 0))
+    assert_equals(conn.master.mav.parse_char(b''.join(packed)).get_type(), 'ATTITUDE')
+
+    # A listener that wants everything gets everything.
+    conn.forward_message(lambda _, msg: None)
+    sender.mav.raw_imu_send(0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+    time.sleep(0.1)
+    conn._drain_input()
+    sender.close()
+    conn.close()
+
+    assert_equals(received, ['ATTITUDE', 'RAW_IMU'])
+
+
+def test_message_interest_follows_listener_changes():
+    conn = MAVConnection('udpin:127.0.0.1:0')
+    received = []
+
+    @conn.forward_message
+    def attitude(_, msg):
+        received.append(('attitude', msg.get_type()))
+
+    @conn.forward_message
+    def vfr_hud(_, msg):
+        received.append(('vfr_hud', msg.get_type()))
+
+    conn.set_message_interest(attitude, ['ATTITUDE'])
+    conn.set_message_interest(vfr_hud, ['VFR_HUD'])
+
+    sender = mavutil.mavlink_connection('udpout:127.0.0.1:%d' % conn.master.port.getsockname()[1])
+    sender.mav.raw_imu_send(0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+    time.sleep(0.1)
+    conn._drain_input()
+    assert_equals(received, [])
+
+    # One listener swapped for another that declares no interest: as many
+    # listeners as before, but now everything is wanted.
+    conn.message_listeners.remove(vfr_hud)
+    conn.forward_message(lambda _, msg: received.append(('all', msg.get_type())))
+    sender.mav.raw_imu_send(0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+    time.sleep(0.1)
+    conn._drain_input()
+    sender.close()
+    conn.close()
+
+    assert_equals(received, [('attitude', 'RAW_IMU'), ('all', 'RAW_IMU')])
+    # The interest of the listener that went away is forgotten.
+    assert_equals(list(conn._interest), [attitude])
+
+
+def test_vehicle_decodes_only_what_it_listens_to():
+    autopilot = FakeAutopilot()
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+    handler = vehicle._handler
+    vfr_hud = mavutil.mavlink.MAVLINK_MSG_ID_VFR_HUD
+    assert vfr_hud in handler._decode_msgids
+
+    vehicle.add_message_listener('*', lambda *args: None)
+    handler._update_interest()
+    assert_equals(handler._decode_msgids, None)
+    vehicle.close()
+    autopilot.close()
+
+
+def test_retarget_packet():
+    from pymavlink.dialects.v20 import all as mavlink2
+    for dialect in (mavutil.mavlink, mavlink2):
+        mav = dialect.MAVLink(None, srcSystem=200)
+        # MAVLink 2 leaves the zero target fields off the end of the payload.
+        pkt = bytes(mav.command_long_encode(0, 0, 400, 0, 1, 0, 0, 0, 0, 0, 0).pack(mav))
+        patched = retarget_packet(pkt, 7)
+        msg = dialect.MAVLink(None).decode(bytearray(patched))
+        assert_equals((msg.target_system, msg.command, msg.param1), (7, 400, 1))
+        assert_equals(msg.get_srcSystem(), 200)
+        if dialect is mavlink2:
+            assert len(patched) > len(pkt)
+        # Nothing to do: the same packet comes back.
+        assert retarget_packet(patched, 7) is patched
+        heartbeat = mav.heartbeat_encode(0, 0, 0, 0, 0).pack(mav)
+        assert retarget_packet(heartbeat, 7) is heartbeat
+    assert_equals(retarget_packet(b'junk', 7), None)
+
+
+def test_raw_pipe_forwards_wire_bytes():
+    vehicle = MAVConnection('udpin:127.0.0.1:0', target_system=1)
+    gcs = MAVConnection('udpin:127.0.0.1:0')
+    vehicle.pipe(gcs, raw=True)
+    vehicle._update_interest()
+
+    autopilot = mavutil.mavlink.MAVLink(None, srcSystem=1)
+    attitude = autopilot.attitude_encode(0, 0, 0, 0, 0, 0, 0).pack(autopilot)
+    vehicle.master.mav.parse_char(attitude)
+    station = mavutil.mavlink.MAVLink(None, srcSystem=255)
+    command = station.command_long_encode(0, 0, 400, 0, 1, 0, 0, 0, 0, 0, 0).pack(station)
+    gcs.master.mav.parse_char(command)
+
+    # Passed through untouched, and nobody needed them decoded.
+    assert_equals(bytes(gcs.out_queue.get_nowait()), bytes(attitude))
+    assert_equals(vehicle.skipped[mavutil.mavlink.MAVLINK_MSG_ID_ATTITUDE], 1)
+    relayed = vehicle.out_queue.get_nowait()
+    msg = mavutil.mavlink.MAVLink(None).decode(bytearray(relayed))
+    assert_equals((msg.get_srcSystem(), msg.target_system), (255, 1))
+
+    # Corrupted frames are not relayed, either way.
+    gcs._update_interest()
+    for conn, pkt in ((vehicle, attitude), (gcs, command)):
+        bad = bytearray(pkt)
+        bad[-1] ^= 0xFF
+        conn.master.mav.parse_char(bytes(bad))
+    assert gcs.out_queue.empty()
+    assert vehicle.out_queue.empty()
+    vehicle.close()
+    gcs.close()
+
+
+def test_raw_pipe_writes_retargeted_packets():
+    sink, port = udp_sink()
+    vehicle = MAVConnection('udpout:127.0.0.1:%d' % port, target_system=1)
+    gcs = MAVConnection('udpin:127.0.0.1:0')
+    vehicle.pipe(gcs, raw=True)
+
+    # Queued before the writer starts, so they go out joined in one batch.
+    station = mavutil.mavlink.MAVLink(None, srcSystem=255)
+    for param1 in (1, 0):
+        gcs.master.mav.parse_char(station.command_long_encode(0, 0, 400, 0, param1, 0, 0, 0, 0, 0, 0).pack(station))
+    vehicle.mavlink_thread_out.start()
+
+    msgs, _ = read_messages(sink, 2)
+    vehicle.close()
+    gcs.close()
+    sink.close()
+
+    assert_equals([(msg.target_system, msg.param1) for msg in msgs], [(1, 1), (1, 0)])
+
+
+def test_router():
+    vehicle, gcs, logger = [MAVConnection('udpin:127.0.0.1:0') for _ in range(3)]
+    router = MAVRouter()
+    router.add(vehicle, name='vehicle')
+    router.add(gcs, name='gcs', deny=['ATTITUDE'])
+    router.add(logger, name='logger', rates={'*': 1})
+    for conn in (vehicle, gcs, logger):
+        # Nothing listens for messages, so nothing is decoded.
+        conn._update_interest()
+
+    def sent(conn):
+        pkts = []
+        while not conn.out_queue.empty():
+            pkt = conn.out_queue.get_nowait()
+            assert isinstance(pkt, bytes)
+            pkts.append(packet_msgid(pkt))
+        return pkts
+
+    autopilot = mavutil.mavlink.MAVLink(None, srcSystem=1)
+    vehicle.master.mav.parse_char(autopilot.heartbeat_encode(0, 0, 0, 0, 0).pack(autopilot))
+    for _ in range(2):
+        vehicle.master.mav.parse_char(autopilot.attitude_encode(0, 0, 0, 0, 0, 0, 0).pack(autopilot))
+    # Filtered for the GCS, rate capped for the logger.
+    assert_equals(sent(gcs), [mavutil.mavlink.MAVLINK_MSG_ID_HEARTBEAT])
+    assert_equals(sent(logger), [mavutil.mavlink.MAVLINK_MSG_ID_HEARTBEAT, mavutil.mavlink.MAVLINK_MSG_ID_ATTITUDE])
+
+    # Addressed to the vehicle: only sent its way.
+    station = mavutil.mavlink.MAVLink(None, srcSystem=255)
+    gcs.master.mav.parse_char(station.command_long_encode(1, 0, 400, 0, 1, 0, 0, 0, 0, 0, 0).pack(station))
+    assert_equals(sent(vehicle), [mavutil.mavlink.MAVLINK_MSG_ID_COMMAND_LONG])
+    assert_equals(sent(logger), [])
+
+    # The vehicle's packets coming back in through the logger: a loop.
+    logger.master.mav.parse_char(autopilot.heartbeat_encode(0, 0, 0, 0, 0).pack(autopilot))
+    bad = bytearray(autopilot.heartbeat_encode(0, 0, 0, 0, 0).pack(autopilot))
+    bad[-1] ^= 0xFF
+    vehicle.master.mav.parse_char(bytes(bad))
+    assert_equals(sent(gcs) + sent(vehicle), [])
+
+    stats = router.stats()
+    assert_equals(stats['logger']['looped'], 1)
+    assert_equals(stats['logger']['rate_limited'], 1)
+    assert_equals(stats['gcs']['filtered'], 2)
+    assert_equals(stats['vehicle']['bad_crc'], 1)
+
+    router.remove(logger)
+    assert_equals(logger.raw_listeners, [])
+    vehicle.master.mav.parse_char(autopilot.heartbeat_encode(0, 0, 0, 0, 0).pack(autopilot))
+    assert_equals(sent(logger), [])
+    for conn in (vehicle, gcs, logger):
+        conn.close()
@@ -0,0 +1,112 @@
+import collections
+import os
+import shutil
+import tempfile
+import time
+from dronekit import connect
+from dronekit.params import ParamCache, ParamDownload
+from dronekit.test import wait_for
+from dronekit.test.fake_autopilot import FakeAutopilot, float32
+from nose.tools import assert_equals
+
+
+def test_param_download_asks_for_gaps():
+    requested = []
+    download = ParamDownload(requested.append, min_window=4)
+    download.start(10, 0.0)
+
+    # The stream skips 2 and 3: they are asked for while it carries on.
+    for index, now in [(0, 0.0), (1, 0.01), (4, 0.02), (5, 0.03)]:
+        download.received(index, now)
+    assert_equals(download.check(0.03), 2)
+    assert_equals(requested, [2, 3])
+    assert_equals(download.check(0.04), 0)
+
+    download.received(2, 0.05)
+    for index, now in [(6, 0.06), (7, 0.07)]:
+        download.received(index, now)
+    # 3 was lost again; once its request times out it is asked for again.
+    assert_equals(download.check(0.1), 1)
+    assert_equals(requested, [2, 3, 3])
+
+    # The stream has stopped short of the end: the rest are asked for.
+    assert_equals(download.check(1.0), 3)
+    assert_equals(sorted(requested[3:]), [3, 8, 9])
+    for index, now in [(3, 1.01), (8, 1.02), (9, 1.03)]:
+        download.received(index, now)
+    assert download.complete
+
+    progress = download.progress(1.03)
+    assert_equals((progress['count'], progress['received'], progress['eta']), (10, 10, 0.0))
+    assert 0 < progress['loss'] < 0.5
+
+
+def test_param_download_over_lossy_link():
+    params = collections.OrderedDict(('PARAM_%d' % i, i) for i in range(300))
+    autopilot = FakeAutopilot(params=params, drop=0.2, param_rate=500)
+    vehicle = connect(autopilot.connection_string)
+    try:
+        vehicle.wait_ready('parameters', timeout=10)
+        assert_equals(dict(vehicle.parameters), dict(params))
+        progress = vehicle.parameters.download_progress
+        assert_equals((progress['count'], progress['received']), (300, 300))
+        assert autopilot.received['PARAM_REQUEST_READ'] > 0
+    finally:
+        vehicle.close()
+        autopilot.close()
+
+
+def test_param_cache():
+    directory = tempfile.mkdtemp()
+    params = collections.OrderedDict(('PARAM_%d' % i, i) for i in range(300))
+    # Three seconds to download them all.
+    autopilot = FakeAutopilot(params=params, param_rate=100)
+    try:
+        vehicle = connect(autopilot.connection_string, wait_ready=['parameters'], param_cache=directory)
+        # Written to a temporary file first, then moved into place.
+        wait_for(lambda: [name for name in os.listdir(directory) if name.endswith('.json')], 5)
+        vehicle.close()
+        files = os.listdir(directory)
+        assert_equals(len(files), 1)
+        assert_equals(ParamCache(directory).load(1, vehicle._autopilot_version_msg)['hash'], autopilot.param_hash())
+
+        # Warm: served from the cache, which the hash confirms. Connecting
+        # still waits up to a second for a heartbeat.
+        start = time.time()
+        vehicle = connect(autopilot.connection_string, wait_ready=['parameters'], param_cache=directory)
+        assert time.time() - start < 2
+        assert_equals(dict(vehicle.parameters), dict(params))
+        time.sleep(0.5)
+        vehicle.close()
+        assert_equals(autopilot.received['PARAM_REQUEST_LIST'], 1)
+
+        # Changed since: checked against a fresh stream in the background, the
+        # cached values staying in place, and the cache updated.
+        autopilot.params['PARAM_5'] = float32(5.5)
+        autopilot.drop = 0.1
+        vehicle = connect(autopilot.connection_string, wait_ready=['parameters'], param_cache=directory)
+        changed = []
+        vehicle.parameters.add_attribute_listener('*', lambda _, name, value: changed.append(name))
+        assert_equals(vehicle.parameters['PARAM_5'], 5)
+        wait_for(lambda: vehicle.parameters['PARAM_5'] == 5.5, 10)
+        assert_equals(vehicle.parameters['PARAM_5'], 5.5)
+        assert vehicle._params_loaded
+        wait_for(lambda: ParamCache(directory).load(1, vehicle._autopilot_version_msg)['hash'] == autopilot.param_hash(), 10)
+        vehicle.close()
+        autopilot.drop = 0
+        assert_equals(ParamCache(directory).load(1, vehicle._autopilot_version_msg)['params'][5][1], 5.5)
+        # Only the parameter that differed is notified.
+        assert_equals(changed, ['PARAM_5'])
+        assert_equals(vehicle._params_changed, 1)
+
+        # Without _HASH_CHECK a sample is read back instead.
+        autopilot.hash_check = False
+        requests = autopilot.received['PARAM_REQUEST_READ']
+        vehicle = connect(autopilot.connection_string, wait_ready=['parameters'], param_cache=directory)
+        wait_for(lambda: autopilot.received['PARAM_REQUEST_READ'] - requests >= 12, 5)
+        time.sleep(0.5)
+        vehicle.close()
+        assert_equals(autopilot.received['PARAM_REQUEST_LIST'], 2)
+    finally:
+        autopilot.close()
+        shutil.rmtree(directory)
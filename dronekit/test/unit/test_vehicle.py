@@ -0,0 +1,469 @@
+import logging
+import math
+import monotonic
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dronekit import (connect, attribute_change, APIException, Attitude, CommandFailed, FilteredListener,
+                      LocationGlobal, LocationLocal, QueuedListener, TimeoutError)
+from dronekit.snapshot import TelemetryReader
+from dronekit.test import wait_for
+from dronekit.test.fake_autopilot import FakeAutopilot, float32
+from nose.tools import assert_equals, assert_raises
+from pymavlink import mavutil
+
+
+def test_reconnect_after_dropout_keeps_state():
+    autopilot = FakeAutopilot()
+    vehicle = connect(autopilot.connection_string, wait_ready=True, heartbeat_timeout=1)
+    vehicle.commands.download()
+    vehicle.commands.wait_ready()
+    seen = []
+    vehicle.add_attribute_listener('attitude', lambda *args: seen.append(1))
+    requests = autopilot.received['PARAM_REQUEST_LIST']
+
+    # Long enough for the connection to give up.
+    autopilot.paused = True
+    wait_for(lambda: not vehicle._handler._alive, 5)
+    autopilot.paused = False
+
+    report = vehicle.reconnect(timeout=5)
+    assert_equals((report['parameters'], report['mission']), ('kept', 'kept'))
+    assert report['seconds'] < 1
+    assert_equals(autopilot.received['PARAM_REQUEST_LIST'], requests)
+
+    del seen[:]
+    wait_for(lambda: seen, 5)
+    assert seen
+    vehicle.close()
+    autopilot.close()
+
+
+def test_reconnect_reloads_changed_parameters():
+    autopilot = FakeAutopilot()
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+
+    autopilot.params['THR_MIN'] = float32(150)
+    report = vehicle.reconnect(timeout=5, samples=len(autopilot.params))
+    assert_equals(report['parameters'], 'reloading')
+    vehicle.wait_ready('parameters', timeout=5)
+    assert_equals(vehicle.parameters['THR_MIN'], 150)
+
+    autopilot.params['NEW_PARAM'] = 1.0
+    assert_equals(vehicle.reconnect(timeout=5)['parameters'], 'reloading')
+    vehicle.wait_ready('parameters', timeout=5)
+    assert_equals(vehicle.parameters['NEW_PARAM'], 1)
+    vehicle.close()
+    autopilot.close()
+
+
+def test_telemetry_snapshot():
+    autopilot = FakeAutopilot()
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+    vehicle.armed = True
+    wait_for(lambda: vehicle.armed, 5)
+
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    publisher = vehicle.publish_telemetry(path)
+    reader = TelemetryReader(path)
+    first = reader.read()
+    assert_equals(first.seq, publisher.seq)
+    assert_equals(first.armed, True)
+    assert_equals(first.mode.name, vehicle.mode.name)
+    assert_equals(first.global_frame.lat, vehicle.location.global_frame.lat)
+    assert_equals(first.battery.voltage, vehicle.battery.voltage)
+    assert_equals(first.gps_0.fix_type, vehicle.gps_0.fix_type)
+    assert first.last_heartbeat < 2
+    assert first.local_frame.north is None
+
+    wait_for(lambda: reader.read().seq > first.seq, 5)
+    assert reader.read().seq > first.seq
+
+    # A publisher that dies mid-write must not hang its readers.
+    publisher.close()
+    with open(path, 'r+b') as f:
+        f.seek(8)
+        f.write(b'\x01')
+    reader.timeout = 0.1
+    assert_raises(TimeoutError, reader.read)
+
+    reader.close()
+    os.unlink(path)
+    vehicle.close()
+    autopilot.close()
+
+
+def test_message_dispatch_table():
+    autopilot = FakeAutopilot()
+    vehicle = connect(autopilot.connection_string)
+    try:
+        seen = []
+
+        def named(self, name, msg):
+            seen.append(('named', name))
+
+        def wildcard(self, name, msg):
+            seen.append(('*', name))
+
+        def failing(self, name, msg):
+            raise ValueError(name)
+
+        vehicle._handler.message_listeners.remove(vehicle._message_dispatcher)
+        vehicle.add_message_listener('SYSTEM_TIME', failing)
+        vehicle.add_message_listener('SYSTEM_TIME', named)
+        vehicle.add_message_listener('BAD_DATA', named)
+        vehicle.add_message_listener('*', wildcard)
+
+        mavlink = vehicle.message_factory
+        vehicle._dispatch_message(mavlink.system_time_encode(0, 0))
+        vehicle._dispatch_message(mavutil.mavlink.MAVLink_bad_data(b'x', 'test'))
+        vehicle._dispatch_message(mavutil.mavlink.MAVLink_unknown(60000, b''))
+        assert_equals(seen, [('named', 'SYSTEM_TIME'), ('*', 'SYSTEM_TIME'),
+                             ('named', 'BAD_DATA'), ('*', 'BAD_DATA'),
+                             ('*', 'UNKNOWN_60000')])
+
+        del seen[:]
+        vehicle.remove_message_listener('*', wildcard)
+        vehicle.remove_message_listener('SYSTEM_TIME', named)
+        vehicle._dispatch_message(mavlink.system_time_encode(0, 0))
+        vehicle.notify_message_listeners('BAD_DATA', None)
+        assert_equals(seen, [('named', 'BAD_DATA')])
+    finally:
+        vehicle.close()
+        autopilot.close()
+
+
+def test_dispatch_stats():
+    autopilot = FakeAutopilot()
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+    warnings = []
+    handler = logging.Handler()
+    handler.emit = lambda record: warnings.append(record.getMessage())
+    vehicle._logger.addHandler(handler)
+    try:
+        assert_equals(vehicle.dispatch_stats(), None)
+        vehicle.enable_dispatch_stats(budget=0.005)
+
+        def slow(self, name, msg):
+            time.sleep(0.01)
+
+        vehicle.add_message_listener('ATTITUDE', slow)
+        vehicle.add_attribute_listener('attitude', lambda *args: None)
+        wait_for(lambda: vehicle.dispatch_stats()['messages'].get('ATTITUDE', {}).get('count', 0) >= 3, 5)
+        stats = vehicle.dispatch_stats(reset=True)
+
+        attitude = stats['messages']['ATTITUDE']
+        assert attitude['count'] >= 3
+        assert attitude['mean'] >= 0.01
+        assert_equals(sum(count for bound, count in attitude['histogram']), attitude['count'])
+        assert stats['attributes']['attitude']['count'] >= 3
+        # Nobody listens to it, so it is not notified at all.
+        assert 'gps_0' not in stats['attributes']
+
+        slowest = stats['listeners'][0]
+        assert_equals((slowest['kind'], slowest['name']), ('message', 'ATTITUDE'))
+        # Python 2 functions have no qualified name.
+        name = 'test_dispatch_stats.<locals>.slow' if hasattr(slow, '__qualname__') else 'slow'
+        assert 'test_vehicle.%s:' % name in slowest['listener']
+        assert_equals(slowest['slow'], slowest['count'])
+        # Reported once, not for every slow call.
+        assert_equals(len([w for w in warnings if 'Slow message listener' in w]), 1)
+
+        assert vehicle.dispatch_stats()['messages'].get('ATTITUDE', {}).get('count', 0) < attitude['count']
+        vehicle.disable_dispatch_stats()
+        assert_equals(vehicle.dispatch_stats(), None)
+    finally:
+        vehicle._logger.removeHandler(handler)
+        vehicle.close()
+        autopilot.close()
+
+
+def test_queued_listener_orders_and_coalesces():
+    class ManualExecutor(object):
+        def __init__(self):
+            self.tasks = []
+
+        def submit(self, fn):
+            self.tasks.append(fn)
+
+        def run(self):
+            while self.tasks:
+                self.tasks.pop(0)()
+
+    calls = []
+    executor = ManualExecutor()
+    listener = QueuedListener(lambda owner, name, value: calls.append((name, value)), executor,
+                              queue_size=3, coalesce=True)
+    for i in range(5):
+        listener(None, 'attitude', i)
+        listener(None, 'armed', i)
+    # One task at a time, however many calls are queued.
+    assert_equals(len(executor.tasks), 1)
+    assert_equals(listener.coalesced, 8)
+    executor.run()
+    assert_equals(calls, [('attitude', 4), ('armed', 4)])
+
+    del calls[:]
+    listener.coalesce = False
+    for i in range(5):
+        listener(None, 'statustext', i)
+    executor.run()
+    assert_equals(calls, [('statustext', 2), ('statustext', 3), ('statustext', 4)])
+    assert_equals(listener.dropped, 2)
+
+
+def test_listener_on_executor_does_not_block_link():
+    autopilot = FakeAutopilot()
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+    pool = ThreadPoolExecutor(2)
+    release = threading.Event()
+    offloaded, inline = [], []
+    try:
+        def blocking(self, name, msg):
+            release.wait()
+            offloaded.append(msg.time_boot_ms)
+
+        vehicle.add_message_listener('ATTITUDE', blocking, executor=pool, coalesce=True)
+        vehicle.add_message_listener('ATTITUDE', lambda self, name, msg: inline.append(msg.time_boot_ms))
+        wait_for(lambda: len(inline) > 10, 5)
+        assert len(inline) > 10
+
+        release.set()
+        count = len(inline)
+        wait_for(lambda: len(offloaded) >= 2 and offloaded[-1] >= inline[count - 1], 5)
+        # The first call, then the latest attitude instead of the backlog.
+        assert len(offloaded) < count
+        assert_equals(offloaded, sorted(offloaded))
+
+        assert blocking in vehicle._message_listeners['ATTITUDE']
+        vehicle.remove_message_listener('ATTITUDE', blocking)
+        assert blocking not in vehicle._message_listeners['ATTITUDE']
+    finally:
+        vehicle.close()
+        autopilot.close()
+        pool.shutdown()
+
+
+def test_unobserved_attributes_still_ready():
+    autopilot = FakeAutopilot()
+    vehicle = connect(autopilot.connection_string)
+    try:
+        # Nothing listens to these, so no values are built, but they are still ready.
+        vehicle.wait_ready('attitude', 'gps_0', 'battery', 'location.global_frame', timeout=5)
+        assert not vehicle._has_attribute_listeners('attitude')
+
+        frames = []
+        vehicle.location.on_attribute('*')(lambda self, name, value: frames.append((name, value)))
+        wait_for(lambda: 'global_frame' in dict(frames), 5)
+        assert_equals(dict(frames)['global_frame'].lat, vehicle.location.global_frame.lat)
+    finally:
+        vehicle.close()
+        autopilot.close()
+
+
+def test_attribute_change():
+    assert_equals(attribute_change(1.0, 1.25), 0.25)
+    assert_equals(attribute_change(None, None), 0.0)
+    assert_equals(attribute_change(None, 3), float('inf'))
+    moved = attribute_change(LocationGlobal(-35.0, 149.0, 10), LocationGlobal(-35.00001, 149.0, 10))
+    assert 1.1 < moved < 1.12
+    assert_equals(attribute_change(LocationLocal(0, 0, 0), LocationLocal(3, 4, 0)), 5.0)
+    wrapped = attribute_change(Attitude(0, math.pi - 0.01, 0), Attitude(0, 0.01 - math.pi, 0))
+    assert abs(wrapped - 0.02) < 1e-9
+    assert_equals(attribute_change([1, 2, 3], [1, 2.5, 3]), 0.5)
+
+
+def test_filtered_listener():
+    calls = []
+    listener = FilteredListener(lambda owner, name, value: calls.append((name, value)), deadband=0.5)
+    for value in (0.0, 0.2, 0.4, 0.6, 0.9, 1.0, 1.2):
+        listener(None, 'alt', value)
+    assert_equals(calls, [('alt', 0.0), ('alt', 0.6), ('alt', 1.2)])
+
+    del calls[:]
+    listener = FilteredListener(lambda owner, name, value: calls.append((name, value)),
+                                deadband={'alt': 1}, min_interval=0.2)
+    start = monotonic.monotonic()
+    listener(None, 'frame', LocationGlobal(0, 0, 0))
+    listener(None, 'frame', LocationGlobal(1, 1, 0.5))
+    listener(None, 'frame', LocationGlobal(0, 0, 2))
+    listener(None, 'frame', LocationGlobal(0, 0, 3))
+    assert_equals(len(calls), 1)
+    listener.flush(start + 0.1)
+    assert_equals(len(calls), 1)
+    # The latest value, once the interval is up.
+    listener.flush(start + 0.3)
+    assert_equals([value.alt for name, value in calls], [0, 3])
+    listener.flush(start + 1)
+    assert_equals(len(calls), 2)
+
+
+def test_filtered_listener_flush_races_updates():
+    latest = {}
+    listener = FilteredListener(lambda owner, name, value: latest.__setitem__(name, value), min_interval=60)
+    names = ['attr%d' % i for i in range(100)]
+
+    def update():
+        for value in range(200):
+            for name in names:
+                listener(None, name, value)
+
+    # The reader thread notifies while the vehicle's loop flushes. Each
+    # flush is an interval on from the last, so it delivers whatever is held.
+    updater = threading.Thread(target=update)
+    updater.start()
+    now = monotonic.monotonic()
+    while updater.is_alive():
+        now += 60
+        listener.flush(now)
+    updater.join()
+    listener.flush(now + 60)
+    assert_equals(latest, dict((name, 199) for name in names))
+
+
+def test_min_interval_attribute_listener():
+    autopilot = FakeAutopilot(rate=50)
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+    try:
+        every, throttled = [], []
+        vehicle.add_attribute_listener('attitude', lambda self, name, value: every.append(monotonic.monotonic()))
+        vehicle.add_attribute_listener('attitude', lambda self, name, value: throttled.append(monotonic.monotonic()),
+                                       min_interval=0.25)
+        time.sleep(1.1)
+        assert len(every) > 30
+        assert 3 <= len(throttled) <= 6
+        assert min(b - a for a, b in zip(throttled, throttled[1:])) >= 0.2
+    finally:
+        vehicle.close()
+        autopilot.close()
+
+
+def test_waits_wake_on_state_change():
+    # The waits used to check their condition every 0.1 seconds. The bounds
+    # below are loose enough for a loaded machine but still well under what
+    # polling took.
+    poll = 0.1
+    autopilot = FakeAutopilot()
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+    try:
+        # When the first armed heartbeat was handled, against when arm() returned.
+        handled = []
+
+        def heartbeat(self, name, msg):
+            if msg.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED and not handled:
+                handled.append(monotonic.monotonic())
+
+        vehicle.add_message_listener('HEARTBEAT', heartbeat)
+        vehicle.arm(timeout=5)
+        assert monotonic.monotonic() - handled[0] < poll
+
+        # Confirmed by the autopilot's reply rather than by the next poll,
+        # which made each set take at least one interval.
+        start = monotonic.monotonic()
+        for value in (100, 200, 300, 400, 500):
+            assert vehicle.parameters.set('THR_MIN', value)
+        assert monotonic.monotonic() - start < 5 * poll / 2
+        assert_equals(autopilot.params['THR_MIN'], 500)
+
+        start = monotonic.monotonic()
+        assert_raises(TimeoutError, vehicle.wait_for, lambda: False, timeout=0.2)
+        assert 0.2 <= monotonic.monotonic() - start < 1
+    finally:
+        vehicle.close()
+        autopilot.close()
+
+
+def test_command_long_futures():
+    autopilot = FakeAutopilot()
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+    mavlink = mavutil.mavlink
+
+    def sent(command):
+        return [msg for msg in autopilot.commands if msg.command == command]
+
+    try:
+        # Accepted, and refused: takeoff fails while disarmed.
+        ack = vehicle.command_long(mavlink.MAV_CMD_DO_SET_MODE, 1, 4).result(timeout=5)
+        assert_equals(ack.result, mavlink.MAV_RESULT_ACCEPTED)
+        error = vehicle.command_long(mavlink.MAV_CMD_NAV_TAKEOFF, param7=10).exception(timeout=5)
+        assert isinstance(error, CommandFailed)
+        assert_equals(error.result, mavlink.MAV_RESULT_FAILED)
+
+        # Unanswered the first time: sent again with the confirmation counted up.
+        autopilot.command_replies[mavlink.MAV_CMD_DO_SET_HOME] = [[]]
+        del autopilot.commands[:]
+        vehicle.command_long(mavlink.MAV_CMD_DO_SET_HOME, 0, 0, 0, 0, -35.36, 149.16, 584)
+        wait_for(lambda: len(sent(mavlink.MAV_CMD_DO_SET_HOME)) == 2, 5)
+        assert_equals([msg.confirmation for msg in sent(mavlink.MAV_CMD_DO_SET_HOME)], [0, 1])
+
+        # The older helpers still send once, and are not held back by each other.
+        autopilot.command_replies[mavlink.MAV_CMD_PREFLIGHT_CALIBRATION] = [[], []]
+        del autopilot.commands[:]
+        assert_equals(vehicle.send_calibrate_barometer(), None)
+        assert_equals(vehicle.send_calibrate_vehicle_level(), None)
+        wait_for(lambda: len(sent(mavlink.MAV_CMD_PREFLIGHT_CALIBRATION)) == 2, 5)
+        time.sleep(1.5)
+        assert_equals(len(sent(mavlink.MAV_CMD_PREFLIGHT_CALIBRATION)), 2)
+
+        # Never answered.
+        autopilot.command_replies[mavlink.MAV_CMD_DO_SET_HOME] = [[], [], []]
+        future = vehicle.command_long(mavlink.MAV_CMD_DO_SET_HOME, 0, 0, 0, 0, 1, 2, 3, retries=2, timeout=0.1)
+        assert isinstance(future.exception(timeout=5), TimeoutError)
+
+        # In progress: waits for the final answer without sending again.
+        autopilot.command_replies[mavlink.MAV_CMD_PREFLIGHT_CALIBRATION] = [[mavlink.MAV_RESULT_IN_PROGRESS]]
+        del autopilot.commands[:]
+        future = vehicle.command_long(mavlink.MAV_CMD_PREFLIGHT_CALIBRATION, 0, 0, 1, timeout=0.1)
+        time.sleep(0.5)
+        assert not future.done()
+        autopilot.mav.command_ack_send(mavlink.MAV_CMD_PREFLIGHT_CALIBRATION, mavlink.MAV_RESULT_ACCEPTED)
+        future.result(timeout=5)
+        assert_equals(len(sent(mavlink.MAV_CMD_PREFLIGHT_CALIBRATION)), 1)
+
+        # Many in flight at once; a repeated command waits for the answer to the first.
+        del autopilot.commands[:]
+        futures = [vehicle.command_long(mavlink.MAV_CMD_SET_MESSAGE_INTERVAL, msgid, 100000)
+                   for msgid in range(30, 40)]
+        futures += [vehicle.command_long(mavlink.MAV_CMD_DO_SET_MODE, 1, 4) for _ in range(3)]
+        for future in futures:
+            future.result(timeout=5)
+        assert_equals(len(sent(mavlink.MAV_CMD_SET_MESSAGE_INTERVAL)), 10)
+        assert_equals(len(sent(mavlink.MAV_CMD_DO_SET_MODE)), 3)
+
+        # Commands still waiting fail when the vehicle is closed.
+        autopilot.command_replies[mavlink.MAV_CMD_DO_SET_HOME] = [[]]
+        future = vehicle.command_long(mavlink.MAV_CMD_DO_SET_HOME, 1)
+    finally:
+        vehicle.close()
+        autopilot.close()
+    assert isinstance(future.exception(timeout=1), APIException)
+
+
+def test_set_many_parameters():
+    params = dict(('PARAM_%d' % i, i) for i in range(100))
+    autopilot = FakeAutopilot(params=params)
+    vehicle = connect(autopilot.connection_string, wait_ready=True)
+    try:
+        values = dict((name, value + 0.1) for name, value in params.items())
+        values['NO_SUCH_PARAM'] = 1
+        report = vehicle.parameters.set_many(values, timeout=0.2)
+        assert_equals(autopilot.received['PARAM_SET'], 100)
+        assert_equals(report['NO_SUCH_PARAM'], {'ok': False, 'value': None, 'attempts': 0})
+        for name in params:
+            # Matched against the single precision float the vehicle sends back.
+            assert_equals(report[name], {'ok': True, 'value': float32(params[name] + 0.1), 'attempts': 1})
+            assert_equals(autopilot.params[name], float32(params[name] + 0.1))
+
+        # Only the ones not confirmed are sent again.
+        autopilot.drop = 0.3
+        report = vehicle.parameters.set_many(dict((name.lower(), 2) for name in params), retries=20, timeout=0.2)
+        autopilot.drop = 0
+        assert all(result['ok'] for result in report.values())
+        assert_equals(autopilot.received['PARAM_SET'], 100 + sum(result['attempts'] for result in report.values()))
+        assert sum(result['attempts'] for result in report.values()) > 100
+    finally:
+        vehicle.close()
+        autopilot.close()
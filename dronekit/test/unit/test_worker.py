@@ -0,0 +1,107 @@
+import marshal
+import os
+import sys
+import tempfile
+from nose import SkipTest
+
+if sys.version_info < (3,):
+    raise SkipTest('dronekit.worker needs Python 3')
+
+from dronekit import connect
+from dronekit.test import wait_for
+from dronekit.test.fake_autopilot import FakeAutopilot
+from dronekit import worker
+from dronekit.worker import SharedRing
+from nose.tools import assert_equals
+from pymavlink import mavutil
+
+
+def test_shared_ring_wraps():
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    producer = SharedRing(path, 64)
+    consumer = SharedRing(path)
+    os.unlink(path)
+
+    sent, received = [], []
+    for i in range(20):
+        record = (i, b'x' * (i % 7))
+        while not producer.put(marshal.dumps(record)):
+            # Full: only draining makes room.
+            producer.commit()
+            received.extend(consumer.drain())
+        sent.append(record)
+        producer.commit()
+        if i % 3 == 0:
+            received.extend(consumer.drain())
+    received.extend(consumer.drain())
+    assert_equals(received, sent)
+    producer.close()
+    consumer.close()
+
+
+def test_shared_ring_commit_during_drain():
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    producer = SharedRing(path, 1024)
+    consumer = SharedRing(path)
+    os.unlink(path)
+
+    producer.put(marshal.dumps(0))
+    assert producer.commit()
+
+    # More records committed while the consumer is part way through a drain.
+    wakes = []
+
+    def loads(data):
+        if not wakes:
+            for i in (1, 2):
+                producer.put(marshal.dumps(i))
+                wakes.append(producer.commit())
+        return marshal.loads(data)
+
+    class Marshal(object):
+        pass
+    Marshal.loads = staticmethod(loads)
+
+    worker.marshal = Marshal
+    try:
+        received = consumer.drain()
+    finally:
+        worker.marshal = marshal
+    # No wake-up was sent for them, so the drain must have taken them too.
+    assert_equals(wakes, [False, False])
+    assert_equals(received, [0, 1, 2])
+
+    # And the producer can tell when the consumer next needs waking.
+    producer.put(marshal.dumps(3))
+    assert producer.commit()
+    assert_equals(consumer.drain(), [3])
+    producer.close()
+    consumer.close()
+
+
+def test_vehicle_over_worker_process():
+    autopilot = FakeAutopilot()
+    vehicle = connect(autopilot.connection_string, wait_ready=True, parse_process=True)
+    try:
+        assert_equals(vehicle.mode.name, 'STABILIZE')
+        assert_equals(vehicle.parameters['RTL_ALT'], 1500)
+        assert_equals(vehicle.gps_0.fix_type, 3)
+
+        vehicle.parameters['RTL_ALT'] = 2000
+        assert_equals(autopilot.params['RTL_ALT'], 2000)
+
+        vehicle.armed = True
+        wait_for(lambda: vehicle.armed, 5)
+        assert vehicle.armed
+
+        msgs = []
+        vehicle.add_message_listener('GPS_RAW_INT', lambda vehicle, name, msg: msgs.append(msg))
+        wait_for(lambda: msgs, 5)
+        msg = msgs[0]
+        assert_equals((msg.get_srcSystem(), msg.satellites_visible, msg.fix_type), (1, 10, 3))
+        assert_equals(mavutil.mavlink.MAVLink(None).decode(msg.get_msgbuf()).lat, msg.lat)
+    finally:
+        vehicle.close()
+        autopilot.close()
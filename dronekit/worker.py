@@ -0,0 +1,508 @@
+"""
+MAVLink parsing in a worker process (Python 3 only).
+
+Parsing a MAVLink stream is pure Python, so in an ordinary
+:py:class:`dronekit.mavlink.MAVConnection` it competes for the GIL with every
+listener and control loop in the process. With ``connect(...,
+parse_process=True)`` a worker process owns the socket or serial port instead.
+It frames and checks packets, decodes the ones somebody listens to, and hands
+their field values to this process through a ring buffer in shared memory.
+Here they only have to be turned back into message objects, and
+:py:class:`dronekit.Vehicle` works exactly as before.
+
+.. code:: python
+
+    from dronekit import connect
+
+    if __name__ == '__main__':
+        vehicle = connect('/dev/ttyAMA0', baud=921600, parse_process=True, wait_ready=True)
+
+The worker is started with the ``spawn`` method, so, as with any
+:py:mod:`multiprocessing` program, the main module must be importable without
+side effects (hence the ``__main__`` guard above).
+
+Outgoing packets are still built and paced here and passed to the worker to
+write.
+"""
+
+import collections
+import marshal
+import mmap
+import multiprocessing
+import os
+import selectors
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+import monotonic
+
+from dronekit import APIException
+from dronekit.mavlink import MAVConnection, count_packet_seq, open_link, packet_msgid
+from pymavlink import mavutil
+
+
+_COUNTER = struct.Struct('<Q')
+_LENGTH = struct.Struct('<I')
+_WRAP = 0xffffffff
+
+
+class SharedRing(object):
+    """
+    A single-producer, single-consumer queue of byte records in a
+    memory-mapped file.
+
+    The producer and consumer each own one counter (the total bytes written
+    and read) on its own cache line. Records are length-prefixed and 4-byte
+    aligned; one that does not fit before the end of the buffer is preceded
+    by a wrap marker and written at the start.
+
+    :param path: The file to map.
+    :param capacity: Bytes of record space, to create the file with. Leave it
+        out to map an existing ring.
+    """
+
+    HEAD = 0
+    TAIL = 64
+    DATA = 128
+
+    def __init__(self, path, capacity=None):
+        if capacity is not None:
+            capacity -= capacity % 4
+            with open(path, 'wb') as f:
+                f.truncate(self.DATA + capacity)
+        with open(path, 'r+b') as f:
+            self._map = mmap.mmap(f.fileno(), 0)
+        self.capacity = len(self._map) - self.DATA
+        self._head = _COUNTER.unpack_from(self._map, self.HEAD)[0]
+        self._tail = _COUNTER.unpack_from(self._map, self.TAIL)[0]
+
+    def put(self, record):
+        """
+        Append ``record`` (not visible to the consumer until :py:func:`commit`).
+        Returns ``False``, without writing anything, if the ring is too full.
+        """
+        size = _LENGTH.size + len(record)
+        size += -size % 4
+        pos = self._head % self.capacity
+        pad = self.capacity - pos if self.capacity - pos < size else 0
+        free = self.capacity - (self._head - _COUNTER.unpack_from(self._map, self.TAIL)[0])
+        if pad + size > free:
+            return False
+        if pad:
+            _LENGTH.pack_into(self._map, self.DATA + pos, _WRAP)
+            self._head += pad
+            pos = 0
+        offset = self.DATA + pos
+        _LENGTH.pack_into(self._map, offset, len(record))
+        self._map[offset + _LENGTH.size:offset + _LENGTH.size + len(record)] = record
+        self._head += size
+        return True
+
+    def commit(self):
+        """
+        Publish the records put so far. Returns ``True`` if the consumer had
+        already read everything before them (and so may be asleep).
+        """
+        old = _COUNTER.unpack_from(self._map, self.HEAD)[0]
+        _COUNTER.pack_into(self._map, self.HEAD, self._head)
+        return _COUNTER.unpack_from(self._map, self.TAIL)[0] == old
+
+    def drain(self):
+        """Take every committed record, unmarshalled."""
+        m = self._map
+        tail = self._tail
+        records = []
+        loads = marshal.loads
+        data, capacity = self.DATA, self.capacity
+        # Until HEAD stops moving: a commit made after it was read saw an
+        # older TAIL, and so sent no wake-up for its records.
+        while True:
+            head = _COUNTER.unpack_from(m, self.HEAD)[0]
+            if head == tail:
+                return records
+            while tail != head:
+                pos = tail % capacity
+                length = _LENGTH.unpack_from(m, data + pos)[0]
+                if length == _WRAP:
+                    tail += capacity - pos
+                    continue
+                start = data + pos + _LENGTH.size
+                records.append(loads(m[start:start + length]))
+                size = _LENGTH.size + length
+                tail += size + (-size % 4)
+            self._tail = tail
+            _COUNTER.pack_into(m, self.TAIL, tail)
+    def close(self):
+        self._map.close()
+
+
+class _ParseWorker(object):
+    """The worker process's side: reads the link and fills the ring."""
+
+    def __init__(self, link_args, ring, conn, wake):
+        self.link_args = link_args
+        self.ring = ring
+        self.conn = conn
+        self.wake = wake
+        # What to decode (None for everything) and whether to pass on
+        # packets that are not decoded.
+        self.wanted = None
+        self.raw = False
+        self.skipped = collections.Counter()
+        self.pending = False
+        self.master = open_link(*link_args)
+        self._install()
+
+    def _install(self):
+        master = self.master
+        decode = master.mav.decode
+        got = [False]
+        self._got = got
+
+        def record_decode(msgbuf):
+            got[0] = True
+            msgid = packet_msgid(msgbuf)
+            wanted = self.wanted
+            if wanted is not None and msgid not in wanted:
+                self.skipped[msgid] += 1
+                if self.raw:
+                    self._put((bytes(msgbuf), None))
+                return None
+            try:
+                msg = decode(msgbuf)
+            except mavutil.mavlink.MAVError:
+                return None
+            if msgid in mavutil.mavlink.mavlink_map:
+                # Constructor arguments, in order. Strings are passed raw
+                # where the message class keeps the raw bytes.
+                fields = msg.__dict__
+                args = tuple(fields.get('_%s_raw' % name, fields[name]) for name in msg.fieldnames)
+            else:
+                # Not in this dialect: the consumer decodes it itself.
+                args = True
+            self._put((bytes(msgbuf), args))
+            return None
+
+        master.mav.decode = record_decode
+        self._mav = master.mav
+
+    def _put(self, record):
+        data = marshal.dumps(record)
+        while not self.ring.put(data):
+            # The consumer is behind. Let it catch up, while the kernel
+            # buffers (and eventually drops) what arrives meanwhile.
+            self._commit()
+            time.sleep(0.001)
+        self.pending = True
+
+    def _commit(self):
+        if self.pending:
+            self.pending = False
+            if self.ring.commit():
+                try:
+                    self.wake.send(b'\0')
+                except BlockingIOError:
+                    # Plenty of wakeups pending already.
+                    pass
+
+    def _feed(self, data):
+        master = self.master
+        if master.first_byte:
+            master.auto_mavlink_version(data)
+            if master.mav is not self._mav:
+                self._install()
+        got = self._got
+        got[0] = False
+        master.mav.parse_char(data)
+        while got[0]:
+            got[0] = False
+            master.mav.parse_char(b'')
+
+    def _command(self, command):
+        kind = command[0]
+        if kind == 'write':
+            self.master.write(command[1])
+        elif kind == 'interest':
+            self.wanted, self.raw = command[1], command[2]
+        elif kind == 'reset':
+            if hasattr(self.master, 'reset'):
+                self.master.reset()
+            else:
+                try:
+                    self.master.close()
+                except Exception:
+                    pass
+                self.master = open_link(*self.link_args)
+            self._install()
+            return True
+        elif kind == 'stop':
+            raise SystemExit
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.conn, selectors.EVENT_READ)
+        fd = self.master.fd
+        if fd is not None:
+            selector.register(fd, selectors.EVENT_READ)
+        next_report = monotonic.monotonic() + 1
+        while True:
+            selector.select(1 if fd is not None else 0.01)
+            while self.conn.poll():
+                if self._command(self.conn.recv()) and self.master.fd != fd:
+                    if fd is not None:
+                        selector.unregister(fd)
+                    fd = self.master.fd
+                    if fd is not None:
+                        selector.register(fd, selectors.EVENT_READ)
+
+            for _ in range(256):
+                data = self.master.recv(4096)
+                if not data:
+                    break
+                self._feed(data)
+            self._commit()
+
+            now = monotonic.monotonic()
+            if now >= next_report:
+                if self.skipped:
+                    self._put((None, ('skipped', dict(self.skipped))))
+                    self.skipped.clear()
+                    self._commit()
+                next_report = now + 1
+
+
+def _run_worker(link_args, path, conn, wake):
+    try:
+        ring = SharedRing(path)
+        wake.setblocking(False)
+        worker = _ParseWorker(link_args, ring, conn, wake)
+        conn.send(('ready', isinstance(worker.master, mavutil.mavserial)))
+    except Exception as e:
+        conn.send(('error', str(e)))
+        return
+    try:
+        worker.run()
+    except SystemExit:
+        pass
+    except Exception as e:
+        # Reported through the ring, like everything else after startup.
+        worker._put((None, ('error', str(e))))
+        worker._commit()
+    finally:
+        try:
+            worker.master.close()
+        except Exception:
+            pass
+
+
+class mavworker(mavutil.mavfile):
+    """
+    This process's end of a link owned by a worker process. Commands go to
+    the worker over a pipe; its ``fd`` is a socket the worker writes to when
+    it publishes records after :py:func:`recv_records` had taken them all.
+
+    :param link_args: ``(ip, baud, source_system, source_component)``, as for
+        :py:func:`dronekit.mavlink.open_link`.
+    :param capacity: Size of the ring buffer in bytes.
+    :param timeout: Seconds to wait for the worker to open the link.
+    """
+
+    def __init__(self, link_args, capacity=1 << 20, timeout=30):
+        self._link_args = link_args
+        self._capacity = capacity
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._interest = None
+        self.process = None
+        self._start()
+        ip, baud, source_system, source_component = link_args
+        mavutil.mavfile.__init__(self, self.fd, ip,
+                                 source_system=source_system, source_component=source_component)
+
+    def _start(self):
+        ctx = multiprocessing.get_context('spawn')
+        fd, path = tempfile.mkstemp(prefix='dronekit-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+        os.close(fd)
+        try:
+            self.ring = SharedRing(path, self._capacity)
+            self._conn, child = ctx.Pipe()
+            self._wake, child_wake = socket.socketpair()
+            self.process = ctx.Process(target=_run_worker, args=(self._link_args, path, child, child_wake))
+            self.process.daemon = True
+            self.process.start()
+            child.close()
+            child_wake.close()
+            if not self._conn.poll(self._timeout):
+                self._stop()
+                raise APIException('MAVLink worker process did not start')
+            kind, detail = self._conn.recv()
+        finally:
+            # Both ends have it mapped (or failed to), so nothing else
+            # needs the name.
+            os.unlink(path)
+        if kind == 'error':
+            self._stop()
+            raise APIException('MAVLink worker process could not open %s: %s' % (self._link_args[0], detail))
+        self.serial = detail
+        self._wake.setblocking(False)
+        self.fd = self._wake.fileno()
+        if self._interest is not None:
+            self._send(('interest',) + self._interest)
+
+    def _send(self, command):
+        with self._lock:
+            self._conn.send(command)
+
+    def _stop(self):
+        try:
+            self._send(('stop',))
+        except (OSError, ValueError):
+            pass
+        self.process.join(2)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self._conn.close()
+        self._wake.close()
+        self.ring.close()
+
+    def set_interest(self, wanted, raw):
+        """Have the worker decode only message ids ``wanted`` (``None`` for all), and pass on the rest raw if ``raw``."""
+        interest = (wanted, raw)
+        if interest != self._interest:
+            self._interest = interest
+            self._send(('interest',) + interest)
+
+    def recv_records(self):
+        """
+        Returns the ``(packet, args)`` records the worker has published.
+        ``args`` is ``None`` for a packet that was not decoded and ``True``
+        for one that must be decoded here. Reports from the worker itself
+        have ``None`` for a packet and ``(kind, detail)`` for ``args``.
+        """
+        try:
+            if not self._wake.recv(4096):
+                raise APIException('MAVLink worker process exited')
+        except BlockingIOError:
+            pass
+        except OSError:
+            raise APIException('MAVLink worker process exited')
+        return self.ring.drain()
+
+    def write(self, buf):
+        try:
+            self._send(('write', bytes(buf)))
+        except (OSError, ValueError):
+            raise APIException('MAVLink worker process exited')
+
+    def recv(self, n=None):
+        return b''
+
+    def reset(self):
+        if self.process.is_alive():
+            self._send(('reset',))
+        else:
+            self._conn.close()
+            self._wake.close()
+            self.ring.close()
+            self._start()
+
+    def close(self):
+        if self.process.is_alive() or not self._conn.closed:
+            self._stop()
+
+
+class ProcessMAVConnection(MAVConnection):
+    """
+    A :py:class:`dronekit.mavlink.MAVConnection` whose link is read and parsed
+    by a worker process (see :py:mod:`dronekit.worker`). Listeners, threads
+    and reactors work as for any other connection.
+
+    Packets that nothing needs decoded stay in the worker unless a raw
+    listener wants them, so the link's ``mav_loss`` counts those as lost.
+
+    :param ring_size: Bytes of shared memory for messages on their way from
+        the worker. If it fills, the worker stops reading until this process
+        catches up.
+    """
+
+    def __init__(self, ip, ring_size=1 << 20, **kwargs):
+        self._ring_size = ring_size
+        self._sent_interest = (None, False)
+        super(ProcessMAVConnection, self).__init__(ip, **kwargs)
+
+    def _open_link(self):
+        return mavworker(self._link_args, capacity=self._ring_size)
+
+    def _update_interest(self, force=False):
+        super(ProcessMAVConnection, self)._update_interest(force)
+        raw = bool(self.raw_listeners)
+        if self._decode_msgids is not self._sent_interest[0] or raw != self._sent_interest[1]:
+            self._sent_interest = (self._decode_msgids, raw)
+            self.master.set_interest(self._decode_msgids, raw)
+
+    def _message(self, pkt, args):
+        """Rebuild the message the worker decoded from its packet and field values."""
+        mavlink = mavutil.mavlink
+        msgbuf = bytearray(pkt)
+        if args is True:
+            return mavlink.MAVLink.decode(self.master.mav, msgbuf)
+        if msgbuf[0] == mavlink.PROTOCOL_MARKER_V2:
+            mlen, incompat_flags, compat_flags, seq, src_system, src_component = msgbuf[1:7]
+            msgid = msgbuf[7] | msgbuf[8] << 8 | msgbuf[9] << 16
+            signature_len = mavlink.MAVLINK_SIGNATURE_BLOCK_LEN if incompat_flags & mavlink.MAVLINK_IFLAG_SIGNED else 0
+        else:
+            mlen, seq, src_system, src_component, msgid = msgbuf[1:6]
+            incompat_flags = compat_flags = signature_len = 0
+        msg = mavlink.mavlink_map[msgid](*args)
+        # As MAVLink.decode() leaves them.
+        msg._header = mavlink.MAVLink_header(msgid, incompat_flags, compat_flags, mlen, seq,
+                                             src_system, src_component)
+        msg._msgbuf = msgbuf
+        msg._payload = msgbuf[6:-(2 + signature_len)]
+        msg._crc = msgbuf[-(2 + signature_len)] | msgbuf[-(1 + signature_len)] << 8
+        return msg
+
+    def _drain_input(self):
+        """
+        Dispatch every message the worker has published.
+        """
+        self._update_interest()
+        if not self._accept_input:
+            return
+        master = self.master
+        for pkt, args in master.recv_records():
+            if pkt is None:
+                kind, detail = args
+                if kind == 'error':
+                    raise APIException('MAVLink worker process failed: %s' % detail)
+                self.skipped.update(detail)
+                continue
+            if master.first_byte:
+                master.auto_mavlink_version(pkt[:1])
+            for fn in self.raw_listeners:
+                try:
+                    fn(self, pkt)
+                except Exception:
+                    self._logger.exception('Exception in raw packet handler', exc_info=True)
+            if args is None:
+                count_packet_seq(master, pkt)
+                continue
+            try:
+                msg = self._message(pkt, args)
+            except Exception:
+                self._logger.exception('Could not rebuild message from worker', exc_info=True)
+                continue
+            master.post_message(msg)
+
+            for fn in self.message_listeners:
+                try:
+                    fn(self, msg)
+                except Exception:
+                    self._logger.exception(
+                        'Exception in message handler for %s' % msg.get_type(),
+                        exc_info=True
+                    )
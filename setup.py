@@ -18,6 +18,7 @@ setuptools.setup(
     install_requires=[
         'pymavlink>=2.2.20',
         'monotonic>=1.3',
+        'futures>=3.0; python_version < "3"',
     ],
     author_email='tim@3drobotics.com, kevinh@geeksville.com',
     classifiers=[